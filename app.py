@@ -6,6 +6,9 @@ import pandas as pd
 from datetime import datetime
 import os
 from config import Config
+from batch_upload import ACTUALIZADO, DUPLICADO, SUBIDO, process_batch, read_batch, upload_partitions
+from parquet_export import parquet_file_name, parquet_spool
+from standards_registry import PARQUET_EN_LUGAR, CompiledStandard, StandardsRegistry
 from validators import ExcelValidator
 from storage_client import AzureStorageClient
 
@@ -18,42 +21,52 @@ st.set_page_config(
 )
 
 
-def construir_ruta_storage(standard: dict, empresa: str, fecha_carga: datetime.date) -> str:
+@st.cache_resource
+def get_validator() -> ExcelValidator:
+    """
+    Validador compartido por todas las sesiones del proceso.
+    
+    Los estándares se compilan una sola vez y se recargan cuando cambia algún
+    JSON de `standards/` (ver `StandardsRegistry`).
+    
+    Returns:
+        Validador con el registro de estándares del proceso
+    """
+    registry = StandardsRegistry(Config.STANDARDS_DIR, reload_interval=Config.STANDARDS_RELOAD_SECONDS)
+    return ExcelValidator(Config.STANDARDS_DIR, registry=registry)
+
+
+@st.cache_resource
+def get_storage_client() -> AzureStorageClient:
+    """
+    Cliente de Azure Storage compartido por todas las sesiones del proceso.
+    
+    Reutiliza el pool de conexiones HTTP y la caché de contenedores ya
+    verificados en lugar de crear un cliente por sesión.
+    
+    Returns:
+        Cliente de Azure Storage
+    """
+    return AzureStorageClient(
+        account_name=Config.AZURE_STORAGE_ACCOUNT_NAME,
+        account_key=Config.AZURE_STORAGE_ACCOUNT_KEY,
+        container_name=Config.AZURE_STORAGE_CONTAINER_NAME
+    )
+
+
+def construir_ruta_storage(standard: CompiledStandard, empresa: str, fecha_carga: datetime.date) -> str:
     """
     Construye la ruta completa de almacenamiento según el formato del estándar.
     
     Args:
-        standard: Diccionario con el estándar del informe
+        standard: Estándar compilado del informe
         empresa: Nombre de la empresa
         fecha_carga: Fecha seleccionada por el usuario
     
     Returns:
         Ruta completa de almacenamiento
     """
-    storage_path = standard.get('storage_path', '')
-    if not storage_path:
-        storage_path = standard.get('report_type', '').lower().replace(' ', '_')
-    
-    # Verificar si usa formato especial (año/mes con nombre)
-    path_format = standard.get('storage_path_format', 'default')
-    
-    if path_format == 'year_month_name':
-        # Formato para POS 3: {AÑO}/{MM}. {NombreMes}
-        año = fecha_carga.strftime('%Y')
-        mes_num = fecha_carga.strftime('%m')
-        # Nombres de mes en español
-        meses_es = {
-            '01': 'Enero', '02': 'Febrero', '03': 'Marzo', '04': 'Abril',
-            '05': 'Mayo', '06': 'Junio', '07': 'Julio', '08': 'Agosto',
-            '09': 'Septiembre', '10': 'Octubre', '11': 'Noviembre', '12': 'Diciembre'
-        }
-        mes_nombre = meses_es.get(mes_num, mes_num)
-        fecha_str = f"{año}/{mes_num}. {mes_nombre}"
-    else:
-        # Formato por defecto: {año}/{mes}/{día}
-        fecha_str = fecha_carga.strftime('%Y/%m/%d')
-    
-    return f"{Config.BASE_PATH_BUSINT}/{empresa}/{storage_path}/{fecha_str}"
+    return standard.build_storage_path(Config.BASE_PATH_BUSINT, empresa, fecha_carga)
 
 # Título principal
 st.title("📊 Excel Uploader - Carga Controlada")
@@ -66,33 +79,27 @@ st.markdown(
     """
 )
 
-# Inicializar sesión
-if 'validator' not in st.session_state:
-    st.session_state.validator = ExcelValidator(Config.STANDARDS_DIR)
+# Validador compartido entre sesiones
+validator = get_validator()
 
-if 'storage_client' not in st.session_state:
-    # Validar configuración
-    is_valid, errors = Config.validate()
-    if not is_valid:
-        st.error("⚠️ **Error de Configuración**")
-        st.error("Por favor, configura las siguientes variables de entorno:")
-        for error in errors:
-            st.error(f"- {error}")
-        st.stop()
-    
-    # Inicializar cliente de Azure Storage
-    try:
-        st.session_state.storage_client = AzureStorageClient(
-            account_name=Config.AZURE_STORAGE_ACCOUNT_NAME,
-            account_key=Config.AZURE_STORAGE_ACCOUNT_KEY,
-            container_name=Config.AZURE_STORAGE_CONTAINER_NAME
-        )
-    except Exception as e:
-        st.error(f"⚠️ **Error al conectar con Azure Storage**: {str(e)}")
-        st.stop()
+# Validar configuración
+is_valid, errors = Config.validate()
+if not is_valid:
+    st.error("⚠️ **Error de Configuración**")
+    st.error("Por favor, configura las siguientes variables de entorno:")
+    for error in errors:
+        st.error(f"- {error}")
+    st.stop()
+
+# Cliente de Azure Storage compartido entre sesiones
+try:
+    storage_client = get_storage_client()
+except Exception as e:
+    st.error(f"⚠️ **Error al conectar con Azure Storage**: {str(e)}")
+    st.stop()
 
 # Obtener tipos de informe disponibles
-report_types = st.session_state.validator.get_available_report_types()
+report_types = validator.get_available_report_types()
 
 if not report_types:
     st.warning("⚠️ No se encontraron estándares de informe. Por favor, agrega archivos JSON en el directorio 'standards'.")
@@ -117,9 +124,9 @@ with st.form("upload_form", clear_on_submit=False):
     )
     
     # Mostrar guía de origen del informe (source_hint)
-    standard = st.session_state.validator.load_standard(tipo_informe)
-    if standard and standard.get('source_hint'):
-        st.info(f"📋 **Guía de origen:**\n\nLa ruta para sacar el informe es la siguiente:\n\n{standard.get('source_hint')}")
+    standard = validator.get_standard(tipo_informe)
+    if standard and standard.data.get('source_hint'):
+        st.info(f"📋 **Guía de origen:**\n\nLa ruta para sacar el informe es la siguiente:\n\n{standard.data.get('source_hint')}")
     
     # Campo 3: Fecha de carga
     fecha_carga = st.date_input(
@@ -134,11 +141,11 @@ with st.form("upload_form", clear_on_submit=False):
             # Construir ruta completa de ejemplo usando la función helper
             ruta_completa = construir_ruta_storage(standard, empresa, fecha_carga)
             
-            st.write(f"**Ruta base del informe:** `{standard.get('storage_path', 'N/A')}`")
+            st.write(f"**Ruta base del informe:** `{standard.data.get('storage_path', 'N/A')}`")
             st.write(f"**Ruta completa en Azure Storage:** `{ruta_completa}`")
-            st.write(f"**Número de columnas requeridas:** {len(standard.get('columns', []))}")
+            st.write(f"**Número de columnas requeridas:** {len(standard.columns)}")
             st.write("**Columnas requeridas:**")
-            st.code(", ".join(standard.get('columns', [])))
+            st.code(", ".join(standard.columns))
     
     # Campo 4: Archivo Excel
     archivo_excel = st.file_uploader(
@@ -160,7 +167,7 @@ if submitted:
         
         # Validar estructura
         with st.spinner("🔍 Validando estructura del archivo..."):
-            es_valido, mensaje, detalles = st.session_state.validator.validate_excel_structure(
+            es_valido, mensaje, detalles = validator.validate_excel_structure(
                 archivo_excel,
                 tipo_informe
             )
@@ -194,40 +201,252 @@ if submitted:
             st.warning("⚠️ El archivo **NO** se ha subido a Azure Storage.")
         
         else:
-            # Validación exitosa - Subir a Azure Storage
             st.success(f"✅ {mensaje}")
             
-            # Cargar estándar para obtener la ruta de destino
-            standard = st.session_state.validator.load_standard(tipo_informe)
+            # Cargar estándar para obtener la ruta de destino y la opción de copia Parquet
+            standard = validator.get_standard(tipo_informe)
             
             if not standard:
                 st.error("❌ Error: No se pudo cargar el estándar del informe")
                 st.stop()
             
+            # Validar el contenido (tipos, vacíos y rangos) si el estándar lo define;
+            # en la misma pasada se escribe la copia Parquet si el estándar la pide
+            # (en memoria hasta PARQUET_MEMORIA_MB y luego en un archivo temporal)
+            copia_parquet = (
+                parquet_spool(Config.PARQUET_MEMORIA_MB * 1024 * 1024) if standard.parquet_mode else None
+            )
+            with st.spinner("🔍 Validando el contenido del archivo..."):
+                es_valido, mensaje, detalles = validator.validate_excel_content(
+                    archivo_excel,
+                    tipo_informe,
+                    chunk_rows=Config.VALIDACION_FILAS_POR_BLOQUE,
+                    max_errors_per_column=Config.VALIDACION_ERRORES_POR_COLUMNA,
+                    max_errors=Config.VALIDACION_MAX_ERRORES,
+                    parquet_sink=copia_parquet
+                )
+            
+            if not es_valido:
+                st.error(f"❌ **Validación de Contenido Fallida**")
+                st.error(mensaje)
+                
+                with st.expander("📋 Detalles de la validación", expanded=True):
+                    st.write(f"**Filas revisadas:** {detalles.get('filas_validadas', 0)}")
+                    if detalles.get('detenido'):
+                        st.warning(
+                            f"La validación se detuvo al superar {Config.VALIDACION_MAX_ERRORES} errores; "
+                            "puede haber más filas con errores."
+                        )
+                    for columna, errores in detalles.get('errores_por_columna', {}).items():
+                        st.write(f"**{columna}**: {errores['total']} errores")
+                        st.dataframe(
+                            pd.DataFrame(errores['ejemplos']).rename(
+                                columns={'fila': 'Fila', 'valor': 'Valor', 'motivo': 'Motivo'}
+                            ),
+                            hide_index=True
+                        )
+                
+                st.warning("⚠️ El archivo **NO** se ha subido a Azure Storage.")
+                st.stop()
+            
+            if detalles:
+                st.success(f"✅ {mensaje}")
+            
+            # Validación exitosa - Subir a Azure Storage
+            
             # Construir ruta completa usando la función helper
             full_storage_path = construir_ruta_storage(standard, empresa, fecha_carga)
             
-            # Subir archivo
-            with st.spinner(f"📤 Subiendo archivo a Azure Storage..."):
+            # Archivos a subir: el Excel y/o su copia Parquet (única o por particiones), en la misma carpeta
+            archivos_destino = []
+            if standard.parquet_mode != PARQUET_EN_LUGAR:
                 # Resetear el archivo al inicio para leerlo
                 archivo_excel.seek(0)
+                archivos_destino.append((archivo_excel.name, archivo_excel))
+            if copia_parquet is not None and not standard.partition_by:
+                archivos_destino.append((parquet_file_name(archivo_excel.name), copia_parquet))
+            
+            subido = False
+            exito = True
+            for nombre_destino, contenido in archivos_destino:
+                # Subir archivo por bloques mostrando el avance
+                barra_carga = st.progress(0.0, text=f"📤 Subiendo {nombre_destino} a Azure Storage...")
                 
-                exito, mensaje_upload = st.session_state.storage_client.upload_file(
-                    file_path_or_content=archivo_excel,
-                    destination_path=full_storage_path,
-                    file_name=archivo_excel.name
-                )
+                def mostrar_avance(enviados: int, total: int, bytes_por_segundo: float):
+                    fraccion = min(enviados / total, 1.0) if total else 0.0
+                    barra_carga.progress(
+                        fraccion,
+                        text=f"📤 Subiendo {nombre_destino} a Azure Storage... "
+                             f"{enviados / 1024 / 1024:.1f} MB ({bytes_por_segundo / 1024 / 1024:.1f} MB/s)"
+                    )
+                
+                with st.spinner(f"📤 Subiendo {nombre_destino} a Azure Storage..."):
+                    exito, mensaje_upload, detalles_upload = storage_client.upload_file(
+                        file_path_or_content=contenido,
+                        destination_path=full_storage_path,
+                        file_name=nombre_destino,
+                        progress_callback=mostrar_avance
+                    )
+                barra_carga.empty()
+                
+                if exito and detalles_upload.get('actualizado'):
+                    st.info(f"♻️ **Ya actualizado**")
+                    st.info(mensaje_upload)
+                    st.info(f"📍 **Ubicación:** `{full_storage_path}/{nombre_destino}`")
+                elif exito:
+                    st.success(f"✅ **Carga Exitosa**")
+                    st.success(mensaje_upload)
+                    st.info(f"📍 **Ubicación:** `{full_storage_path}/{nombre_destino}`")
+                    subido = True
+                else:
+                    st.error(f"❌ **Error al subir archivo**")
+                    st.error(mensaje_upload)
+                    break
             
-            if exito:
-                st.success(f"✅ **Carga Exitosa**")
-                st.success(mensaje_upload)
-                st.info(f"📍 **Ubicación:** `{full_storage_path}/{archivo_excel.name}`")
+            if exito and copia_parquet is not None and standard.partition_by:
+                barra_particiones = st.progress(0.0, text="📤 Subiendo particiones Parquet...")
+                
+                def mostrar_particiones(terminadas: int, total: int):
+                    barra_particiones.progress(
+                        terminadas / total,
+                        text=f"📤 Subiendo particiones Parquet... {terminadas} de {total}"
+                    )
                 
+                with st.spinner("📤 Subiendo particiones Parquet a Azure Storage..."):
+                    exito, mensaje_upload, detalles_upload = upload_partitions(
+                        storage_client,
+                        standard,
+                        copia_parquet,
+                        archivo_excel.name,
+                        full_storage_path,
+                        workers=Config.LOTE_HILOS_CARGA,
+                        max_partitions=Config.PARQUET_MAX_PARTICIONES,
+                        on_progress=mostrar_particiones
+                    )
+                barra_particiones.empty()
+                
+                if exito and detalles_upload.get('actualizado'):
+                    st.info(f"♻️ **Particiones ya actualizadas**")
+                    st.info(mensaje_upload)
+                elif exito:
+                    st.success(f"✅ **Particiones subidas** ({', '.join(standard.partition_by)})")
+                    st.success(mensaje_upload)
+                    st.info(f"📍 **Manifiesto:** `{detalles_upload['manifiesto']}`")
+                    subido = True
+                else:
+                    st.error(f"❌ **Error al subir las particiones**")
+                    st.error(mensaje_upload)
+            
+            if copia_parquet is not None:
+                copia_parquet.close()
+            
+            if subido:
                 # Mostrar resumen
                 st.balloons()
-            else:
-                st.error(f"❌ **Error al subir archivo**")
-                st.error(mensaje_upload)
+
+# Carga por lote
+st.markdown("---")
+with st.form("batch_form", clear_on_submit=False):
+    st.subheader("📦 Carga por Lote")
+    st.caption(
+        "Varios archivos (o un .zip) del mismo tipo de informe. La fecha de cada archivo se toma "
+        "de su nombre (p. ej. `ventas_2025-05-01.xlsx`) o, si no la tiene, de su contenido; "
+        "si no se encuentra se usa la fecha indicada aquí."
+    )
+    
+    empresa_lote = st.selectbox(
+        "Empresa",
+        options=Config.EMPRESAS_DISPONIBLES,
+        key="empresa_lote"
+    )
+    tipo_informe_lote = st.selectbox(
+        "Tipo de Informe",
+        options=report_types,
+        key="tipo_informe_lote"
+    )
+    fecha_lote = st.date_input(
+        "Fecha por defecto",
+        value=datetime.now().date(),
+        key="fecha_lote"
+    )
+    archivos_lote = st.file_uploader(
+        "Archivos Excel (.xlsx) o .zip",
+        type=['xlsx', 'zip'],
+        accept_multiple_files=True,
+        key="archivos_lote"
+    )
+    submitted_lote = st.form_submit_button("🚀 Validar y Cargar Lote", use_container_width=True)
+
+if submitted_lote:
+    if not archivos_lote:
+        st.error("❌ Por favor, selecciona los archivos a cargar.")
+        st.stop()
+    
+    items, errores_lote = read_batch(
+        archivos_lote, Config.LOTE_MAX_ARCHIVOS, Config.LOTE_MAX_MB * 1024 * 1024
+    )
+    for error in errores_lote:
+        st.warning(f"⚠️ {error}")
+    if not items:
+        st.error("❌ No se encontraron archivos .xlsx en el lote.")
+        st.stop()
+    
+    standard_lote = validator.get_standard(tipo_informe_lote)
+    if not standard_lote:
+        st.error("❌ Error: No se pudo cargar el estándar del informe")
+        st.stop()
+    
+    inicio_lote = datetime.now()
+    barra_lote = st.progress(0.0, text="🔍 Validando y subiendo archivos...")
+    terminados = []
+    
+    def avance_lote(item):
+        terminados.append(item)
+        barra_lote.progress(
+            min(len(terminados) / len(items), 1.0),
+            text=f"{len(terminados)} de {len(items)}: {item.name} ({item.status})"
+        )
+    
+    process_batch(
+        validator,
+        storage_client,
+        items,
+        tipo_informe_lote,
+        fecha_lote,
+        lambda fecha: construir_ruta_storage(standard_lote, empresa_lote, fecha),
+        validation_workers=Config.LOTE_HILOS_VALIDACION,
+        upload_workers=Config.LOTE_HILOS_CARGA,
+        content_options={
+            "chunk_rows": Config.VALIDACION_FILAS_POR_BLOQUE,
+            "max_errors_per_column": Config.VALIDACION_ERRORES_POR_COLUMNA,
+            "max_errors": Config.VALIDACION_MAX_ERRORES
+        },
+        max_partitions=Config.PARQUET_MAX_PARTICIONES,
+        parquet_memory_mb=Config.PARQUET_MEMORIA_MB,
+        on_done=avance_lote
+    )
+    barra_lote.empty()
+    
+    subidos = sum(1 for item in items if item.status == SUBIDO)
+    actualizados = sum(1 for item in items if item.status == ACTUALIZADO)
+    duplicados = sum(1 for item in items if item.status == DUPLICADO)
+    duracion_lote = (datetime.now() - inicio_lote).total_seconds()
+    notas = []
+    if actualizados:
+        notas.append(f"{actualizados} ya estaban actualizados")
+    if duplicados:
+        notas.append(f"{duplicados} omitidos por nombre repetido en el lote")
+    resumen_notas = f" ({'; '.join(notas)})" if notas else ""
+    if subidos + actualizados == len(items):
+        st.success(
+            f"✅ **Lote cargado**: {subidos} archivos subidos en {duracion_lote:.1f} s{resumen_notas}"
+        )
+    else:
+        st.warning(
+            f"⚠️ **Lote cargado parcialmente**: {subidos} de {len(items)} archivos subidos "
+            f"en {duracion_lote:.1f} s{resumen_notas}. Los demás **NO** se han subido a Azure Storage."
+        )
+    st.dataframe(pd.DataFrame([item.as_row() for item in items]), hide_index=True, use_container_width=True)
 
 # Información adicional
 st.markdown("---")
@@ -242,18 +461,35 @@ with st.expander("ℹ️ Información sobre la aplicación"):
     5. La aplicación **valida automáticamente** que el archivo cumpla con el estándar.
     6. Si la validación es exitosa, el archivo se sube a Azure Storage Gen2 en la ruta: `raw/busint/{empresa}/{tipo_informe}/{fecha}`.
     
+    En **Carga por Lote** se suben varios archivos (o un .zip) a la vez: se validan en paralelo,
+    cada uno va a la ruta de su propia fecha y al final se muestra un resumen por archivo.
+    
+    Si el estándar tiene `"parquet": "also"` se sube además una copia Parquet tipada y comprimida
+    (`<archivo>.parquet`) en la misma carpeta; con `"parquet": "instead"` se sube solo el Parquet.
+    Con `"partition_by"` (p. ej. `["Fecha"]`) la copia se divide en carpetas por partición
+    (`parquet/Fecha_dia=2025-05-01/...`) con un manifiesto `parquet/_manifest_<archivo>.json`;
+    al volver a cargar el archivo se eliminan sus particiones que ya no están en el manifiesto.
+    Ambas opciones están desactivadas en los estándares incluidos: sin ellas solo se sube el .xlsx.
+    
     ### Validaciones realizadas
     
     - ✅ Verificación de encabezados de columna
     - ✅ Coincidencia exacta de columnas con el estándar
     - ✅ Detección de columnas faltantes
     - ✅ Detección de columnas adicionales
+    - ✅ Tipos, celdas vacías y rangos de cada columna (si el estándar define `schema`)
+    - ♻️ Si el destino ya tiene un archivo con el mismo contenido (MD5), no se vuelve a subir
     
     ### Estándares de informe
     
     Los estándares se definen en archivos JSON dentro del directorio `standards/`.
     Cada estándar define:
     - Las columnas requeridas
+    - Opcionalmente, el tipo de cada columna (`schema`): `type` (string, integer,
+      number, date, boolean), `nullable`, `min`/`max`, `format`, `values` y `max_length`
     - La ruta de destino en Azure Storage
+    
+    Los cambios en los JSON (nuevos, editados o eliminados) se aplican en pocos
+    segundos sin reiniciar la aplicación.
     """)
 
@@ -0,0 +1,456 @@
+"""
+Carga por lote de archivos Excel de un mismo tipo de informe.
+
+Recibe varios .xlsx o .zip (que se expanden a sus .xlsx), valida cada archivo
+en un pool de hilos, deduce su fecha del nombre (2025-05-01, 20250501,
+01-05-2025, 2025-05) o, si no la tiene, de la primera fecha de su contenido,
+y sube los válidos en paralelo, cada uno apenas termina su validación, a la
+ruta que corresponde a su fecha. Si el estándar pide copia Parquet, se
+genera en la misma validación y se sube junto al .xlsx (o en su lugar),
+dividida en particiones con su manifiesto si el estándar define
+`partition_by` (ver `upload_partitions`). Cada
+archivo queda en un `BatchItem` con su estado y tiempos para el resumen.
+"""
+import io
+import json
+import os
+import posixpath
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import date
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from parquet_export import (
+    CARPETA_PARTICIONES,
+    is_partition_file,
+    manifest_file_name,
+    parquet_file_name,
+    parquet_spool,
+    write_partitions,
+)
+from standards_registry import PARQUET_EN_LUGAR, CompiledStandard
+from storage_client import AzureStorageClient
+from validators import ExcelValidator
+
+
+# Estados de un archivo del lote
+PENDIENTE = "pendiente"
+VALIDO = "válido"
+INVALIDO = "inválido"
+DUPLICADO = "duplicado"
+SUBIDO = "subido"
+ACTUALIZADO = "ya actualizado"
+ERROR_CARGA = "error de carga"
+
+# Fechas en el nombre del archivo, de la más a la menos específica
+_PATRONES_FECHA = [
+    (re.compile(r"(?<!\d)(\d{4})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)"), ("anio", "mes", "dia")),
+    (re.compile(r"(?<!\d)(\d{2})[-_.](\d{2})[-_.](\d{4})(?!\d)"), ("dia", "mes", "anio")),
+    (re.compile(r"(?<!\d)(\d{4})[-_.](\d{2})(?![-_.]?\d)"), ("anio", "mes")),
+]
+
+
+class BatchItem:
+    """Un archivo del lote con su resultado."""
+
+    def __init__(self, name: str, content: bytes):
+        """
+        Args:
+            name: Nombre del archivo (sin carpetas del .zip).
+            content: Contenido del archivo.
+        """
+        self.name = name
+        self.content = content
+        self.status = PENDIENTE
+        self.message = ""
+        self.report_date: Optional[date] = None
+        self.date_source = ""
+        self.destination = ""
+        # Copia Parquet generada en la validación (si el estándar la pide), en
+        # memoria hasta cierto tamaño y luego en disco; se cierra tras subirla
+        self.parquet: Optional[BinaryIO] = None
+        self.validation_seconds = 0.0
+        self.upload_seconds = 0.0
+
+    def as_row(self) -> dict:
+        """Fila del resumen del lote."""
+        return {
+            "Archivo": self.name,
+            "Estado": self.status,
+            "Fecha": self.report_date.isoformat() if self.report_date else "",
+            "Origen de la fecha": self.date_source,
+            "Tamaño (KB)": round(len(self.content) / 1024, 1),
+            "Validación (s)": round(self.validation_seconds, 2),
+            "Carga (s)": round(self.upload_seconds, 2),
+            "Ruta": self.destination,
+            "Detalle": self.message,
+        }
+
+
+def date_from_filename(name: str) -> Optional[date]:
+    """
+    Fecha contenida en el nombre del archivo.
+
+    Args:
+        name: Nombre del archivo.
+
+    Returns:
+        Fecha encontrada (día 1 si el nombre solo trae año y mes) o None.
+    """
+    for patron, partes in _PATRONES_FECHA:
+        for coincidencia in patron.finditer(name):
+            valores = dict(zip(partes, map(int, coincidencia.groups())))
+            try:
+                return date(valores["anio"], valores["mes"], valores.get("dia", 1))
+            except ValueError:
+                continue
+    return None
+
+
+def _upload_size(uploaded) -> int:
+    size = getattr(uploaded, "size", None)
+    if size is None:
+        uploaded.seek(0, os.SEEK_END)
+        size = uploaded.tell()
+    return size
+
+
+def read_batch(
+    uploaded_files,
+    max_files: int,
+    max_bytes: Optional[int] = None
+) -> Tuple[List[BatchItem], List[str]]:
+    """
+    Expande los archivos recibidos (.xlsx y .zip) en archivos del lote.
+
+    Los límites se aplican antes de leer cada archivo; en un .zip se usa el
+    tamaño sin comprimir que declara cada entrada, así que un .zip con más
+    archivos o más bytes de los permitidos no se descomprime completo.
+
+    Args:
+        uploaded_files: Archivos cargados (UploadedFile de Streamlit o file-like con `name`).
+        max_files: Máximo de archivos .xlsx en el lote.
+        max_bytes: Máximo de bytes sin comprimir de todo el lote (None: sin límite).
+
+    Returns:
+        Tupla (archivos, errores); un nombre repetido queda como DUPLICADO.
+    """
+    items: List[BatchItem] = []
+    errors: List[str] = []
+    total_bytes = 0
+    extra_files = 0
+    too_large: List[str] = []
+
+    def admit(name: str, size: int) -> bool:
+        nonlocal total_bytes, extra_files
+        if len(items) >= max_files:
+            extra_files += 1
+            return False
+        if max_bytes is not None and total_bytes + size > max_bytes:
+            too_large.append(name)
+            return False
+        total_bytes += size
+        return True
+
+    for uploaded in uploaded_files:
+        if uploaded.name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(uploaded) as zf:
+                    for info in zf.infolist():
+                        name = posixpath.basename(info.filename)
+                        if (info.is_dir() or info.filename.startswith("__MACOSX/")
+                                or name.startswith(".") or not name.lower().endswith(".xlsx")):
+                            continue
+                        # zipfile no entrega más de `file_size` bytes de una entrada
+                        if admit(name, info.file_size):
+                            items.append(BatchItem(name, zf.read(info)))
+            except zipfile.BadZipFile as e:
+                errors.append(f"{uploaded.name}: no es un .zip válido ({e})")
+        elif admit(uploaded.name, _upload_size(uploaded)):
+            uploaded.seek(0)
+            items.append(BatchItem(uploaded.name, uploaded.read()))
+
+    if extra_files:
+        errors.append(
+            f"El lote tiene {max_files + extra_files} archivos; se procesan los primeros {max_files}"
+        )
+    if too_large:
+        errors.append(
+            f"El lote supera {max_bytes / 1024 / 1024:.0f} MB sin comprimir; "
+            f"se omiten {len(too_large)} archivo(s): {', '.join(too_large[:5])}"
+            + ("…" if len(too_large) > 5 else "")
+        )
+
+    seen = set()
+    for item in items:
+        if item.name in seen:
+            item.status = DUPLICADO
+            item.message = "Otro archivo del lote tiene el mismo nombre (mismo destino)"
+        seen.add(item.name)
+    return items, errors
+
+
+def _validate_item(
+    validator: ExcelValidator,
+    item: BatchItem,
+    report_type: str,
+    default_date: date,
+    content_options: dict,
+    parquet_mode: Optional[str],
+    parquet_memory_bytes: int
+) -> BatchItem:
+    inicio = time.perf_counter()
+    copia_parquet = parquet_spool(parquet_memory_bytes) if parquet_mode else None
+    try:
+        es_valido, mensaje, _ = validator.validate_excel_structure(io.BytesIO(item.content), report_type)
+        if es_valido:
+            es_valido, mensaje, _ = validator.validate_excel_content(
+                io.BytesIO(item.content), report_type, parquet_sink=copia_parquet, **content_options
+            )
+    except Exception as e:
+        # Un archivo dañado no detiene el resto del lote
+        es_valido, mensaje = False, f"Error al validar el archivo: {str(e)}"
+    if copia_parquet is not None:
+        if es_valido:
+            item.parquet = copia_parquet
+        else:
+            copia_parquet.close()
+    item.status = VALIDO if es_valido else INVALIDO
+    item.message = mensaje
+
+    item.report_date = date_from_filename(item.name)
+    item.date_source = "nombre"
+    if item.report_date is None:
+        try:
+            item.report_date = validator.detect_report_date(io.BytesIO(item.content), report_type)
+        except Exception:
+            # Igual que en la validación: un archivo dañado toma la fecha del formulario
+            item.report_date = None
+        item.date_source = "contenido"
+    if item.report_date is None:
+        item.report_date = default_date
+        item.date_source = "formulario"
+    item.validation_seconds = time.perf_counter() - inicio
+    return item
+
+
+def _upload_item(
+    storage_client: AzureStorageClient,
+    item: BatchItem,
+    build_path: Callable[[date], str],
+    standard: Optional[CompiledStandard],
+    partition_workers: int,
+    max_partitions: int
+) -> BatchItem:
+    inicio = time.perf_counter()
+    exito, mensajes, actualizados, envios = True, [], 0, 0
+    try:
+        item.destination = build_path(item.report_date)
+        archivos = []
+        if not standard or standard.parquet_mode != PARQUET_EN_LUGAR:
+            archivos.append((item.name, item.content))
+        if item.parquet is not None and not standard.partition_by:
+            archivos.append((parquet_file_name(item.name), item.parquet))
+        for nombre, contenido in archivos:
+            envios += 1
+            exito, mensaje, detalles = storage_client.upload_file(
+                file_path_or_content=contenido,
+                destination_path=item.destination,
+                file_name=nombre
+            )
+            mensajes.append(mensaje)
+            if not exito:
+                break
+            actualizados += bool(detalles.get("actualizado"))
+        if exito and item.parquet is not None and standard.partition_by:
+            envios += 1
+            exito, mensaje, detalles = upload_partitions(
+                storage_client, standard, item.parquet, item.name, item.destination,
+                partition_workers, max_partitions
+            )
+            mensajes.append(mensaje)
+            actualizados += bool(detalles.get("actualizado"))
+    except Exception as e:
+        exito = False
+        mensajes.append(f"Error al subir archivo: {str(e)}")
+    finally:
+        if item.parquet is not None:
+            # Libera la memoria o el archivo temporal de la copia
+            item.parquet.close()
+            item.parquet = None
+    if not exito:
+        item.status = ERROR_CARGA
+    else:
+        item.status = ACTUALIZADO if actualizados == envios else SUBIDO
+    item.message = " | ".join(mensajes)
+    item.upload_seconds = time.perf_counter() - inicio
+    return item
+
+
+def upload_partitions(
+    storage_client: AzureStorageClient,
+    standard: CompiledStandard,
+    parquet_source,
+    file_name: str,
+    destination_path: str,
+    workers: int = 4,
+    max_partitions: int = 5000,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Tuple[bool, str, Dict]:
+    """
+    Divide la copia Parquet según `partition_by` y sube cada partición y el manifiesto.
+
+    Las particiones se escriben en un directorio temporal y se suben en
+    paralelo a la carpeta `parquet/` de `destination_path`. Luego se eliminan
+    las particiones de una carga anterior del mismo archivo que no están en el
+    nuevo manifiesto, para que los lectores del dataset no las sumen. El
+    manifiesto se sube al final y solo si todo lo anterior salió bien, así que
+    su presencia indica que el conjunto está completo.
+
+    Args:
+        storage_client: Cliente de Azure Storage (compartido; es seguro entre hilos).
+        standard: Estándar con `partition_by`.
+        parquet_source: Copia Parquet del archivo, path o file-like (ver
+            `ExcelValidator.validate_excel_content`); se lee por row groups.
+        file_name: Nombre del archivo original.
+        destination_path: Ruta del informe (p. ej. `construir_ruta_storage`).
+        workers: Particiones subidas a la vez.
+        max_partitions: Máximo de particiones por archivo.
+        on_progress: Función llamada desde el hilo que invoca con
+            (particiones terminadas, total) cada vez que termina una.
+
+    Returns:
+        Tupla (éxito, mensaje, detalles)
+        - detalles: particiones, filas, eliminadas (particiones anteriores
+          borradas), actualizado (si nada cambió) y manifiesto (ruta)
+    """
+    destino = f"{destination_path.rstrip('/')}/{CARPETA_PARTICIONES}"
+    with tempfile.TemporaryDirectory() as directorio:
+        manifiesto = write_partitions(parquet_source, standard, file_name, directorio, max_partitions)
+        total = len(manifiesto["files"])
+
+        def subir_particion(archivo: Dict) -> Tuple[bool, str, Dict]:
+            carpeta, nombre = posixpath.split(archivo["path"])
+            return storage_client.upload_file(
+                file_path_or_content=os.path.join(directorio, archivo["path"]),
+                destination_path=f"{destino}/{carpeta}",
+                file_name=nombre
+            )
+
+        resultados = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for future in as_completed([pool.submit(subir_particion, archivo) for archivo in manifiesto["files"]]):
+                resultados.append(future.result())
+                if on_progress:
+                    on_progress(len(resultados), total)
+
+    fallidas = [mensaje for exito, mensaje, _ in resultados if not exito]
+    if fallidas:
+        return False, f"{len(fallidas)} de {total} particiones no se subieron: {fallidas[0]}", {"particiones": total}
+
+    actuales = {f"{destino.strip('/')}/{archivo['path']}" for archivo in manifiesto["files"]}
+    try:
+        obsoletas = [
+            ruta for ruta in storage_client.list_files(destino)
+            if ruta not in actuales and is_partition_file(ruta, file_name)
+        ]
+    except Exception as e:
+        return False, f"Particiones subidas, pero no se pudieron listar las anteriores: {str(e)}", {"particiones": total}
+    if obsoletas:
+        exito, mensaje = storage_client.delete_files(obsoletas)
+        if not exito:
+            return False, f"Particiones subidas, pero no se eliminaron las anteriores: {mensaje}", {"particiones": total}
+
+    exito, mensaje, detalles = storage_client.upload_file(
+        file_path_or_content=json.dumps(manifiesto, ensure_ascii=False, indent=2).encode("utf-8"),
+        destination_path=destino,
+        file_name=manifest_file_name(file_name)
+    )
+    if not exito:
+        return False, f"Particiones subidas, pero no el manifiesto: {mensaje}", {"particiones": total}
+    actualizado = (
+        detalles.get("actualizado", False) and not obsoletas
+        and all(d.get("actualizado") for _, _, d in resultados)
+    )
+    eliminadas = f", {len(obsoletas)} anteriores eliminadas" if obsoletas else ""
+    return True, (
+        f"{total} particiones ({manifiesto['rows']} filas) "
+        f"{'ya actualizadas' if actualizado else 'subidas'} con su manifiesto en {destino}{eliminadas}"
+    ), {
+        "particiones": total,
+        "filas": manifiesto["rows"],
+        "eliminadas": len(obsoletas),
+        "actualizado": actualizado,
+        "manifiesto": detalles.get("ruta"),
+    }
+
+
+def process_batch(
+    validator: ExcelValidator,
+    storage_client: AzureStorageClient,
+    items: List[BatchItem],
+    report_type: str,
+    default_date: date,
+    build_path: Callable[[date], str],
+    validation_workers: int = 2,
+    upload_workers: int = 4,
+    content_options: Optional[dict] = None,
+    max_partitions: int = 5000,
+    parquet_memory_mb: int = 8,
+    on_done: Optional[Callable[[BatchItem], None]] = None
+) -> None:
+    """
+    Valida los archivos en paralelo y sube cada válido en cuanto termina su validación.
+    
+    Validación y carga usan pools separados: la validación es sobre todo CPU
+    (lectura del XML) y la carga espera a la red, así que las cargas de los
+    primeros archivos avanzan mientras se validan los siguientes.
+    
+    Args:
+        validator: Validador (compartido; es seguro entre hilos).
+        storage_client: Cliente de Azure Storage (compartido; es seguro entre hilos).
+        items: Archivos del lote; se actualizan en el lugar.
+        report_type: Tipo de informe de todo el lote.
+        default_date: Fecha a usar si no se encuentra en el nombre ni en el contenido.
+        build_path: Ruta de destino para una fecha (p. ej. `construir_ruta_storage`).
+        validation_workers: Archivos validados a la vez.
+        upload_workers: Archivos subidos a la vez.
+        content_options: Argumentos de `validate_excel_content` (bloques y errores).
+        max_partitions: Máximo de particiones Parquet por archivo (ver `upload_partitions`).
+        parquet_memory_mb: Tamaño hasta el que la copia Parquet de un archivo queda
+            en memoria; si lo supera pasa a un archivo temporal.
+        on_done: Función llamada desde el hilo que invoca cada vez que un archivo
+            termina (duplicado de inmediato; inválido tras validarlo; válido
+            tras subirlo), así se llama una vez por cada archivo del lote.
+    """
+    standard = validator.get_standard(report_type)
+    parquet_mode = standard.parquet_mode if standard else None
+    pendientes = [item for item in items if item.status == PENDIENTE]
+    if on_done:
+        # Los DUPLICADO de read_batch no se procesan, pero cuentan en el avance
+        for item in items:
+            if item.status != PENDIENTE:
+                on_done(item)
+    with ThreadPoolExecutor(max_workers=max(1, validation_workers)) as validation_pool, \
+            ThreadPoolExecutor(max_workers=max(1, upload_workers)) as upload_pool:
+        futures = {
+            validation_pool.submit(
+                _validate_item, validator, item, report_type, default_date, content_options or {},
+                parquet_mode, parquet_memory_mb * 1024 * 1024
+            )
+            for item in pendientes
+        }
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = future.result()
+                if item.status == VALIDO:
+                    futures.add(upload_pool.submit(
+                        # Las particiones de un archivo se suben en paralelo dentro de su hilo de carga
+                        _upload_item, storage_client, item, build_path, standard, upload_workers, max_partitions
+                    ))
+                elif on_done:
+                    on_done(item)
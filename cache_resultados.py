@@ -0,0 +1,214 @@
+"""
+Caché en disco de resultados de conciliación.
+
+La clave combina el hash del PDF, el hash del archivo de contabilidad y la
+versión del motor (VERSION_MOTOR + huella del código de los módulos que
+procesan). Solicitudes idénticas concurrentes se agrupan en un solo cálculo;
+si la solicitud que calcula se cancela (el cliente se desconectó), una de las
+que esperaban retoma el cálculo en vez de fallar con ella.
+
+Cada solicitud recibe su propio enlace duro al resultado (`<clave>.<id>.enviando`),
+así una purga o un TTL vencido que elimine la entrada mientras se envía no
+afecta la respuesta; el llamador borra su enlace al terminar.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from config import ConfigAPI
+from metricas import contar
+
+
+# Módulos cuyo código determina el resultado de la conciliación
+_MODULOS_MOTOR = ["procesar_pdf.py", "leer_contabilidad.py", "unir_archivos.py"]
+
+
+def _huella_motor() -> str:
+    h = hashlib.sha256(ConfigAPI.VERSION_MOTOR.encode())
+    base = os.path.dirname(os.path.abspath(__file__))
+    for nombre in _MODULOS_MOTOR:
+        try:
+            with open(os.path.join(base, nombre), "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(nombre.encode())
+    return h.hexdigest()[:16]
+
+
+HUELLA_MOTOR = _huella_motor()
+
+
+class CacheResultados:
+    """Caché de workbooks de conciliación en disco, con TTL y tamaño máximo."""
+
+    def __init__(self, directorio: str, max_bytes: int, ttl_segundos: int):
+        """
+        Inicializa la caché.
+
+        Args:
+            directorio: Carpeta local donde se guardan los resultados.
+            max_bytes: Tamaño total máximo; al superarlo se eliminan los menos usados.
+            ttl_segundos: Vigencia de cada resultado desde su último uso.
+        """
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self._en_curso: Dict[str, asyncio.Future] = {}
+        os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(h_pdf: str, h_cont: str) -> str:
+        """Clave de caché a partir del SHA-256 de cada archivo de entrada."""
+        return hashlib.sha256(f"{h_pdf}:{h_cont}:{HUELLA_MOTOR}".encode()).hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.xlsx")
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """Retorna la ruta del resultado guardado, o None si no existe o expiró."""
+        ruta = self._ruta(clave)
+        try:
+            if time.time() - os.path.getmtime(ruta) > self.ttl_segundos:
+                os.remove(ruta)
+                return None
+            # Marcar como usado recientemente (TTL y desalojo por antigüedad)
+            os.utime(ruta)
+            return ruta
+        except OSError:
+            return None
+
+    def _purgar(self, conservar: Optional[str] = None) -> None:
+        """
+        Elimina resultados expirados (y temporales huérfanos) y, si se supera el
+        tamaño máximo, los menos usados. Nunca elimina `conservar`.
+        """
+        ahora = time.time()
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            if ahora - st.st_mtime > self.ttl_segundos:
+                self._eliminar(ruta)
+            elif nombre.endswith(".xlsx") and ruta != conservar:
+                entradas.append((st.st_mtime, st.st_size, ruta))
+
+        total = sum(tam for _, tam, _ in entradas)
+        if conservar is not None:
+            try:
+                total += os.path.getsize(conservar)
+            except OSError:
+                pass
+        for _, tam, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            self._eliminar(ruta)
+            total -= tam
+
+    def _enlazar(self, ruta: str) -> Optional[str]:
+        """Enlace (o copia) del resultado propio de una solicitud; None si la entrada ya no existe."""
+        destino = f"{ruta[:-len('.xlsx')]}.{uuid.uuid4().hex[:8]}.enviando"
+        try:
+            os.link(ruta, destino)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # Sistema de archivos sin enlaces duros
+            try:
+                shutil.copyfile(ruta, destino)
+            except FileNotFoundError:
+                return None
+        return destino
+
+    @staticmethod
+    def _eliminar(ruta: str) -> None:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    async def obtener_o_calcular(
+        self,
+        clave: str,
+        calcular: Callable[[str], Awaitable[None]]
+    ) -> Tuple[str, bool]:
+        """
+        Retorna el resultado en caché o lo calcula una sola vez.
+
+        `calcular(destino)` debe escribir el resultado en `destino`, un temporal
+        dentro de la carpeta de la caché que luego se renombra a su ruta final.
+        Si ya hay un cálculo en curso para la misma clave, espera ese mismo
+        resultado en vez de repetir el trabajo.
+
+        Returns:
+            Tupla (ruta, desde_cache). `ruta` es un enlace propio de esta
+            llamada, que sigue siendo válido aunque la entrada se purgue; el
+            llamador debe eliminarlo cuando termine de usarlo.
+        """
+        while True:
+            ruta, desde_cache = await self._obtener_o_calcular(clave, calcular)
+            enlace = self._enlazar(ruta)
+            if enlace is not None:
+                return enlace, desde_cache
+            # Otra solicitud purgó la entrada antes de enlazarla: volver a buscarla
+
+    async def _obtener_o_calcular(
+        self,
+        clave: str,
+        calcular: Callable[[str], Awaitable[None]]
+    ) -> Tuple[str, bool]:
+        while True:
+            ruta = self.obtener(clave)
+            if ruta is not None:
+                contar("cache_resultados_total", resultado="hit")
+                return ruta, True
+
+            en_curso = self._en_curso.get(clave)
+            if en_curso is None:
+                break
+            contar("cache_resultados_total", resultado="en_curso")
+            # `wait` no cancela el cálculo compartido si se cancela esta solicitud
+            await asyncio.wait({en_curso})
+            if not en_curso.cancelled():
+                return en_curso.result(), True
+            # Se canceló la solicitud que calculaba: volver a buscar y, si
+            # ninguna otra lo retomó, calcular aquí
+
+        contar("cache_resultados_total", resultado="miss")
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = futuro
+        fd, tmp_path = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        os.close(fd)
+        try:
+            await calcular(tmp_path)
+            ruta = self._ruta(clave)
+            os.replace(tmp_path, ruta)
+            self._purgar(conservar=ruta)
+            futuro.set_result(ruta)
+            return ruta, False
+        except asyncio.CancelledError:
+            self._eliminar(tmp_path)
+            futuro.cancel()
+            raise
+        except Exception as e:
+            self._eliminar(tmp_path)
+            futuro.set_exception(e)
+            # Evita el aviso de "exception was never retrieved" si nadie más esperaba
+            futuro.exception()
+            raise
+        finally:
+            del self._en_curso[clave]
+
+
+cache_resultados = CacheResultados(
+    ConfigAPI.CACHE_DIR,
+    ConfigAPI.CACHE_MAX_MB * 1024 * 1024,
+    ConfigAPI.CACHE_TTL_SEGUNDOS,
+)
@@ -0,0 +1,108 @@
+"""
+Calentamiento del servidor y estado de preparación (`/readyz`).
+
+Al iniciar, una tarea en segundo plano ejecuta en el pool una conciliación
+mínima: procesa un PDF de estado de cuenta generado en memoria y escribe un
+libro Excel. Así pandas, pdfplumber, camelot y openpyxl quedan importados en
+los procesos del pool, y `/readyz` solo responde 200 cuando el camino completo
+funciona. `/healthz` no depende de esto.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from ejecutor import ejecutor
+from metricas import capturar
+
+
+# Extracto mínimo con el formato que reconoce `_parse_estado_cuenta_por_lineas`
+_LINEAS_EXTRACTO = [
+    "ESTADO DE CUENTA",
+    "DESDE: 2025/05/01 HASTA: 2025/05/31",
+    "FECHA DESCRIPCION VALOR SALDO",
+    "2/05 ABONO PRUEBA 1,000.00 1,000.00",
+    "3/05 CARGO PRUEBA -250.00 750.00",
+]
+
+estado: Dict[str, Optional[object]] = {
+    "listo": False,
+    "error": None,
+    "duracion_s": None,
+}
+
+
+def pdf_minimo(lineas: List[str]) -> bytes:
+    """PDF de una página con una línea de texto (Helvetica) por elemento."""
+    texto = ["BT", "/F1 10 Tf", "14 TL", "50 800 Td"]
+    for linea in lineas:
+        linea = linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        texto.append(f"({linea}) Tj T*")
+    texto.append("ET")
+    contenido = "\n".join(texto).encode("latin-1")
+
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length " + str(len(contenido)).encode() + b" >>\nstream\n" + contenido + b"\nendstream",
+    ]
+
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for i, obj in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for pos in posiciones:
+        salida += f"{pos:010d} 00000 n \n".encode()
+    salida += (
+        f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{inicio_xref}\n%%EOF\n"
+    ).encode()
+    return bytes(salida)
+
+
+def calentar() -> int:
+    """
+    Corre en el pool: procesa el PDF mínimo y escribe el libro de conciliación.
+    Retorna el tamaño del libro generado.
+    """
+    import pandas as pd
+    from procesar_pdf import procesar_pdf_universal
+    from unir_archivos import conciliar_movimientos
+
+    # Las observaciones del calentamiento no se suman a /metrics
+    with capturar():
+        df_extracto = procesar_pdf_universal(pdf_minimo(_LINEAS_EXTRACTO))
+        if len(df_extracto) != 2:
+            raise RuntimeError(f"El PDF de calentamiento produjo {len(df_extracto)} movimientos (se esperaban 2)")
+
+        df_contabilidad = pd.DataFrame({
+            "FECHA": ["02/05/2025", "03/05/2025"],
+            "Concepto Contabilidad": ["ABONO PRUEBA", "CARGO PRUEBA"],
+            "VALOR": [1000, -250],
+        })
+        libro = conciliar_movimientos(df_contabilidad, df_extracto)
+    return len(libro)
+
+
+async def calentar_servidor() -> None:
+    """Ejecuta `calentar` en el pool y actualiza `estado`."""
+    inicio = time.monotonic()
+    try:
+        # Arrancar el pool bloquea mientras se precargan los módulos
+        await asyncio.to_thread(ejecutor.iniciar)
+        await ejecutor.ejecutar(calentar)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        estado["error"] = f"{type(e).__name__}: {e}"
+        print(f"ERROR EN CALENTAMIENTO: {estado['error']}")
+    else:
+        estado["listo"] = True
+        estado["error"] = None
+    finally:
+        estado["duracion_s"] = round(time.monotonic() - inicio, 3)
@@ -1,8 +1,9 @@
 """
-Configuración de la aplicación Excel Uploader.
+Configuración de la aplicación Excel Uploader y de la API de conciliaciones.
 Define las variables de entorno y configuraciones necesarias.
 """
 import os
+import tempfile
 from typing import Optional, Tuple, List
 
 
@@ -19,6 +20,8 @@ class Config:
     
     # Rutas
     STANDARDS_DIR: str = os.path.join(os.path.dirname(__file__), "standards")
+    # Segundos entre revisiones de cambios en los JSON de estándares (0 = en cada consulta)
+    STANDARDS_RELOAD_SECONDS: float = float(os.getenv("STANDARDS_RELOAD_SECONDS", "2"))
     
     # Empresas disponibles
     # Estas empresas corresponden a carpetas de primer nivel bajo raw/busint en Azure Storage Gen2
@@ -33,6 +36,40 @@ class Config:
     # Ruta base para archivos de negocio
     BASE_PATH_BUSINT: str = "busint"
     
+    # Carga a Azure Storage por bloques: tamaño de bloque (MB) y bloques enviados en paralelo
+    UPLOAD_CHUNK_MB: int = int(os.getenv("UPLOAD_CHUNK_MB", "4"))
+    UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+    # Reintentos por bloque ante fallas transitorias, con espera exponencial desde UPLOAD_ESPERA_BASE_S
+    UPLOAD_REINTENTOS: int = int(os.getenv("UPLOAD_REINTENTOS", "4"))
+    UPLOAD_ESPERA_BASE_S: float = float(os.getenv("UPLOAD_ESPERA_BASE_S", "0.5"))
+    # Cargas reanudables: desde este tamaño (MB) se guardan en disco los bloques confirmados
+    UPLOAD_REANUDABLE_MB: int = int(os.getenv("UPLOAD_REANUDABLE_MB", "8"))
+    UPLOAD_CHECKPOINT_DIR: str = os.getenv(
+        "UPLOAD_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "excel_uploader_cargas")
+    )
+    # Conexiones HTTP del cliente compartido y vigencia (segundos) de los contenedores ya verificados
+    STORAGE_POOL_CONNECTIONS: int = int(os.getenv("STORAGE_POOL_CONNECTIONS", "32"))
+    STORAGE_PATH_CACHE_SECONDS: float = float(os.getenv("STORAGE_PATH_CACHE_SECONDS", "300"))
+    
+    # Validación del contenido contra el `schema` del estándar (tipos, vacíos, rangos)
+    VALIDACION_FILAS_POR_BLOQUE: int = int(os.getenv("VALIDACION_FILAS_POR_BLOQUE", "5000"))
+    # Errores de ejemplo a mostrar por columna
+    VALIDACION_ERRORES_POR_COLUMNA: int = int(os.getenv("VALIDACION_ERRORES_POR_COLUMNA", "5"))
+    # Al superar esta cantidad de errores se detiene la validación
+    VALIDACION_MAX_ERRORES: int = int(os.getenv("VALIDACION_MAX_ERRORES", "100"))
+    
+    # Máximo de particiones de la copia Parquet de un archivo (opción `partition_by` del estándar)
+    PARQUET_MAX_PARTICIONES: int = int(os.getenv("PARQUET_MAX_PARTICIONES", "5000"))
+    # La copia Parquet queda en memoria hasta este tamaño (MB); si lo supera pasa a un archivo temporal (0: siempre en disco)
+    PARQUET_MEMORIA_MB: int = int(os.getenv("PARQUET_MEMORIA_MB", "8"))
+    
+    # Carga por lote: máximo de archivos (incluidos los de un .zip) y archivos validados / subidos a la vez
+    LOTE_MAX_ARCHIVOS: int = int(os.getenv("LOTE_MAX_ARCHIVOS", "100"))
+    # Tamaño máximo del lote sin comprimir (MB); en un .zip se verifica antes de descomprimir
+    LOTE_MAX_MB: int = int(os.getenv("LOTE_MAX_MB", "500"))
+    LOTE_HILOS_VALIDACION: int = int(os.getenv("LOTE_HILOS_VALIDACION", "2"))
+    LOTE_HILOS_CARGA: int = int(os.getenv("LOTE_HILOS_CARGA", "4"))
+    
     @classmethod
     def validate(cls) -> Tuple[bool, List[str]]:
         """
@@ -54,3 +91,92 @@ class Config:
         
         return len(errores) == 0, errores
 
+
+class ConfigAPI:
+    """Configuración de la API de conciliaciones (main.py)."""
+
+    # Versión del motor de conciliación. Cambiarla invalida los resultados en caché
+    # aunque el código fuente no haya cambiado (p. ej. cambios de librerías).
+    VERSION_MOTOR: str = "1"
+
+    # Caché de resultados en disco
+    CACHE_ACTIVO: bool = os.getenv("CONCILIACION_CACHE_ACTIVO", "1") == "1"
+    CACHE_DIR: str = os.getenv(
+        "CONCILIACION_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "conciliacion_cache")
+    )
+    CACHE_MAX_MB: int = int(os.getenv("CONCILIACION_CACHE_MAX_MB", "500"))
+    CACHE_TTL_SEGUNDOS: int = int(os.getenv("CONCILIACION_CACHE_TTL_SEGUNDOS", str(24 * 3600)))
+
+    # Ejecución del trabajo pesado fuera del event loop
+    # PROCESOS = 0 ejecuta en un hilo del mismo proceso (útil para depurar)
+    PROCESOS: int = int(os.getenv("CONCILIACION_PROCESOS", str(os.cpu_count() or 1)))
+    # Solicitudes que pueden esperar turno además de las que están en ejecución;
+    # por encima de eso se responde 429
+    MAX_EN_COLA: int = int(os.getenv("CONCILIACION_MAX_EN_COLA", "4"))
+    # Memoria de los procesos del pool (Camelot/Ghostscript): cada proceso se
+    # recicla tras N tareas y libera su memoria al superar el RSS indicado; 0 = sin límite
+    PROCESOS_MAX_TAREAS: int = int(os.getenv("CONCILIACION_PROCESOS_MAX_TAREAS", "50"))
+    PROCESOS_MAX_RSS_MB: int = int(os.getenv("CONCILIACION_PROCESOS_MAX_RSS_MB", "1500"))
+
+    # Estimación de memoria antes de las etapas pesadas (memoria.py)
+    # MB que las tareas del pool pueden ocupar a la vez por proceso web; 0 = 50 % de la RAM.
+    # Lo que no cabe espera turno hasta MEMORIA_ESPERA_SEGUNDOS y luego se responde 429
+    MEMORIA_PRESUPUESTO_MB: int = int(os.getenv("CONCILIACION_MEMORIA_PRESUPUESTO_MB", "0"))
+    MEMORIA_ESPERA_SEGUNDOS: int = int(os.getenv("CONCILIACION_MEMORIA_ESPERA_SEGUNDOS", "60"))
+    # Por encima de estas páginas se responde 413; desde MEMORIA_PAGINAS_POR_PAGINA
+    # el PDF se procesa página por página
+    MEMORIA_MAX_PAGINAS: int = int(os.getenv("CONCILIACION_MEMORIA_MAX_PAGINAS", "3000"))
+    MEMORIA_PAGINAS_POR_PAGINA: int = int(os.getenv("CONCILIACION_MEMORIA_PAGINAS_POR_PAGINA", "300"))
+    # Filas máximas del cruce contabilidad/extracto (claves duplicadas); más => 422
+    MEMORIA_MAX_FILAS_CRUCE: int = int(os.getenv("CONCILIACION_MEMORIA_MAX_FILAS_CRUCE", "1000000"))
+    # Archivo JSONL donde anotar estimación y pico real de cada tarea (vacío = no anotar)
+    MEMORIA_CALIBRACION_ARCHIVO: str = os.getenv("CONCILIACION_MEMORIA_CALIBRACION_ARCHIVO", "")
+
+    # Servidor de producción (servidor.py)
+    WEB_WORKERS: int = int(os.getenv("CONCILIACION_WEB_WORKERS", "1"))
+    # Segundos para terminar las solicitudes en curso al reiniciar o apagar
+    APAGADO_GRACIA_SEGUNDOS: int = int(os.getenv("CONCILIACION_APAGADO_GRACIA_SEGUNDOS", "120"))
+
+    # Trabajos asíncronos (/jobs): base SQLite + archivos de entrada/resultado
+    TRABAJOS_DIR: str = os.getenv(
+        "CONCILIACION_TRABAJOS_DIR",
+        os.path.join(tempfile.gettempdir(), "conciliacion_trabajos")
+    )
+    TRABAJOS_WORKERS: int = int(os.getenv("CONCILIACION_TRABAJOS_WORKERS", "1"))
+    TRABAJOS_RETENCION_HORAS: int = int(os.getenv("CONCILIACION_TRABAJOS_RETENCION_HORAS", "48"))
+    # Concesión de un trabajo en curso: su worker la renueva cada tercio; si vence, el trabajo se da por interrumpido
+    TRABAJOS_CONCESION_SEGUNDOS: int = int(os.getenv("CONCILIACION_TRABAJOS_CONCESION_SEGUNDOS", "60"))
+
+    # Recepción de archivos: se copian por bloques a disco (no a memoria)
+    SPOOL_DIR: str = os.getenv(
+        "CONCILIACION_SPOOL_DIR",
+        os.path.join(tempfile.gettempdir(), "conciliacion_spool")
+    )
+    MAX_MB_ARCHIVO: int = int(os.getenv("CONCILIACION_MAX_MB_ARCHIVO", "50"))
+    MAX_MB_SOLICITUD: int = int(os.getenv("CONCILIACION_MAX_MB_SOLICITUD", "100"))
+
+    # Vista previa del extracto (/extracto/preview): primeras páginas con límite de tiempo
+    PREVIEW_PAGINAS: int = int(os.getenv("CONCILIACION_PREVIEW_PAGINAS", "2"))
+    PREVIEW_MOVIMIENTOS: int = int(os.getenv("CONCILIACION_PREVIEW_MOVIMIENTOS", "20"))
+    PREVIEW_LIMITE_SEGUNDOS: float = float(os.getenv("CONCILIACION_PREVIEW_LIMITE_SEGUNDOS", "3"))
+    # Vistas previas simultáneas (corren en hilos del proceso web, no en el pool)
+    PREVIEW_CONCURRENCIA: int = int(os.getenv("CONCILIACION_PREVIEW_CONCURRENCIA", "2"))
+
+    # Progreso de conciliaciones por SSE (/progreso/{id})
+    PROGRESO_DIR: str = os.getenv(
+        "CONCILIACION_PROGRESO_DIR",
+        os.path.join(tempfile.gettempdir(), "conciliacion_progreso")
+    )
+    # Tiempo que /progreso/{id} espera a que aparezca una solicitud aún no recibida
+    PROGRESO_ESPERA_SEGUNDOS: int = int(os.getenv("CONCILIACION_PROGRESO_ESPERA_SEGUNDOS", "30"))
+
+    # Perfilado opcional por solicitud (perfilado.py): requiere activarlo y que
+    # la solicitud traiga el token en X-Perfilar o ?perfilar=
+    PERFILADO_ACTIVO: bool = os.getenv("CONCILIACION_PERFILADO", "0") == "1"
+    PERFILADO_TOKEN: str = os.getenv("CONCILIACION_PERFILADO_TOKEN", "")
+    PERFILADO_DIR: str = os.getenv(
+        "CONCILIACION_PERFILADO_DIR",
+        os.path.join(tempfile.gettempdir(), "conciliacion_perfiles")
+    )
+    PERFILADO_MAX: int = int(os.getenv("CONCILIACION_PERFILADO_MAX", "20"))
@@ -0,0 +1,375 @@
+"""
+Ejecución del trabajo pesado (PDF, contabilidad, conciliación) fuera del event loop.
+
+El trabajo corre en un pool de procesos configurable. La admisión es acotada:
+si ya hay `procesos + max_en_cola` solicitudes admitidas, se rechaza de
+inmediato con `ServidorOcupado` en lugar de acumular archivos en memoria.
+
+Donde el sistema lo permite (Linux), los procesos del pool se crean con
+`forkserver`: pandas, pdfplumber, camelot y openpyxl se importan una sola vez
+en el servidor de forks y cada proceso nuevo comparte esas páginas
+(copy-on-write) en vez de volver a importarlas. Cada proceso se recicla por su
+cuenta tras `PROCESOS_MAX_TAREAS` tareas; el que termina una tarea por encima
+de `PROCESOS_MAX_RSS_MB` devuelve al sistema su memoria libre, sin tocar a los
+demás procesos del pool.
+
+Las tareas con estimación de memoria (ver memoria.py) reservan sus MB de un
+presupuesto; si no alcanza, esperan a que otras liberen antes de entrar al pool.
+"""
+import asyncio
+import ctypes
+import gc
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from config import ConfigAPI
+from memoria import EstimacionMemoria, pico_mb, presupuesto_mb, registrar as registrar_memoria, reiniciar_pico
+from metricas import capturar, contar, registro
+from progreso import marcar, reportar
+
+
+# Módulos que el servidor de forks importa una sola vez
+MODULOS_PRECARGA = [
+    "pandas",
+    "openpyxl",
+    "pdfplumber",
+    "camelot",
+    "procesar_pdf",
+    "leer_contabilidad",
+    "unir_archivos",
+]
+
+
+class SinMovimientosPDF(Exception):
+    """El PDF no produjo movimientos (escaneado o formato no soportado)."""
+
+
+class ContabilidadNoSoportada(Exception):
+    """El archivo de contabilidad está en un formato que no se puede leer (p. ej. .xls)."""
+
+
+class ServidorOcupado(Exception):
+    """No hay cupo para admitir la solicitud."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Servidor ocupado, reintente en {retry_after} s")
+        self.retry_after = retry_after
+
+
+def conciliar_archivos(
+    pdf_path: str,
+    contabilidad_path: str,
+    contabilidad_nombre: str,
+    destino: str,
+    por_pagina: bool = False
+) -> str:
+    """
+    Procesa el PDF y la contabilidad y escribe el Excel de conciliación en `destino`.
+    Se ejecuta dentro del pool: recibe y retorna rutas en disco, no el contenido.
+    Con `por_pagina` el PDF se lee página por página (PDFs largos, ver memoria.py).
+    """
+    from procesar_pdf import procesar_pdf_universal, procesar_pdf_por_pagina
+    from leer_contabilidad import leer_contabilidad, FormatoNoSoportado
+    from unir_archivos import conciliar_movimientos
+
+    # --- Procesar PDF ---
+    if por_pagina:
+        df_extracto = procesar_pdf_por_pagina(pdf_path)
+    else:
+        df_extracto = procesar_pdf_universal(pdf_path)
+    contar("extracto_movimientos_total", len(df_extracto))
+    if df_extracto.empty:
+        raise SinMovimientosPDF("No se pudo extraer información del PDF.")
+
+    # --- Leer contabilidad (Excel, CSV o Parquet) solo con las columnas necesarias ---
+    try:
+        df_contabilidad = leer_contabilidad(contabilidad_path, contabilidad_nombre)
+    except FormatoNoSoportado as e:
+        # Excepción propia del ejecutor: main.py la atiende sin importar pandas
+        raise ContabilidadNoSoportada(str(e)) from None
+    # FIX CRÍTICO: Resetear índice del DataFrame leído para evitar problemas de alineación
+    df_contabilidad = df_contabilidad.reset_index(drop=True)
+
+    # --- Conciliación ---
+    return conciliar_movimientos(df_contabilidad, df_extracto, destino)
+
+
+def extraer_movimientos_ndjson(pdf_path: str, destino: str) -> int:
+    """
+    Escribe los movimientos del PDF en `destino` como NDJSON, página por página.
+    Se ejecuta dentro del pool; cada página se vuelca al disco en cuanto se
+    procesa para que el proceso web la envíe mientras sigue el resto.
+
+    Líneas: {"extracto": {...}} al inicio, una por movimiento con su página y
+    {"fin": {...}} al terminar.
+
+    Returns:
+        Cantidad de movimientos escritos.
+    """
+    from procesar_pdf import movimientos_por_pagina
+
+    total_movimientos = 0
+    with open(destino, "w", encoding="utf-8") as f:
+        paginas = 0
+        for pagina, paginas_total, tipo, df in movimientos_por_pagina(pdf_path):
+            if pagina == 1:
+                f.write(json.dumps({"extracto": {"tipo": tipo, "paginas_total": paginas_total}}) + "\n")
+            for fila in df.to_dict(orient="records"):
+                f.write(json.dumps({"pagina": pagina, **fila}, ensure_ascii=False) + "\n")
+            total_movimientos += len(df)
+            paginas = pagina
+            f.flush()
+        f.write(json.dumps({"fin": {"paginas": paginas, "movimientos": total_movimientos}}) + "\n")
+    contar("extracto_movimientos_total", total_movimientos)
+    return total_movimientos
+
+
+def _rss_mb() -> float:
+    """Memoria residente actual del proceso en MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Sin /proc: pico de RSS (KB en Linux, bytes en macOS)
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024
+
+
+def _liberar_memoria() -> None:
+    """Recolecta la basura y devuelve al sistema la memoria libre del heap (glibc)."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        # Sin glibc: queda solo la recolección
+        pass
+
+
+def _ejecutar_con_metricas(progreso: Optional[str], max_rss_mb: int, funcion: Callable, *args):
+    """
+    Corre en el pool: retorna el resultado junto con las métricas capturadas y
+    el pico de memoria que agregó la tarea (None si no se puede medir). Con
+    `progreso`, las etapas y contadores se escriben en ese archivo mientras
+    avanza. Si al terminar el proceso supera `max_rss_mb` (0 = sin límite),
+    libera su memoria antes de tomar la siguiente tarea.
+    """
+    inicial = reiniciar_pico()
+    with capturar() as observaciones, reportar(progreso):
+        resultado = funcion(*args)
+        pico = pico_mb()
+        if max_rss_mb > 0 and _rss_mb() > max_rss_mb:
+            # Un proceso del pool no puede salir por su cuenta sin romper el
+            # pool: se reduce solo este proceso; el reciclaje es por tareas
+            _liberar_memoria()
+            contar("pool_liberaciones_total", motivo="rss")
+    pico_extra = pico - inicial if inicial is not None and pico is not None else None
+    return resultado, observaciones, pico_extra
+
+
+def _contexto_pool():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload(MODULOS_PRECARGA)
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+class Ejecutor:
+    """Pool de trabajo con admisión acotada."""
+
+    def __init__(
+        self,
+        procesos: int,
+        max_en_cola: int,
+        max_tareas: int = 0,
+        max_rss_mb: int = 0,
+        presupuesto_mb: int = 0,
+        espera_memoria_s: float = 60
+    ):
+        """
+        Args:
+            procesos: Procesos del pool (0 = un hilo en el proceso actual).
+            max_en_cola: Solicitudes que pueden esperar además de las que se ejecutan.
+            max_tareas: Tareas por proceso antes de reemplazarlo (0 = sin límite).
+            max_rss_mb: Memoria residente a partir de la cual un proceso libera su memoria (0 = sin límite).
+            presupuesto_mb: MB estimados que pueden ejecutarse a la vez (0 = sin límite).
+            espera_memoria_s: Espera máxima por presupuesto antes de rechazar.
+        """
+        self.procesos = procesos
+        self.capacidad = max(procesos, 1) + max_en_cola
+        self.max_tareas = max_tareas
+        self.max_rss_mb = max_rss_mb
+        self.presupuesto_mb = presupuesto_mb
+        self.espera_memoria_s = espera_memoria_s
+        self._admitidas = 0
+        self._reservado_mb = 0.0
+        # Se crea con el primer uso, dentro del event loop
+        self._memoria_liberada: Optional[asyncio.Condition] = None
+        self._pool: Optional[Executor] = None
+        # iniciar() corre en un hilo aparte durante el arranque
+        self._lock = threading.Lock()
+        # Duración promedio (EMA) para estimar Retry-After
+        self._duracion_promedio = 5.0
+
+    def _obtener_pool(self) -> Executor:
+        with self._lock:
+            return self._crear_pool()
+
+    def _crear_pool(self) -> Executor:
+        if self._pool is None:
+            if self.procesos > 0:
+                opciones = {}
+                if self.max_tareas > 0 and sys.version_info >= (3, 11):
+                    opciones["max_tasks_per_child"] = self.max_tareas
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=_contexto_pool(),
+                    **opciones,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=1)
+        return self._pool
+
+    def iniciar(self) -> None:
+        """
+        Arranca los procesos del pool sin esperar a la primera solicitud, de modo
+        que la precarga de módulos ocurra al iniciar el servidor. Bloquea hasta
+        que el servidor de forks terminó la precarga: llamarlo fuera del event loop.
+        """
+        pool = self._obtener_pool()
+        if self.procesos > 0:
+            for _ in range(self.procesos):
+                pool.submit(os.getpid)
+
+    @property
+    def admitidas(self) -> int:
+        return self._admitidas
+
+    def retry_after(self) -> int:
+        """Segundos sugeridos para reintentar según la carga actual."""
+        turnos = self._admitidas / max(self.procesos, 1)
+        return max(1, math.ceil(turnos * self._duracion_promedio))
+
+    @property
+    def reservado_mb(self) -> float:
+        return self._reservado_mb
+
+    async def _reservar(self, mb: float, progreso: Optional[str]) -> float:
+        """Reserva `mb` del presupuesto; espera si no alcanza. Retorna lo reservado."""
+        if self.presupuesto_mb <= 0 or mb <= 0:
+            return 0.0
+        # Lo que supera el presupuesto completo ya se rechazó con memoria.verificar
+        mb = min(mb, self.presupuesto_mb)
+        if self._memoria_liberada is None:
+            self._memoria_liberada = asyncio.Condition()
+
+        def cabe() -> bool:
+            return self._reservado_mb + mb <= self.presupuesto_mb
+
+        async with self._memoria_liberada:
+            if not cabe():
+                contar("memoria_esperas_total")
+                marcar(progreso, "esperando_memoria")
+                try:
+                    await asyncio.wait_for(self._memoria_liberada.wait_for(cabe), self.espera_memoria_s)
+                except asyncio.TimeoutError:
+                    contar("memoria_rechazos_total", motivo="espera")
+                    raise ServidorOcupado(self.retry_after())
+            self._reservado_mb += mb
+        return mb
+
+    async def _liberar(self, mb: float) -> None:
+        if mb <= 0:
+            return
+        async with self._memoria_liberada:
+            self._reservado_mb -= mb
+            self._memoria_liberada.notify_all()
+
+    async def ejecutar(
+        self,
+        funcion: Callable,
+        *args,
+        progreso: Optional[str] = None,
+        memoria: Optional[EstimacionMemoria] = None,
+        al_enviar: Optional[Callable[[], None]] = None
+    ):
+        """
+        Ejecuta `funcion(*args)` en el pool sin bloquear el event loop.
+        `progreso` es el archivo donde reportar el avance (ver progreso.py).
+        Con `memoria`, la tarea reserva los MB estimados del presupuesto y su
+        pico real se registra para calibrar la estimación. `al_enviar` se llama
+        justo antes de entregar la tarea al pool: desde ahí, cancelar la espera
+        no detiene el proceso que la calcula.
+
+        Raises:
+            ServidorOcupado: si no hay cupo de admisión o de memoria.
+        """
+        if self._admitidas >= self.capacidad:
+            raise ServidorOcupado(self.retry_after())
+
+        self._admitidas += 1
+        inicio = time.monotonic()
+        reservado = 0.0
+        pool = None
+        try:
+            if memoria is not None:
+                reservado = await self._reservar(memoria.mb, progreso)
+            pool = self._obtener_pool()
+            loop = asyncio.get_running_loop()
+            inicio_tarea = time.monotonic()
+            if al_enviar is not None:
+                al_enviar()
+            # Con procesos=0 la tarea corre en el proceso web: no se libera su memoria
+            max_rss_mb = self.max_rss_mb if self.procesos > 0 else 0
+            resultado, observaciones, pico_extra = await loop.run_in_executor(
+                pool, _ejecutar_con_metricas, progreso, max_rss_mb, funcion, *args
+            )
+            registro.aplicar(observaciones)
+            if memoria is not None:
+                nombre = getattr(funcion, "__name__", str(funcion))
+                registrar_memoria(memoria, pico_extra, nombre, time.monotonic() - inicio_tarea)
+            return resultado
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. OOM): descartar ese pool para que el siguiente se recree
+            self._descartar(pool)
+            raise
+        finally:
+            await self._liberar(reservado)
+            self._admitidas -= 1
+            duracion = time.monotonic() - inicio
+            self._duracion_promedio = 0.8 * self._duracion_promedio + 0.2 * duracion
+
+    def _descartar(self, pool: Optional[Executor]) -> None:
+        """
+        Descarta un pool roto. Si otra tarea del mismo pool ya lo descartó y se
+        creó uno nuevo, no lo toca: las tareas del pool nuevo siguen su curso.
+        """
+        with self._lock:
+            if pool is None or self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def cerrar(self, esperar: bool = False) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=esperar, cancel_futures=True)
+            self._pool = None
+
+
+ejecutor = Ejecutor(
+    ConfigAPI.PROCESOS,
+    ConfigAPI.MAX_EN_COLA,
+    ConfigAPI.PROCESOS_MAX_TAREAS,
+    ConfigAPI.PROCESOS_MAX_RSS_MB,
+    presupuesto_mb(),
+    ConfigAPI.MEMORIA_ESPERA_SEGUNDOS,
+)
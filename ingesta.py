@@ -0,0 +1,182 @@
+"""
+Recepción de archivos subidos sin cargarlos completos en memoria.
+
+Cada UploadFile se copia por bloques a un archivo temporal en `SPOOL_DIR`
+mientras se calcula su SHA-256, aplicando el límite por archivo. El límite por
+solicitud se aplica antes, en `LimiteTamanoSolicitud`, con Content-Length o
+contando los bytes del cuerpo a medida que llegan.
+
+Solo el límite por solicitud actúa mientras el cuerpo llega. Starlette
+interpreta el multipart completo (y pasa a disco cada archivo de más de 1 MB)
+antes de llamar al endpoint, así que el límite por archivo es una verificación
+posterior: evita procesar y conservar un archivo demasiado grande, pero no que
+se reciba. El disco que ocupa una solicitud lo acota `MAX_MB_SOLICITUD`, y cada
+archivo aceptado queda escrito dos veces (el temporal de Starlette y la copia
+en `SPOOL_DIR`).
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from config import ConfigAPI
+
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """El archivo o la solicitud supera el tamaño permitido."""
+
+    def __init__(self, mensaje: str, limite_bytes: int):
+        super().__init__(mensaje)
+        self.limite_bytes = limite_bytes
+
+
+class ArchivoRecibido:
+    """Archivo subido ya guardado en disco."""
+
+    def __init__(self, ruta: str, nombre: str, sha256: str, tamano: int):
+        self.ruta = ruta
+        self.nombre = nombre
+        self.sha256 = sha256
+        self.tamano = tamano
+
+    def eliminar(self) -> None:
+        try:
+            os.remove(self.ruta)
+        except OSError:
+            pass
+
+
+async def recibir_archivo(
+    upload: UploadFile,
+    limite_bytes: Optional[int] = None,
+    directorio: Optional[str] = None
+) -> ArchivoRecibido:
+    """
+    Copia el UploadFile a disco por bloques calculando su hash.
+
+    Cuando se llama, Starlette ya recibió el archivo completo: `limite_bytes`
+    se verifica sobre esa copia (ver el docstring del módulo).
+
+    Args:
+        upload: Archivo recibido por FastAPI.
+        limite_bytes: Tamaño máximo permitido (por defecto `MAX_MB_ARCHIVO`).
+        directorio: Carpeta destino (por defecto `SPOOL_DIR`).
+
+    Raises:
+        ArchivoDemasiadoGrande: si se supera el límite; el archivo parcial se elimina.
+    """
+    limite_bytes = limite_bytes or ConfigAPI.MAX_MB_ARCHIVO * 1024 * 1024
+    directorio = directorio or ConfigAPI.SPOOL_DIR
+    os.makedirs(directorio, exist_ok=True)
+
+    nombre = upload.filename or ""
+    fd, ruta = tempfile.mkstemp(dir=directorio, suffix=os.path.splitext(nombre)[1].lower())
+    h = hashlib.sha256()
+    tamano = 0
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                bloque = await upload.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                tamano += len(bloque)
+                if tamano > limite_bytes:
+                    raise ArchivoDemasiadoGrande(
+                        f"El archivo '{nombre}' supera el máximo de {limite_bytes // (1024 * 1024)} MB",
+                        limite_bytes,
+                    )
+                h.update(bloque)
+                destino.write(bloque)
+    except BaseException:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+        raise
+
+    return ArchivoRecibido(ruta, nombre, h.hexdigest(), tamano)
+
+
+def hash_archivo(ruta: str) -> str:
+    """SHA-256 de un archivo en disco, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class LimiteTamanoSolicitud:
+    """
+    Middleware ASGI que rechaza con 413 las solicitudes POST cuyo cuerpo supera
+    `max_bytes`, antes de que el cuerpo completo se reciba y se procese.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _mensaje(self) -> str:
+        return f"La solicitud supera el máximo de {self.max_bytes // (1024 * 1024)} MB"
+
+    async def _responder_413(self, send) -> None:
+        cuerpo = json.dumps({"detail": self._mensaje()}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        # 1) Si el cliente declara Content-Length, decidir sin leer el cuerpo
+        for nombre, valor in scope["headers"]:
+            if nombre == b"content-length":
+                try:
+                    if int(valor) > self.max_bytes:
+                        await self._responder_413(send)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        # 2) Sin Content-Length (chunked) o si miente: contar a medida que llega
+        recibidos = 0
+        respuesta_iniciada = False
+
+        async def receive_contando():
+            nonlocal recibidos
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibidos += len(mensaje.get("body", b""))
+                if recibidos > self.max_bytes:
+                    # FastAPI re-lanza HTTPException ocurridas al leer el cuerpo
+                    raise HTTPException(status_code=413, detail=self._mensaje())
+            return mensaje
+
+        async def send_registrando(mensaje):
+            nonlocal respuesta_iniciada
+            if mensaje["type"] == "http.response.start":
+                respuesta_iniciada = True
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_contando, send_registrando)
+        except HTTPException as e:
+            if e.status_code != 413 or respuesta_iniciada:
+                raise
+            await self._responder_413(send)
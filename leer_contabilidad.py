@@ -0,0 +1,278 @@
+"""
+Lectura del archivo de contabilidad (Excel, CSV o Parquet).
+
+En lugar de cargar el libro completo con `pd.read_excel`, lee primero solo el
+encabezado, resuelve las columnas FECHA / VALOR / Concepto Contabilidad con el
+mismo mapeo de `conciliar_movimientos` y luego carga únicamente esas columnas.
+
+Muchos ERP ponen empresa, título y rango de fechas en las primeras filas; el
+encabezado real se busca entre las primeras `FILAS_BUSQUEDA_ENCABEZADO` filas.
+"""
+import codecs
+import csv
+import io
+import itertools
+import os
+from typing import Literal
+
+import pandas as pd
+
+from metricas import medir, contar
+import progreso
+from unir_archivos import _norm, _resolver_columnas_contabilidad
+
+
+FormatoContabilidad = Literal["excel", "csv", "parquet"]
+
+COLUMNAS_CONTABILIDAD = ["FECHA", "Concepto Contabilidad", "VALOR"]
+
+# Tipos explícitos al cargar. FECHA y VALOR de Excel conservan el tipo de la
+# celda; en CSV llegan como texto y `conciliar_movimientos` los convierte.
+_DTYPES_CSV = {"FECHA": str, "Concepto Contabilidad": str, "VALOR": str}
+
+# Codificaciones de CSV, en orden: UTF-8 (con o sin BOM) y las que usan Excel y
+# los ERP en Windows. latin-1 decodifica cualquier byte, así que nunca falla.
+_CODIFICACIONES_CSV = ("utf-8-sig", "cp1252", "latin-1")
+
+# Máximo de filas a revisar buscando el encabezado real
+FILAS_BUSQUEDA_ENCABEZADO = 30
+
+# Nombres (normalizados) que reconoce `_resolver_columnas_contabilidad`
+_ALIAS_ENCABEZADO = {
+    "FECHA",
+    "VALOR",
+    "MOVIMIENTO",
+    "ASIENTO",
+    "CONCEPTO",
+    "CONCEPTO CONTABILIDAD",
+    "DESCRIPCION",
+}
+
+_EXTENSIONES = {
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+    ".csv": "csv",
+    ".txt": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+# Excel 97-2003 (.xls, contenedor OLE2): openpyxl no lo lee
+_FIRMA_OLE2 = b"\xd0\xcf\x11\xe0"
+
+
+class FormatoNoSoportado(ValueError):
+    """El archivo de contabilidad está en un formato que no se puede leer."""
+
+
+def _abrir(fuente):
+    """Acepta ruta, bytes u objeto file-like y retorna algo que pandas/openpyxl puedan leer."""
+    if isinstance(fuente, (bytes, bytearray)):
+        return io.BytesIO(fuente)
+    if hasattr(fuente, "seek"):
+        fuente.seek(0)
+    return fuente
+
+
+def _detectar_formato(fuente, nombre_archivo: str = "") -> FormatoContabilidad:
+    ext = os.path.splitext(nombre_archivo or (fuente if isinstance(fuente, str) else ""))[1].lower()
+    if ext == ".xls":
+        raise FormatoNoSoportado("Formato .xls no soportado: guarde el archivo como .xlsx")
+    if ext in _EXTENSIONES:
+        return _EXTENSIONES[ext]
+
+    # Sin extensión conocida: decidir por la firma del archivo
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, "rb") as f:
+            firma = f.read(4)
+    else:
+        f = _abrir(fuente)
+        firma = f.read(4)
+        f.seek(0)
+
+    if firma.startswith(b"PK"):
+        return "excel"
+    if firma == b"PAR1":
+        return "parquet"
+    if firma == _FIRMA_OLE2:
+        raise FormatoNoSoportado("Formato .xls no soportado: guarde el archivo como .xlsx")
+    return "csv"
+
+
+def _puntaje_encabezado(fila) -> int:
+    """Cantidad de alias de columna distintos presentes en la fila."""
+    return len({_norm(str(v)) for v in fila if v is not None} & _ALIAS_ENCABEZADO)
+
+
+def _indice_encabezado(filas: list) -> int:
+    """
+    Retorna el índice de la fila que más parece encabezado.
+    Si ninguna tiene al menos dos alias, asume la primera fila (comportamiento de pandas).
+    """
+    mejor_idx, mejor_puntaje = 0, 1
+    for i, fila in enumerate(filas):
+        puntaje = _puntaje_encabezado(fila)
+        if puntaje > mejor_puntaje:
+            mejor_idx, mejor_puntaje = i, puntaje
+    return mejor_idx
+
+
+def _leer_excel(fuente) -> pd.DataFrame:
+    from openpyxl import load_workbook
+
+    # Con ruta se abre el archivo: openpyxl valida la extensión de las rutas y
+    # los archivos recibidos se guardan sin ella
+    archivo = open(fuente, "rb") if isinstance(fuente, (str, os.PathLike)) else _abrir(fuente)
+    wb = load_workbook(archivo, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+
+        # Solo se leen las primeras filas para ubicar el encabezado; el resto se
+        # consume del mismo iterador, así el libro se recorre una sola vez.
+        primeras = []
+        for fila in filas:
+            primeras.append(fila)
+            if len(primeras) >= FILAS_BUSQUEDA_ENCABEZADO:
+                break
+        if not primeras:
+            raise ValueError("El archivo de contabilidad está vacío")
+
+        idx = _indice_encabezado(primeras)
+        encabezado = primeras[idx]
+        pendientes = primeras[idx + 1 :]
+
+        renombre = _resolver_columnas_contabilidad(list(encabezado))
+        indices = {renombre[c]: i for i, c in enumerate(encabezado) if c in renombre}
+
+        datos = {col: [] for col in indices}
+        leidas = 0
+        for fila in itertools.chain(pendientes, filas):
+            leidas += 1
+            if leidas % 1000 == 0:
+                progreso.avance("filas_contabilidad", leidas)
+            valores = {col: (fila[i] if i < len(fila) else None) for col, i in indices.items()}
+            # Igual que pandas: ignorar filas completamente vacías
+            if all(v is None for v in valores.values()):
+                continue
+            for col, v in valores.items():
+                datos[col].append(v)
+    finally:
+        wb.close()
+        if archivo is not fuente:
+            archivo.close()
+
+    df = pd.DataFrame(datos)
+    if "Concepto Contabilidad" in df.columns:
+        df["Concepto Contabilidad"] = df["Concepto Contabilidad"].map(
+            lambda v: None if v is None else str(v)
+        ).astype(object)
+    return df
+
+
+def _separador_csv(muestra: str) -> str:
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+    except csv.Error:
+        # Las filas de preámbulo confunden al Sniffer: usar el separador más frecuente
+        return max(",;\t|", key=muestra.count)
+
+
+def _muestra_csv(fuente) -> bytes:
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, "rb") as f:
+            return f.read(64 * 1024)
+    f = _abrir(fuente)
+    muestra = f.read(64 * 1024)
+    f.seek(0)
+    return muestra
+
+
+def _codificaciones_csv(muestra: bytes) -> list:
+    """Codificaciones a probar, desde la primera que decodifica la muestra."""
+    for i, codificacion in enumerate(_CODIFICACIONES_CSV):
+        try:
+            # Incremental: la muestra puede cortar un carácter multibyte al final
+            codecs.getincrementaldecoder(codificacion)().decode(muestra, final=False)
+        except UnicodeDecodeError:
+            continue
+        return list(_CODIFICACIONES_CSV[i:])
+    return [_CODIFICACIONES_CSV[-1]]
+
+
+def _leer_csv(fuente) -> pd.DataFrame:
+    muestra = _muestra_csv(fuente)
+    codificaciones = _codificaciones_csv(muestra)
+    for codificacion in codificaciones:
+        try:
+            return _leer_csv_codificado(fuente, muestra.decode(codificacion, errors="replace"), codificacion)
+        except UnicodeDecodeError:
+            # Bytes fuera de la muestra que no son de esta codificación: probar la siguiente
+            if codificacion == codificaciones[-1]:
+                raise
+
+
+def _leer_csv_codificado(fuente, muestra: str, codificacion: str) -> pd.DataFrame:
+    sep = _separador_csv(muestra)
+
+    primeras = list(itertools.islice(csv.reader(io.StringIO(muestra), delimiter=sep), FILAS_BUSQUEDA_ENCABEZADO))
+    skiprows = _indice_encabezado(primeras)
+
+    encabezado = pd.read_csv(
+        _abrir(fuente), sep=sep, skiprows=skiprows, nrows=0, encoding=codificacion
+    ).columns
+    renombre = _resolver_columnas_contabilidad(list(encabezado))
+
+    df = pd.read_csv(
+        _abrir(fuente),
+        sep=sep,
+        skiprows=skiprows,
+        encoding=codificacion,
+        usecols=list(renombre),
+        dtype={c: _DTYPES_CSV[renombre[c]] for c in renombre},
+    )
+    return df.rename(columns=renombre)
+
+
+def _leer_parquet(fuente) -> pd.DataFrame:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Para leer contabilidad en Parquet se requiere el paquete 'pyarrow'")
+
+    archivo = pq.ParquetFile(_abrir(fuente))
+    renombre = _resolver_columnas_contabilidad(archivo.schema_arrow.names)
+    df = archivo.read(columns=list(renombre)).to_pandas()
+    return df.rename(columns=renombre)
+
+
+_LECTORES = {
+    "excel": _leer_excel,
+    "csv": _leer_csv,
+    "parquet": _leer_parquet,
+}
+
+
+def leer_contabilidad(fuente, nombre_archivo: str = "") -> pd.DataFrame:
+    """
+    Lee el archivo de contabilidad cargando solo las columnas necesarias.
+
+    Args:
+        fuente: Ruta, bytes u objeto file-like con el archivo.
+        nombre_archivo: Nombre original (se usa la extensión para elegir el lector).
+
+    Returns:
+        DataFrame con columnas FECHA, Concepto Contabilidad y VALOR.
+    """
+    formato = _detectar_formato(fuente, nombre_archivo)
+    progreso.etapa("contabilidad")
+    with medir("ingesta_contabilidad"):
+        df = _LECTORES[formato](fuente)
+    contar("contabilidad_filas_total", len(df), formato=formato)
+    progreso.avance("filas_contabilidad", len(df), len(df))
+
+    # asegurar columna concepto
+    if "Concepto Contabilidad" not in df.columns:
+        df["Concepto Contabilidad"] = ""
+
+    return df[COLUMNAS_CONTABILIDAD].reset_index(drop=True)
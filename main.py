@@ -1,13 +1,44 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, UploadFile, File, Query
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from procesar_pdf import procesar_pdf_universal
-from unir_archivos import conciliar_movimientos
-import pandas as pd
-from io import BytesIO
+from cache_resultados import cache_resultados
+from ejecutor import (
+    ejecutor, conciliar_archivos, extraer_movimientos_ndjson,
+    SinMovimientosPDF, ContabilidadNoSoportada, ServidorOcupado
+)
+from ingesta import recibir_archivo, ArchivoDemasiadoGrande, LimiteTamanoSolicitud
+from memoria import SolicitudDemasiadoGrande, CruceDemasiadoGrande
+from trabajos import obtener_almacen, iniciar_workers, detener_workers, COMPLETADO
+from metricas import registro, contar, medir
+from perfilado import solicitud_perfilada, nuevo_id, ejecutar_perfilado, purgar_perfiles
+from calentamiento import calentar_servidor, estado as estado_calentamiento
+from typing import Optional
+import memoria
+import progreso
+from config import ConfigAPI
+import asyncio
+import json
 import os
+import tempfile
+import time
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs("static", exist_ok=True)
+    iniciar_workers()
+    # Arrancar el pool (precarga de librerías pesadas) y probar el camino
+    # completo sin bloquear el arranque; /readyz responde 200 al terminar
+    calentamiento = asyncio.create_task(calentar_servidor())
+    yield
+    calentamiento.cancel()
+    await detener_workers()
+    ejecutor.cerrar(esperar=True)
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS: permitir todos los orígenes, sin credenciales ---
 app.add_middleware(
@@ -18,42 +49,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Límite por solicitud: rechaza antes de recibir el cuerpo completo ---
+app.add_middleware(LimiteTamanoSolicitud, max_bytes=ConfigAPI.MAX_MB_SOLICITUD * 1024 * 1024)
+
+
 @app.post("/conciliacion-unificada/")
 async def conciliacion_unificada(
+    request: Request,
     pdf_file: UploadFile = File(...),
-    contabilidad_file: UploadFile = File(...)
+    contabilidad_file: UploadFile = File(...),
+    progreso_id: Optional[str] = Query(None, description="Id elegido por el cliente para seguir el avance en /progreso/{id}")
 ):
+    recibidos = []
+    # --- Perfilado opcional (solo administradores, ver perfilado.py) ---
+    perfil_id = None
+    if solicitud_perfilada(request.headers.get("X-Perfilar"), request.query_params.get("perfilar")):
+        perfil_id = nuevo_id()
+    # --- Progreso opcional: el cliente abre /progreso/{progreso_id} en paralelo ---
+    ruta_progreso = None
+    if progreso_id is not None:
+        if not progreso.id_valido(progreso_id):
+            return JSONResponse(
+                status_code=422,
+                content={"detail": "progreso_id debe tener de 8 a 64 caracteres (letras, números, _ o -)"}
+            )
+        progreso.purgar()
+        ruta_progreso = progreso.ruta_progreso(progreso_id)
     try:
-        # --- Procesar PDF ---
-        df_extracto = procesar_pdf_universal(pdf_file)
+        # --- Copiar las subidas a disco por bloques, con hash y límite por archivo ---
+        pdf = await recibir_archivo(pdf_file)
+        recibidos.append(pdf)
+        contabilidad = await recibir_archivo(contabilidad_file)
+        recibidos.append(contabilidad)
+        contar("entrada_bytes_total", pdf.tamano, archivo="pdf")
+        contar("entrada_bytes_total", contabilidad.tamano, archivo="contabilidad")
+        progreso.marcar(ruta_progreso, "en_cola")
 
-        if df_extracto.empty:
-            return JSONResponse(
-                status_code=400,
-                content={"detail": "No se pudo extraer información del PDF."}
+        async def calcular(destino: str) -> None:
+            # Estimar la memoria solo al calcular: un acierto de caché no la usa
+            estimacion = await asyncio.to_thread(
+                memoria.estimar, pdf.ruta, contabilidad.ruta, contabilidad.nombre
             )
+            memoria.verificar(estimacion)
+            # PDF, lectura de contabilidad y conciliación corren en el pool de procesos;
+            # el libro se escribe directo en `destino`, sin pasar por memoria
+            args = (pdf.ruta, contabilidad.ruta, contabilidad.nombre, destino, estimacion.por_pagina)
+            if perfil_id is None:
+                await ejecutor.ejecutar(
+                    conciliar_archivos, *args, progreso=ruta_progreso, memoria=estimacion
+                )
+            else:
+                directorio = os.path.join(ConfigAPI.PERFILADO_DIR, perfil_id)
+                await ejecutor.ejecutar(
+                    ejecutar_perfilado, directorio, conciliar_archivos, *args,
+                    progreso=ruta_progreso, memoria=estimacion
+                )
 
-        # --- Leer Excel contabilidad directamente en memoria ---
-        contabilidad_bytes = await contabilidad_file.read()
-        df_contabilidad = pd.read_excel(BytesIO(contabilidad_bytes))
-        # FIX CRÍTICO: Resetear índice del DataFrame leído para evitar problemas de alineación
-        df_contabilidad = df_contabilidad.reset_index(drop=True)
+        # --- Reintentos y doble clic: mismo PDF + misma contabilidad => mismo resultado ---
+        with medir("solicitud"):
+            # Una solicitud perfilada siempre calcula: un acierto de caché no mide nada
+            if ConfigAPI.CACHE_ACTIVO and perfil_id is None:
+                clave = cache_resultados.clave(pdf.sha256, contabilidad.sha256)
+                # Enlace propio al resultado: una purga de la caché no lo afecta
+                ruta_excel, desde_cache = await cache_resultados.obtener_o_calcular(clave, calcular)
+            else:
+                fd, ruta_excel = tempfile.mkstemp(dir=ConfigAPI.SPOOL_DIR, suffix=".xlsx")
+                os.close(fd)
+                try:
+                    await calcular(ruta_excel)
+                except BaseException:
+                    os.remove(ruta_excel)
+                    raise
+                desde_cache = False
+            # El enlace o el temporal se elimina después de enviar la respuesta
+            limpieza = BackgroundTask(os.remove, ruta_excel)
+        contar("salida_bytes_total", os.path.getsize(ruta_excel))
+        contar("solicitudes_total", codigo="200")
+        progreso.marcar(ruta_progreso, progreso.COMPLETADO, cache="HIT" if desde_cache else "MISS")
 
-        # --- Conciliación ---
-        excel_bytes = conciliar_movimientos(df_contabilidad, df_extracto)
+        encabezados = {"X-Cache": "HIT" if desde_cache else "MISS"}
+        if perfil_id is not None:
+            encabezados["X-Perfil-Id"] = perfil_id
 
-        # --- Retornar Excel como streaming ---
-        return StreamingResponse(
-            BytesIO(excel_bytes),
+        # --- Retornar Excel desde archivo (Content-Length y envío por bloques/sendfile) ---
+        return FileResponse(
+            ruta_excel,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=Conciliacion_bancaria.xlsx"}
-        ) 
+            filename="Conciliacion_bancaria.xlsx",
+            headers=encabezados,
+            background=limpieza
+        )
+
+    except (SinMovimientosPDF, ContabilidadNoSoportada) as e:
+        contar("solicitudes_total", codigo="400")
+        progreso.marcar(ruta_progreso, progreso.ERROR, error=str(e))
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+    except (ArchivoDemasiadoGrande, SolicitudDemasiadoGrande) as e:
+        contar("solicitudes_total", codigo="413")
+        progreso.marcar(ruta_progreso, progreso.ERROR, error=str(e))
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+
+    except CruceDemasiadoGrande as e:
+        contar("solicitudes_total", codigo="422")
+        progreso.marcar(ruta_progreso, progreso.ERROR, error=str(e))
+        return JSONResponse(status_code=422, content={"detail": str(e)})
+
+    except ServidorOcupado as e:
+        contar("solicitudes_total", codigo="429")
+        progreso.marcar(ruta_progreso, progreso.ERROR, error=str(e))
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)}
+        )
 
     except Exception as e:
         # Captura cualquier error y devuelve detalle con traceback para debugging
         import traceback
         error_detail = str(e)
         error_traceback = traceback.format_exc()
+        contar("solicitudes_total", codigo="500")
+        progreso.marcar(ruta_progreso, progreso.ERROR, error=error_detail)
         
         # Log del error completo para debugging
         print(f"\n{'='*60}")
@@ -71,7 +188,249 @@ async def conciliacion_unificada(
             }
         )
 
-# --- Carpeta estática ---
-os.makedirs("static", exist_ok=True)
+    finally:
+        for archivo in recibidos:
+            archivo.eliminar()
+        if perfil_id is not None:
+            purgar_perfiles()
+
+# --- Vista previa del extracto: tipo, cuenta, periodo y primeros movimientos ---
+# Corre en hilos del proceso web (no en el pool) para no esperar detrás de
+# conciliaciones completas; el semáforo acota cuántas compiten con el event loop.
+_previews = asyncio.Semaphore(ConfigAPI.PREVIEW_CONCURRENCIA)
+
+
+@app.post("/extracto/preview")
+async def extracto_preview(
+    pdf_file: UploadFile = File(...),
+    movimientos: int = Query(ConfigAPI.PREVIEW_MOVIMIENTOS, ge=1, le=200)
+):
+    from procesar_pdf import previsualizar_pdf
+
+    try:
+        pdf = await recibir_archivo(pdf_file)
+    except ArchivoDemasiadoGrande as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+
+    limite = ConfigAPI.PREVIEW_LIMITE_SEGUNDOS
+    inicio = asyncio.get_running_loop().time()
+    excedido = JSONResponse(
+        status_code=504,
+        content={"detail": f"La vista previa superó el límite de {limite:g} s"}
+    )
+
+    try:
+        await asyncio.wait_for(_previews.acquire(), timeout=limite)
+    except asyncio.TimeoutError:
+        pdf.eliminar()
+        return excedido
+    except asyncio.CancelledError:
+        pdf.eliminar()
+        raise
+
+    # El hilo no se puede interrumpir: aunque la respuesta salga por el límite,
+    # el cupo y el archivo se liberan recién cuando el hilo termina
+    restante = max(limite - (asyncio.get_running_loop().time() - inicio), 0.1)
+    hilo = asyncio.ensure_future(asyncio.to_thread(
+        previsualizar_pdf, pdf.ruta, ConfigAPI.PREVIEW_PAGINAS, movimientos, restante
+    ))
+
+    def liberar(tarea: asyncio.Future) -> None:
+        _previews.release()
+        pdf.eliminar()
+        if not tarea.cancelled():
+            # Si ya se respondió 504, nadie más recupera el error del hilo
+            tarea.exception()
+
+    hilo.add_done_callback(liberar)
+
+    try:
+        resultado = await asyncio.wait_for(asyncio.shield(hilo), timeout=restante)
+    except asyncio.TimeoutError:
+        return excedido
+    except Exception as e:
+        return JSONResponse(status_code=422, content={"detail": f"No se pudo leer el PDF: {e}"})
+
+    resultado["duracion_s"] = round(asyncio.get_running_loop().time() - inicio, 3)
+    return resultado
+
+# --- Progreso por SSE de una solicitud (?progreso_id=) o de un trabajo (/jobs) ---
+async def _eventos_progreso(ruta: str):
+    inicio = time.monotonic()
+    ultimo_envio = inicio
+    anterior = None
+    # El cliente cierra el EventSource al recibir "fin"; si se corta antes, reintenta en 2 s
+    yield "retry: 2000\n\n"
+    while True:
+        estado = progreso.leer(ruta)
+        if estado is not None and estado != anterior:
+            anterior = estado
+            final = estado.get("etapa") in progreso.TERMINALES
+            yield f"event: {'fin' if final else 'progreso'}\ndata: {json.dumps(estado, ensure_ascii=False)}\n\n"
+            if final:
+                return
+            ultimo_envio = time.monotonic()
+        elif estado is None and time.monotonic() - inicio > ConfigAPI.PROGRESO_ESPERA_SEGUNDOS:
+            yield f"event: fin\ndata: {json.dumps({'etapa': 'desconocido'})}\n\n"
+            return
+        elif time.monotonic() - ultimo_envio > 15:
+            # Mantener viva la conexión a través de proxies
+            yield ": ping\n\n"
+            ultimo_envio = time.monotonic()
+        await asyncio.sleep(progreso.INTERVALO_SEGUNDOS)
+
+
+@app.get("/progreso/{progreso_id}")
+async def progreso_sse(progreso_id: str):
+    if not progreso.id_valido(progreso_id):
+        return JSONResponse(status_code=404, content={"detail": "Id de progreso inválido"})
+    almacen = obtener_almacen()
+    if await asyncio.to_thread(almacen.obtener, progreso_id) is not None:
+        ruta = almacen.ruta_progreso(progreso_id)
+    else:
+        ruta = progreso.ruta_progreso(progreso_id)
+    return StreamingResponse(
+        _eventos_progreso(ruta),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Movimientos del extracto como NDJSON, enviados a medida que se procesa cada página ---
+async def _seguir_archivo(ruta: str, tarea: asyncio.Task, limpiar):
+    """
+    Envía lo que el worker va escribiendo en `ruta` hasta que `tarea` termina.
+    Si la tarea falla, agrega una línea {"error": ...} al final.
+    """
+    try:
+        with open(ruta, "rb") as f:
+            while True:
+                bloque = f.read(64 * 1024)
+                if bloque:
+                    yield bloque
+                elif tarea.done():
+                    resto = f.read()
+                    if resto:
+                        yield resto
+                    break
+                else:
+                    await asyncio.wait({tarea}, timeout=0.05)
+        if tarea.exception() is not None:
+            error = tarea.exception()
+            yield (json.dumps({"error": f"{type(error).__name__}: {error}"}, ensure_ascii=False) + "\n").encode()
+    finally:
+        limpiar()
+
+
+@app.post("/extracto")
+async def extracto(pdf_file: UploadFile = File(...)):
+    try:
+        pdf = await recibir_archivo(pdf_file)
+    except ArchivoDemasiadoGrande as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+
+    fd, salida = tempfile.mkstemp(dir=ConfigAPI.SPOOL_DIR, suffix=".ndjson")
+    os.close(fd)
+
+    def limpiar():
+        pdf.eliminar()
+        try:
+            os.remove(salida)
+        except OSError:
+            pass
+
+    tarea = asyncio.create_task(ejecutor.ejecutar(extraer_movimientos_ndjson, pdf.ruta, salida))
+    # Un paso del loop basta para que la tarea pase la admisión (o la rechace)
+    await asyncio.sleep(0)
+    if tarea.done() and isinstance(tarea.exception(), ServidorOcupado):
+        limpiar()
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(tarea.exception())},
+            headers={"Retry-After": str(tarea.exception().retry_after)}
+        )
+
+    return StreamingResponse(
+        _seguir_archivo(salida, tarea, limpiar),
+        media_type="application/x-ndjson"
+    )
+
+# --- Sondas: vida (instantánea) y preparación (tras el calentamiento) ---
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if not estado_calentamiento["listo"]:
+        return JSONResponse(status_code=503, content={"status": "calentando", **estado_calentamiento})
+    return {"status": "ok", **estado_calentamiento}
+
+# --- Métricas en formato Prometheus ---
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4")
+
+# --- Trabajos asíncronos: para conciliaciones que superan el timeout del proxy ---
+@app.post("/jobs/conciliacion", status_code=202)
+async def crear_trabajo_conciliacion(
+    pdf_file: UploadFile = File(...),
+    contabilidad_file: UploadFile = File(...)
+):
+    try:
+        pdf = await recibir_archivo(pdf_file)
+    except ArchivoDemasiadoGrande as e:
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+    try:
+        contabilidad = await recibir_archivo(contabilidad_file)
+    except ArchivoDemasiadoGrande as e:
+        pdf.eliminar()
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+
+    # Rechazar de inmediato lo que no cabría, en vez de fallar el trabajo más tarde
+    try:
+        estimacion = await asyncio.to_thread(
+            memoria.estimar, pdf.ruta, contabilidad.ruta, contabilidad.nombre
+        )
+        memoria.verificar(estimacion)
+    except SolicitudDemasiadoGrande as e:
+        pdf.eliminar()
+        contabilidad.eliminar()
+        return JSONResponse(status_code=413, content={"detail": str(e)})
+
+    trabajo_id = await asyncio.to_thread(obtener_almacen().crear, pdf, contabilidad)
+    return {
+        "id": trabajo_id,
+        "estado_url": f"/jobs/{trabajo_id}",
+        "resultado_url": f"/jobs/{trabajo_id}/resultado",
+    }
+
+
+@app.get("/jobs/{trabajo_id}")
+async def estado_trabajo(trabajo_id: str):
+    trabajo = await asyncio.to_thread(obtener_almacen().obtener, trabajo_id)
+    if trabajo is None:
+        return JSONResponse(status_code=404, content={"detail": "Trabajo no encontrado"})
+    return trabajo
+
+
+@app.get("/jobs/{trabajo_id}/resultado")
+async def resultado_trabajo(trabajo_id: str):
+    almacen = obtener_almacen()
+    trabajo = await asyncio.to_thread(almacen.obtener, trabajo_id)
+    if trabajo is None:
+        return JSONResponse(status_code=404, content={"detail": "Trabajo no encontrado"})
+    if trabajo["estado"] != COMPLETADO:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": f"El trabajo está {trabajo['estado']}", "estado": trabajo["estado"], "error": trabajo["error"]}
+        )
+    return FileResponse(
+        almacen.ruta_resultado(trabajo_id),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename="Conciliacion_bancaria.xlsx"
+    )
+
+# --- Carpeta estática (se crea al iniciar, en el lifespan) ---
 from fastapi.staticfiles import StaticFiles
-app.mount("/static", StaticFiles(directory="static"), name="static")
\ No newline at end of file
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
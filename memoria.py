@@ -0,0 +1,269 @@
+"""
+Estimación de memoria de una conciliación antes de las etapas pesadas.
+
+Con datos baratos de obtener (páginas del PDF según su árbol de páginas,
+filas de la contabilidad según la dimensión del libro, el conteo de líneas del
+CSV o los metadatos del Parquet, y el tamaño de cada archivo) se estima el pico
+de memoria que la tarea agrega al proceso del pool. Con esa estimación:
+
+- se rechaza con 413 lo que no cabría nunca (`SolicitudDemasiadoGrande`);
+- los PDF con muchas páginas se procesan página por página (`por_pagina`);
+- el ejecutor reserva los MB estimados del presupuesto y, si no alcanza,
+  la solicitud espera a que otras terminen (ver `Ejecutor.ejecutar`).
+
+La cardinalidad de las claves duplicadas solo se conoce después de leer ambos
+archivos: `verificar_cruce` calcula el tamaño exacto del cruce antes del merge
+y rechaza con 422 (`CruceDemasiadoGrande`) los que explotarían.
+
+El pico real de cada tarea (VmHWM tras reiniciarlo) se compara con la
+estimación en /metrics y, opcionalmente, en un archivo JSONL de calibración.
+
+Coeficientes medidos con PDFs de estado de cuenta de 5 a 600 páginas y
+contabilidades de 200 a 50.000 filas, en MB sobre la memoria base del proceso.
+"""
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+from config import ConfigAPI
+from metricas import contar
+
+
+# Pico fijo de una tarea (pdfplumber, DataFrames pequeños, libro vacío)
+MB_BASE = 32.0
+# Texto retenido por página al leer el PDF completo / página por página
+MB_POR_PAGINA = 0.04
+MB_POR_PAGINA_STREAMING = 0.015
+# Movimientos típicos por página, para estimar las filas del extracto
+MOVIMIENTOS_POR_PAGINA = 40
+# Filas de contabilidad leídas (listas por columna + DataFrame)
+KB_POR_FILA_CONTABILIDAD = 0.6
+# Filas del cruce: merge, casos y celdas de openpyxl al escribir el libro
+KB_POR_FILA_CRUCE = 4.0
+# Sin páginas o filas legibles: una página cada 50 KB, una fila cada 60 bytes
+BYTES_POR_PAGINA = 50 * 1024
+BYTES_POR_FILA = 60
+
+
+class SolicitudDemasiadoGrande(Exception):
+    """La conciliación estimada no cabe en los límites de memoria (413)."""
+
+
+class CruceDemasiadoGrande(Exception):
+    """Las claves duplicadas harían explotar el cruce (422)."""
+
+
+class EstimacionMemoria:
+    """Entradas de la estimación y pico esperado de la tarea."""
+
+    def __init__(self, paginas: int, filas_contabilidad: int, bytes_pdf: int, bytes_contabilidad: int):
+        self.paginas = paginas
+        self.filas_contabilidad = filas_contabilidad
+        self.bytes_pdf = bytes_pdf
+        self.bytes_contabilidad = bytes_contabilidad
+        self.por_pagina = paginas >= ConfigAPI.MEMORIA_PAGINAS_POR_PAGINA
+        por_pagina_mb = MB_POR_PAGINA_STREAMING if self.por_pagina else MB_POR_PAGINA
+        filas_cruce = filas_contabilidad + paginas * MOVIMIENTOS_POR_PAGINA
+        self.mb = round(
+            MB_BASE
+            + paginas * por_pagina_mb
+            + filas_contabilidad * KB_POR_FILA_CONTABILIDAD / 1024
+            + filas_cruce * KB_POR_FILA_CRUCE / 1024,
+            1,
+        )
+
+    def como_dict(self) -> dict:
+        return {
+            "paginas": self.paginas,
+            "filas_contabilidad": self.filas_contabilidad,
+            "bytes_pdf": self.bytes_pdf,
+            "bytes_contabilidad": self.bytes_contabilidad,
+            "por_pagina": self.por_pagina,
+            "estimado_mb": self.mb,
+        }
+
+
+def presupuesto_mb() -> int:
+    """MB que las tareas del pool pueden ocupar a la vez (0 en la config = 50 % de la RAM)."""
+    if ConfigAPI.MEMORIA_PRESUPUESTO_MB > 0:
+        return ConfigAPI.MEMORIA_PRESUPUESTO_MB
+    try:
+        with open("/proc/meminfo") as f:
+            for linea in f:
+                if linea.startswith("MemTotal:"):
+                    return int(linea.split()[1]) // 1024 // 2
+    except (OSError, ValueError):
+        pass
+    return 2048
+
+
+def contar_paginas(pdf_path: str) -> Optional[int]:
+    """Páginas según el árbol de páginas del PDF, sin interpretar su contenido."""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    try:
+        with open(pdf_path, "rb") as f:
+            documento = PDFDocument(PDFParser(f))
+            return int(resolve1(resolve1(documento.catalog["Pages"])["Count"]))
+    except Exception:
+        # PDF dañado o sin /Count: lo decide el procesamiento
+        return None
+
+
+def _contar_lineas(ruta: str) -> int:
+    lineas = 0
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            lineas += bloque.count(b"\n")
+    return lineas
+
+
+def contar_filas_contabilidad(ruta: str, nombre: str = "") -> Optional[int]:
+    """Filas del archivo de contabilidad sin leer sus celdas."""
+    from leer_contabilidad import _detectar_formato
+
+    try:
+        formato = _detectar_formato(ruta, nombre)
+        if formato == "csv":
+            return _contar_lineas(ruta)
+        if formato == "parquet":
+            import pyarrow.parquet as pq
+            return pq.read_metadata(ruta).num_rows
+        from openpyxl import load_workbook
+        with open(ruta, "rb") as f:
+            wb = load_workbook(f, read_only=True, data_only=True, keep_links=False)
+            try:
+                # Dimensión declarada en la hoja (None si el libro no la trae)
+                return wb.worksheets[0].max_row
+            finally:
+                wb.close()
+    except Exception:
+        return None
+
+
+def estimar(pdf_path: str, contabilidad_path: str, contabilidad_nombre: str = "") -> EstimacionMemoria:
+    """Estima la memoria de `conciliar_archivos` para estos archivos. Bloquea: usar en un hilo."""
+    bytes_pdf = os.path.getsize(pdf_path)
+    bytes_contabilidad = os.path.getsize(contabilidad_path)
+    paginas = contar_paginas(pdf_path)
+    if paginas is None:
+        paginas = max(1, bytes_pdf // BYTES_POR_PAGINA)
+    filas = contar_filas_contabilidad(contabilidad_path, contabilidad_nombre)
+    if filas is None:
+        filas = bytes_contabilidad // BYTES_POR_FILA
+    return EstimacionMemoria(paginas, filas, bytes_pdf, bytes_contabilidad)
+
+
+def verificar(estimacion: EstimacionMemoria) -> None:
+    """
+    Raises:
+        SolicitudDemasiadoGrande: si supera el máximo de páginas o el presupuesto completo.
+    """
+    if estimacion.paginas > ConfigAPI.MEMORIA_MAX_PAGINAS:
+        contar("memoria_rechazos_total", motivo="paginas")
+        raise SolicitudDemasiadoGrande(
+            f"El PDF tiene {estimacion.paginas} páginas; el máximo es {ConfigAPI.MEMORIA_MAX_PAGINAS}"
+        )
+    presupuesto = presupuesto_mb()
+    if estimacion.mb > presupuesto:
+        contar("memoria_rechazos_total", motivo="memoria")
+        raise SolicitudDemasiadoGrande(
+            f"La conciliación requiere unos {estimacion.mb:.0f} MB de memoria; "
+            f"el máximo es {presupuesto} MB. Divida el periodo en archivos más pequeños."
+        )
+
+
+def filas_cruce(claves_a, claves_b) -> Tuple[int, object, int, int]:
+    """
+    Filas exactas del merge externo por clave, sin hacerlo.
+
+    Returns:
+        Tupla (filas, clave que más aporta, repeticiones en A, repeticiones en B)
+    """
+    conteo_a = claves_a.value_counts(dropna=False)
+    conteo_b = claves_b.value_counts(dropna=False)
+    comunes = conteo_a.index.intersection(conteo_b.index)
+    if len(comunes) == 0:
+        return len(claves_a) + len(claves_b), None, 0, 0
+    # reindex (no [...]): las claves pueden incluir NaN, que el merge también empareja
+    en_a = conteo_a.reindex(comunes)
+    en_b = conteo_b.reindex(comunes)
+    producto = en_a * en_b
+    filas = int(producto.sum() + len(claves_a) - en_a.sum() + len(claves_b) - en_b.sum())
+    peor = producto.values.argmax()
+    return filas, comunes[peor], int(en_a.iloc[peor]), int(en_b.iloc[peor])
+
+
+def verificar_cruce(claves_contabilidad, claves_extracto) -> int:
+    """
+    Retorna las filas que tendrá el cruce.
+
+    Raises:
+        CruceDemasiadoGrande: si superan `MEMORIA_MAX_FILAS_CRUCE`.
+    """
+    filas, clave, en_contabilidad, en_extracto = filas_cruce(claves_contabilidad, claves_extracto)
+    maximo = ConfigAPI.MEMORIA_MAX_FILAS_CRUCE
+    if filas > maximo:
+        contar("memoria_rechazos_total", motivo="cruce")
+        raise CruceDemasiadoGrande(
+            f"El cruce generaría {filas} filas (máximo {maximo}): la clave fecha_valor "
+            f"'{clave}' aparece {en_contabilidad} veces en contabilidad y {en_extracto} en el extracto"
+        )
+    return filas
+
+
+def reiniciar_pico() -> Optional[float]:
+    """
+    Reinicia el pico de memoria residente del proceso (Linux) y retorna la
+    memoria actual en MB, o None si el sistema no lo permite.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _estado_mb("VmRSS")
+    except OSError:
+        return None
+
+
+def pico_mb() -> Optional[float]:
+    """Pico de memoria residente desde el último `reiniciar_pico()`."""
+    try:
+        return _estado_mb("VmHWM")
+    except OSError:
+        return None
+
+
+def _estado_mb(campo: str) -> Optional[float]:
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith(campo + ":"):
+                return int(linea.split()[1]) / 1024
+    return None
+
+
+def registrar(estimacion: EstimacionMemoria, pico_extra_mb: Optional[float], funcion: str, duracion_s: float) -> None:
+    """Compara el pico real con la estimación (en /metrics y en el archivo de calibración)."""
+    if pico_extra_mb is None:
+        return
+    contar("memoria_tareas_total", funcion=funcion)
+    contar("memoria_estimada_mb_total", estimacion.mb, funcion=funcion)
+    contar("memoria_pico_mb_total", round(pico_extra_mb, 1), funcion=funcion)
+    if pico_extra_mb > estimacion.mb:
+        contar("memoria_subestimada_total", funcion=funcion)
+
+    if not ConfigAPI.MEMORIA_CALIBRACION_ARCHIVO:
+        return
+    try:
+        with open(ConfigAPI.MEMORIA_CALIBRACION_ARCHIVO, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "funcion": funcion,
+                **estimacion.como_dict(),
+                "pico_mb": round(pico_extra_mb, 1),
+                "duracion_s": round(duracion_s, 3),
+            }) + "\n")
+    except OSError:
+        pass
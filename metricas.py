@@ -0,0 +1,145 @@
+"""
+Métricas de latencia y volumen por etapa, expuestas en formato de texto de Prometheus.
+
+Uso en el código de procesamiento:
+
+    with medir("camelot"):
+        ...
+    contar("pdf_paginas_total", len(pdf.pages))
+
+Las etapas corren dentro del pool de procesos, donde el registro global del
+proceso principal no es visible. Por eso `capturar()` acumula las observaciones
+de una llamada en una lista local que el worker retorna junto con el resultado,
+y el proceso principal las aplica con `registro.aplicar(...)`.
+Registrar una observación cuesta un `perf_counter()` y un `append`.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# (tipo, nombre, etiquetas, valor) con tipo "h" (histograma) o "c" (contador)
+Observacion = Tuple[str, str, Tuple[Tuple[str, str], ...], float]
+
+_captura: contextvars.ContextVar[Optional[List[Observacion]]] = contextvars.ContextVar(
+    "captura_metricas", default=None
+)
+
+
+class RegistroMetricas:
+    """Contadores e histogramas acumulados en el proceso."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._contadores: Dict[Tuple[str, tuple], float] = {}
+        # clave -> [conteos por bucket..., suma, total]
+        self._histogramas: Dict[Tuple[str, tuple], List[float]] = {}
+
+    def aplicar(self, observaciones: List[Observacion]) -> None:
+        with self._lock:
+            for tipo, nombre, etiquetas, valor in observaciones:
+                clave = (nombre, etiquetas)
+                if tipo == "c":
+                    self._contadores[clave] = self._contadores.get(clave, 0) + valor
+                    continue
+                h = self._histogramas.get(clave)
+                if h is None:
+                    h = self._histogramas[clave] = [0] * (len(self.buckets) + 2)
+                for i, limite in enumerate(self.buckets):
+                    if valor <= limite:
+                        h[i] += 1
+                h[-2] += valor
+                h[-1] += 1
+
+    def exportar(self) -> str:
+        """Texto en formato de exposición de Prometheus (0.0.4)."""
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {k: list(v) for k, v in self._histogramas.items()}
+
+        lineas = []
+        for nombre in sorted({n for n, _ in contadores}):
+            lineas.append(f"# TYPE {nombre} counter")
+            for (n, etiquetas), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+
+        for nombre in sorted({n for n, _ in histogramas}):
+            lineas.append(f"# TYPE {nombre} histogram")
+            for (n, etiquetas), h in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                for limite, conteo in zip(self.buckets, h):
+                    lineas.append(
+                        f"{nombre}_bucket{_etiquetas(etiquetas + (('le', _numero(limite)),))} {_numero(conteo)}"
+                    )
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {_numero(h[-1])}")
+                lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(h[-2])}")
+                lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {_numero(h[-1])}")
+
+        return "\n".join(lineas) + "\n"
+
+
+def _etiquetas(etiquetas: tuple) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for k, v in etiquetas:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+registro = RegistroMetricas()
+
+
+def _registrar(tipo: str, nombre: str, valor: float, etiquetas: Dict[str, str]) -> None:
+    obs = (tipo, nombre, tuple(sorted(etiquetas.items())), valor)
+    captura = _captura.get()
+    if captura is not None:
+        captura.append(obs)
+    else:
+        registro.aplicar([obs])
+
+
+def observar_etapa(etapa: str, segundos: float) -> None:
+    """Registra la duración de una etapa del pipeline."""
+    _registrar("h", "conciliacion_etapa_segundos", segundos, {"etapa": etapa})
+
+
+@contextmanager
+def medir(etapa: str):
+    """Mide la duración del bloque como etapa del pipeline."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar_etapa(etapa, time.perf_counter() - inicio)
+
+
+def contar(nombre: str, valor: float = 1, **etiquetas: str) -> None:
+    """Incrementa un contador (p. ej. páginas, filas, bytes)."""
+    _registrar("c", nombre, valor, etiquetas)
+
+
+@contextmanager
+def capturar():
+    """
+    Acumula las observaciones del bloque en una lista local en vez del registro
+    global; el llamador la retorna al proceso principal.
+    """
+    observaciones: List[Observacion] = []
+    token = _captura.set(observaciones)
+    try:
+        yield observaciones
+    finally:
+        _captura.reset(token)
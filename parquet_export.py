@@ -0,0 +1,277 @@
+"""
+Copia Parquet tipada de un informe, escrita durante la validación del contenido.
+
+`ExcelValidator.validate_excel_content` recorre el Excel por bloques y ya
+convierte cada columna al tipo de su `schema` para validarla; con un
+`ParquetBlockWriter` esos mismos valores se escriben en un Parquet
+comprimido, en el orden de columnas del estándar, sin volver a leer el Excel.
+Los bloques se acumulan hasta `rows_per_group` filas por row group.
+
+Un estándar lo activa con `"parquet": "also"` (Parquet junto al .xlsx) o
+`"parquet": "instead"` (solo el Parquet).
+
+Con `"partition_by"` (p. ej. `["Fecha", "ID_Punto_Venta"]`) la copia se
+divide en un archivo por partición, en carpetas estilo Hive dentro de la
+carpeta `parquet/` de la ruta del informe
+(`parquet/Fecha_dia=2025-05-01/ID_Punto_Venta=7/<archivo>-0.parquet`), más un
+manifiesto `parquet/_manifest_<archivo>.json` con las particiones y sus filas.
+Al volver a cargar un archivo se eliminan sus particiones que ya no están en el
+nuevo manifiesto (p. ej. días que el informe dejó de traer).
+La carpeta aparte evita que los lectores del dataset encuentren el .xlsx. Una
+columna de fecha se particiona por día en la clave `<columna>_dia` y conserva
+su valor completo en el archivo; las demás columnas de partición quedan solo
+en la ruta, como en Hive. Los lectores (Spark, pyarrow.dataset, pandas)
+descartan las particiones que no necesitan e ignoran el manifiesto por su
+prefijo "_".
+"""
+import os
+import posixpath
+import re
+import tempfile
+from pathlib import PurePosixPath
+from typing import BinaryIO, Dict, List, Tuple
+from urllib.parse import unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from standards_registry import CompiledStandard
+
+
+# Tipo Arrow de cada tipo del `schema` (las columnas sin regla quedan como texto)
+TIPOS_ARROW = {
+    "string": pa.string(),
+    "integer": pa.int64(),
+    "number": pa.float64(),
+    "date": pa.timestamp("ms"),
+    "boolean": pa.bool_(),
+}
+
+# Sufijo de la clave de partición de una columna de fecha (partición por día)
+SUFIJO_DIA = "_dia"
+PREFIJO_MANIFIESTO = "_manifest_"
+# Carpeta del dataset particionado dentro de la ruta del informe
+CARPETA_PARTICIONES = "parquet"
+
+
+def parquet_file_name(file_name: str) -> str:
+    """
+    Nombre de la copia Parquet de un archivo (misma base, extensión .parquet).
+
+    Args:
+        file_name: Nombre del archivo original.
+
+    Returns:
+        Nombre del archivo Parquet.
+    """
+    return PurePosixPath(file_name).with_suffix(".parquet").name
+
+
+def parquet_spool(max_memory_bytes: int) -> BinaryIO:
+    """
+    Destino para la copia Parquet de la validación.
+
+    Args:
+        max_memory_bytes: Tamaño hasta el que la copia queda en memoria; al
+            superarlo pasa a un archivo temporal (0: siempre en disco).
+
+    Returns:
+        SpooledTemporaryFile; al cerrarlo se libera la memoria o se borra el archivo.
+    """
+    return tempfile.SpooledTemporaryFile(max_size=max(max_memory_bytes, 1), suffix=".parquet")
+
+
+def manifest_file_name(file_name: str) -> str:
+    """
+    Nombre del manifiesto de particiones de un archivo.
+
+    Args:
+        file_name: Nombre del archivo original.
+
+    Returns:
+        Nombre del manifiesto (empieza con "_" para que los lectores lo ignoren).
+    """
+    return PREFIJO_MANIFIESTO + PurePosixPath(file_name).stem + ".json"
+
+
+def is_partition_file(path: str, file_name: str) -> bool:
+    """
+    Si `path` es un archivo de partición escrito por `write_partitions` para `file_name`.
+
+    Args:
+        path: Ruta del archivo (se usa solo su nombre).
+        file_name: Nombre del archivo original.
+
+    Returns:
+        True si el nombre es `<base>-<n>.parquet`.
+    """
+    patron = re.escape(PurePosixPath(file_name).stem) + r"-\d+\.parquet"
+    return re.fullmatch(patron, posixpath.basename(path)) is not None
+
+
+def partition_keys(standard: CompiledStandard) -> List[Tuple[str, str]]:
+    """
+    Claves de partición del estándar.
+
+    Args:
+        standard: Estándar con `partition_by`.
+
+    Returns:
+        Lista de (clave en la ruta, columna de origen).
+    """
+    claves = []
+    for columna in standard.partition_by:
+        if standard.schema.get(columna, {}).get("type") == "date":
+            claves.append((columna + SUFIJO_DIA, columna))
+        else:
+            claves.append((columna, columna))
+    return claves
+
+
+def write_partitions(
+    parquet_source,
+    standard: CompiledStandard,
+    file_name: str,
+    directory: str,
+    max_partitions: int = 5000
+) -> Dict:
+    """
+    Divide la copia Parquet en archivos por partición en un directorio local.
+
+    La copia se lee por row groups y `pyarrow.dataset.write_dataset` reparte
+    las filas entre las particiones, de modo que la memoria no depende del
+    tamaño del archivo.
+
+    Args:
+        parquet_source: Copia Parquet (path o file-like) escrita por `ParquetBlockWriter`.
+        standard: Estándar con `partition_by`.
+        file_name: Nombre del archivo original (base del nombre de cada partición).
+        directory: Directorio local vacío donde escribir las particiones.
+        max_partitions: Máximo de particiones; si se supera, falla.
+
+    Returns:
+        Manifiesto: report_type, source_file, partition_by, rows y files
+        (path relativo, valores de partición, filas y bytes de cada archivo).
+    """
+    claves = partition_keys(standard)
+    origen = pq.ParquetFile(parquet_source)
+    esquema = origen.schema_arrow
+    for clave, columna in claves:
+        if clave != columna:
+            esquema = esquema.append(pa.field(clave, pa.date32()))
+
+    def lotes():
+        for lote in origen.iter_batches():
+            for clave, columna in claves:
+                if clave != columna:
+                    dias = pc.cast(lote.column(columna), pa.date32(), safe=False)
+                    lote = pa.RecordBatch.from_arrays(
+                        lote.columns + [dias], schema=lote.schema.append(pa.field(clave, pa.date32()))
+                    )
+            yield lote
+
+    escritos = []
+    ds.write_dataset(
+        lotes(),
+        directory,
+        schema=esquema,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([esquema.field(clave) for clave, _ in claves]), flavor="hive"
+        ),
+        basename_template=PurePosixPath(file_name).stem + "-{i}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        max_partitions=max_partitions,
+        # El directorio es local y nuevo; los archivos de cargas anteriores en
+        # el destino los elimina `upload_partitions`
+        existing_data_behavior="error",
+        file_visitor=escritos.append,
+    )
+
+    archivos = []
+    for escrito in escritos:
+        ruta = os.path.relpath(escrito.path, directory).replace(os.sep, "/")
+        valores = dict(
+            unquote(segmento).split("=", 1) for segmento in posixpath.dirname(ruta).split("/")
+        )
+        archivos.append({
+            "path": ruta,
+            "partition": valores,
+            "rows": escrito.metadata.num_rows,
+            "bytes": escrito.size,
+        })
+    archivos.sort(key=lambda archivo: archivo["path"])
+    return {
+        "report_type": standard.report_type,
+        "source_file": file_name,
+        "format": "parquet",
+        "partitioning": "hive",
+        "partition_by": [{"key": clave, "column": columna} for clave, columna in claves],
+        "rows": sum(archivo["rows"] for archivo in archivos),
+        "files": archivos,
+    }
+
+
+class ParquetBlockWriter:
+    """Escribe en Parquet los bloques tipados de la validación."""
+
+    def __init__(
+        self,
+        sink,
+        columns: List[str],
+        schema: Dict[str, Dict],
+        rows_per_group: int = 100_000,
+        compression: str = "zstd"
+    ):
+        """
+        Args:
+            sink: Path o file-like binario de destino.
+            columns: Columnas del estándar, en el orden del Parquet.
+            schema: Reglas del estándar por columna (se usa su `type`).
+            rows_per_group: Filas por row group.
+            compression: Códec de compresión de Parquet.
+        """
+        self.arrow_schema = pa.schema([
+            (nombre, TIPOS_ARROW.get(schema.get(nombre, {}).get("type", "string"), pa.string()))
+            for nombre in columns
+        ])
+        self.rows_per_group = rows_per_group
+        self.rows = 0
+        self._pendientes: List[pa.Table] = []
+        self._filas_pendientes = 0
+        self._writer = pq.ParquetWriter(sink, self.arrow_schema, compression=compression)
+
+    def write_block(self, valores: Dict[str, pd.Series], filas: int) -> None:
+        """
+        Agrega un bloque.
+
+        Args:
+            valores: Serie tipada por columna; una columna ausente queda vacía.
+            filas: Filas del bloque.
+        """
+        arrays = []
+        for campo in self.arrow_schema:
+            serie = valores.get(campo.name)
+            if serie is None:
+                arrays.append(pa.nulls(filas, campo.type))
+            else:
+                arrays.append(pa.array(serie, type=campo.type, from_pandas=True))
+        self._pendientes.append(pa.Table.from_arrays(arrays, schema=self.arrow_schema))
+        self._filas_pendientes += filas
+        if self._filas_pendientes >= self.rows_per_group:
+            self._escribir_pendientes()
+
+    def _escribir_pendientes(self) -> None:
+        if self._pendientes:
+            self._writer.write_table(pa.concat_tables(self._pendientes), row_group_size=self.rows_per_group)
+            self.rows += self._filas_pendientes
+        self._pendientes = []
+        self._filas_pendientes = 0
+
+    def close(self) -> None:
+        """Escribe el último row group y cierra el archivo."""
+        self._escribir_pendientes()
+        self._writer.close()
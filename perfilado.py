@@ -0,0 +1,140 @@
+"""
+Perfilado opcional de una solicitud de conciliación.
+
+Se activa con `CONCILIACION_PERFILADO=1` y un token de administración
+(`CONCILIACION_PERFILADO_TOKEN`) enviado en el encabezado `X-Perfilar` o en el
+parámetro `?perfilar=`. La conciliación de esa solicitud corre bajo un
+perfilador y `tracemalloc` dentro del worker del pool, y el resultado queda en
+`CONCILIACION_PERFILADO_DIR/<id>/`:
+
+- `perfil.html` / `perfil.txt` (pyinstrument, por muestreo; está en
+  requirements.txt) o `perfil.prof` / `perfil.txt` (cProfile, respaldo si
+  pyinstrument no se pudo instalar: instrumenta cada llamada y hace la
+  conciliación varias veces más lenta)
+- `memoria.txt`: principales sitios de asignación y pico de memoria
+- `resumen.json`: duración, pico de memoria y perfilador usado
+
+Solo se conservan los `CONCILIACION_PERFILADO_MAX` perfiles más recientes.
+Sin el token, la solicitud no paga ningún costo adicional.
+"""
+import hmac
+import json
+import os
+import shutil
+import time
+import tracemalloc
+import uuid
+from typing import Optional
+
+from config import ConfigAPI
+
+
+# Sitios de asignación a listar en memoria.txt
+TOP_ASIGNACIONES = 30
+
+
+def solicitud_perfilada(encabezado: Optional[str], parametro: Optional[str]) -> bool:
+    """True si el perfilado está habilitado y la solicitud trae el token correcto."""
+    if not ConfigAPI.PERFILADO_ACTIVO or not ConfigAPI.PERFILADO_TOKEN:
+        return False
+    token = encabezado or parametro
+    if not token:
+        return False
+    return hmac.compare_digest(token.encode(), ConfigAPI.PERFILADO_TOKEN.encode())
+
+
+def nuevo_id() -> str:
+    """Id del perfil; el prefijo de fecha mantiene las carpetas ordenadas."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _iniciar_perfilador():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        # Respaldo de la biblioteca estándar; el sobrecosto distorsiona los tiempos
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        return "cprofile", perfilador
+    perfilador = Profiler()
+    perfilador.start()
+    return "pyinstrument", perfilador
+
+
+def _guardar_perfil(tipo: str, perfilador, directorio: str) -> None:
+    if tipo == "pyinstrument":
+        perfilador.stop()
+        with open(os.path.join(directorio, "perfil.html"), "w", encoding="utf-8") as f:
+            f.write(perfilador.output_html())
+        with open(os.path.join(directorio, "perfil.txt"), "w", encoding="utf-8") as f:
+            f.write(perfilador.output_text(unicode=True, color=False))
+        return
+
+    import pstats
+    perfilador.disable()
+    perfilador.dump_stats(os.path.join(directorio, "perfil.prof"))
+    with open(os.path.join(directorio, "perfil.txt"), "w", encoding="utf-8") as f:
+        pstats.Stats(perfilador, stream=f).sort_stats("cumulative").print_stats(60)
+
+
+def _guardar_memoria(snapshot: tracemalloc.Snapshot, pico: int, directorio: str) -> None:
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ])
+    with open(os.path.join(directorio, "memoria.txt"), "w", encoding="utf-8") as f:
+        f.write(f"Pico de memoria rastreada: {pico / 1024 / 1024:.1f} MB\n\n")
+        f.write(f"Memoria retenida al terminar, top {TOP_ASIGNACIONES} por línea:\n")
+        for estadistica in snapshot.statistics("lineno")[:TOP_ASIGNACIONES]:
+            f.write(f"{estadistica}\n")
+
+
+def ejecutar_perfilado(directorio: str, funcion, *args):
+    """
+    Ejecuta `funcion(*args)` bajo el perfilador y tracemalloc y guarda los
+    resultados en `directorio`. Pensado para correr dentro del worker del pool.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    tracemalloc.start()
+    tipo, perfilador = _iniciar_perfilador()
+    inicio = time.perf_counter()
+    error = None
+    try:
+        return funcion(*args)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        snapshot = tracemalloc.take_snapshot()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _guardar_perfil(tipo, perfilador, directorio)
+        _guardar_memoria(snapshot, pico, directorio)
+        with open(os.path.join(directorio, "resumen.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "funcion": getattr(funcion, "__name__", str(funcion)),
+                "perfilador": tipo,
+                "duracion_s": round(duracion, 3),
+                "pico_memoria_mb": round(pico / 1024 / 1024, 1),
+                "pid": os.getpid(),
+                "error": error,
+            }, f, indent=2, ensure_ascii=False)
+
+
+def purgar_perfiles(directorio: Optional[str] = None, maximo: Optional[int] = None) -> None:
+    """Conserva solo los `maximo` perfiles más recientes."""
+    directorio = directorio or ConfigAPI.PERFILADO_DIR
+    maximo = ConfigAPI.PERFILADO_MAX if maximo is None else maximo
+    try:
+        carpetas = [
+            os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+        ]
+    except OSError:
+        return
+    carpetas = [c for c in carpetas if os.path.isdir(c)]
+    carpetas.sort(key=os.path.getmtime, reverse=True)
+    for carpeta in carpetas[maximo:]:
+        shutil.rmtree(carpeta, ignore_errors=True)
@@ -2,13 +2,17 @@ import io
 import os
 import re
 import tempfile
-from typing import Literal, Optional
+import time
+from typing import Iterator, Literal, Optional, Tuple, Union
 
 import pandas as pd
 import pdfplumber
 import camelot
 from fastapi import UploadFile
 
+from metricas import medir, contar
+import progreso
+
 
 TipoPDF = Literal["estado_cuenta", "movimiento_diario", "sin_texto", "desconocido"]
 
@@ -56,12 +60,23 @@ def _clean_valor(v: str) -> Optional[int]:
     return num
 
 
-def _pdf_text(pdf_stream: io.BytesIO) -> str:
-    pdf_stream.seek(0)
+def _fuente_pdf(pdf: Union[bytes, str]) -> Union[io.BytesIO, str]:
+    """Ruta en disco tal cual; bytes envueltos en BytesIO."""
+    return io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf
+
+
+def _pdf_text(pdf_stream: Union[io.BytesIO, str]) -> str:
+    if hasattr(pdf_stream, "seek"):
+        pdf_stream.seek(0)
     out = []
-    with pdfplumber.open(pdf_stream) as pdf:
+    with medir("pdf_texto"), pdfplumber.open(pdf_stream) as pdf:
+        total = len(pdf.pages)
         for page in pdf.pages:
             out.append(page.extract_text() or "")
+            # Liberar los objetos de la página: el texto es lo único que se conserva
+            page.close()
+            progreso.avance("paginas", len(out), total)
+    contar("pdf_paginas_total", len(out))
     return "\n".join(out)
 
 
@@ -89,13 +104,18 @@ def _extraer_anio_desde_texto(texto: str, default_year: str = "2025") -> str:
     return m.group(1) if m else default_year
 
 
-def _parse_estado_cuenta_por_lineas(pdf_bytes: bytes) -> pd.DataFrame:
-    bio = io.BytesIO(pdf_bytes)
-    texto = _pdf_text(bio)
+def _parse_estado_cuenta_por_lineas(
+    pdf_bytes: Union[bytes, str],
+    texto: Optional[str] = None,
+    anio: Optional[str] = None
+) -> pd.DataFrame:
+    if texto is None:
+        texto = _pdf_text(_fuente_pdf(pdf_bytes))
     if not (texto or "").strip():
         return pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
 
-    anio = _extraer_anio_desde_texto(texto, default_year="2025")
+    if anio is None:
+        anio = _extraer_anio_desde_texto(texto, default_year="2025")
 
     lineas = [l.strip() for l in (texto or "").splitlines() if l.strip()]
 
@@ -128,8 +148,8 @@ def _parse_estado_cuenta_por_lineas(pdf_bytes: bytes) -> pd.DataFrame:
     return df
 
 
-def _parse_movimiento_diario_con_camelot(tmp_path: str) -> pd.DataFrame:
-    tablas = camelot.read_pdf(tmp_path, pages="all", flavor="lattice")
+def _parse_movimiento_diario_con_camelot(tmp_path: str, pages: str = "all") -> pd.DataFrame:
+    tablas = camelot.read_pdf(tmp_path, pages=pages, flavor="lattice")
     if not tablas or len(tablas) == 0:
         return pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
 
@@ -171,9 +191,9 @@ def _parse_movimiento_diario_con_camelot(tmp_path: str) -> pd.DataFrame:
     return out
 
 
-def _parse_movimiento_diario_por_texto(pdf_bytes: bytes) -> pd.DataFrame:
-    bio = io.BytesIO(pdf_bytes)
-    texto = _pdf_text(bio)
+def _parse_movimiento_diario_por_texto(pdf_bytes: Union[bytes, str], texto: Optional[str] = None) -> pd.DataFrame:
+    if texto is None:
+        texto = _pdf_text(_fuente_pdf(pdf_bytes))
     if not (texto or "").strip():
         return pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
 
@@ -211,8 +231,133 @@ def _parse_movimiento_diario_por_texto(pdf_bytes: bytes) -> pd.DataFrame:
     return df
 
 
-def procesar_pdf_universal(file_pdf: UploadFile) -> pd.DataFrame:
+def _camelot_con_fallback(pdf: Union[bytes, str], texto: Optional[str] = None) -> pd.DataFrame:
+    """Camelot necesita una ruta: si llegan bytes, se escriben a un temporal."""
+    if not isinstance(pdf, (bytes, bytearray)):
+        with medir("camelot"):
+            df = _parse_movimiento_diario_con_camelot(pdf)
+        if df.empty:
+            with medir("fallback_texto"):
+                df = _parse_movimiento_diario_por_texto(pdf, texto)
+        return df
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        tmp.write(pdf)
+        tmp_path = tmp.name
+    try:
+        with medir("camelot"):
+            df = _parse_movimiento_diario_con_camelot(tmp_path)
+        if df.empty:
+            with medir("fallback_texto"):
+                df = _parse_movimiento_diario_por_texto(pdf, texto)
+        return df
+    finally:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+
+
+def _texto_primeras_paginas(pdf: Union[bytes, str], paginas: int, limite: Optional[float] = None):
+    """
+    Extrae el texto de las primeras `paginas` páginas. Si se pasa `limite`
+    (instante de `time.monotonic()`), no empieza páginas nuevas después de él;
+    la primera siempre se lee.
+
+    Returns:
+        Tupla (texto, paginas_leidas, paginas_total)
+    """
+    out = []
+    with pdfplumber.open(_fuente_pdf(pdf)) as doc:
+        total = len(doc.pages)
+        for page in doc.pages[:paginas]:
+            if out and limite is not None and time.monotonic() >= limite:
+                break
+            out.append(page.extract_text() or "")
+            # Liberar los objetos de la página ya procesada
+            page.close()
+    return "\n".join(out), len(out), total
+
+
+def _fecha_encabezado(valor: str) -> str:
+    """2025/04/30 -> 30/04/2025"""
+    anio, mes, dia = valor.split("/")
+    return f"{dia}/{mes}/{anio}"
+
+
+def _datos_cuenta(texto: str) -> dict:
+    """Número y tipo de cuenta y periodo declarados en el encabezado del extracto."""
+    t = _norm_text(texto)
+    cuenta = re.search(r"NUMERO(?: DE CUENTA)?\s*:?\s*(\d[\d-]{5,})", t)
+    tipo_cuenta = re.search(r"CUENTA DE (AHORROS|CORRIENTE)|TIPO DE CUENTA\s*:\s*(AHORROS|CORRIENTE)", t)
+    periodo = re.search(r"DESDE:\s*(20\d{2}/\d{2}/\d{2})\s+HASTA:\s*(20\d{2}/\d{2}/\d{2})", t)
+    return {
+        "cuenta": cuenta.group(1) if cuenta else None,
+        "tipo_cuenta": next((g for g in tipo_cuenta.groups() if g), None) if tipo_cuenta else None,
+        "periodo": {
+            "desde": _fecha_encabezado(periodo.group(1)),
+            "hasta": _fecha_encabezado(periodo.group(2)),
+            "fuente": "encabezado",
+        } if periodo else None,
+    }
+
+
+def previsualizar_pdf(
+    pdf: Union[bytes, str],
+    paginas: int = 2,
+    max_movimientos: int = 20,
+    limite_segundos: Optional[float] = None
+) -> dict:
+    """
+    Vista previa rápida del extracto leyendo solo las primeras páginas.
+
+    Detecta el tipo, la cuenta y el periodo, y parsea los primeros movimientos
+    con los parsers por texto (sin Camelot). Sirve para confirmar que se subió
+    el archivo correcto antes de la conciliación completa.
+
+    Returns:
+        Dict con tipo, cuenta, tipo_cuenta, periodo, paginas_leidas,
+        paginas_total y movimientos (FECHA, DESCRIPCION, VALOR).
     """
+    limite = time.monotonic() + limite_segundos if limite_segundos else None
+    with medir("preview"):
+        texto, leidas, total = _texto_primeras_paginas(pdf, paginas, limite)
+        tipo = _detectar_tipo(texto)
+
+        if tipo == "estado_cuenta":
+            df = _parse_estado_cuenta_por_lineas(pdf, texto)
+        elif tipo == "movimiento_diario":
+            df = _parse_movimiento_diario_por_texto(pdf, texto)
+        elif tipo == "desconocido":
+            df = _parse_estado_cuenta_por_lineas(pdf, texto)
+            if df.empty:
+                df = _parse_movimiento_diario_por_texto(pdf, texto)
+        else:
+            df = pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
+
+    datos = _datos_cuenta(texto)
+    if datos["periodo"] is None and not df.empty:
+        # Sin periodo en el encabezado: rango de fechas de las páginas leídas
+        fechas = pd.to_datetime(df["FECHA"], format="%d/%m/%Y")
+        datos["periodo"] = {
+            "desde": fechas.min().strftime("%d/%m/%Y"),
+            "hasta": fechas.max().strftime("%d/%m/%Y"),
+            "fuente": "movimientos",
+        }
+
+    return {
+        "tipo": tipo,
+        **datos,
+        "paginas_leidas": leidas,
+        "paginas_total": total,
+        "movimientos": df.head(max_movimientos).to_dict(orient="records"),
+    }
+
+
+def procesar_pdf_universal(file_pdf: Union[UploadFile, bytes, str]) -> pd.DataFrame:
+    """
+    Recibe el UploadFile, los bytes del PDF o la ruta del PDF en disco.
+
     Retorna DataFrame con:
     FECHA (dd/mm/YYYY), DESCRIPCION (UPPER), VALOR (int)
 
@@ -221,48 +366,95 @@ def procesar_pdf_universal(file_pdf: UploadFile) -> pd.DataFrame:
     - Movimiento diario: Camelot, fallback por texto
     - Sin texto: retorna vacío
     """
-    pdf_bytes = file_pdf.file.read()
-    bio = io.BytesIO(pdf_bytes)
-
-    texto = _pdf_text(bio)
-    tipo = _detectar_tipo(texto)
+    if isinstance(file_pdf, (str, os.PathLike)):
+        pdf = os.fspath(file_pdf)
+    elif isinstance(file_pdf, (bytes, bytearray)):
+        pdf = bytes(file_pdf)
+    else:
+        pdf = file_pdf.file.read()
+
+    progreso.etapa("pdf")
+    texto = _pdf_text(_fuente_pdf(pdf))
+    with medir("deteccion_tipo"):
+        tipo = _detectar_tipo(texto)
+    contar("pdf_tipo_total", tipo=tipo)
 
     if tipo == "sin_texto":
         return pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
 
     if tipo == "estado_cuenta":
-        return _parse_estado_cuenta_por_lineas(pdf_bytes)
+        with medir("parseo_estado_cuenta"):
+            return _parse_estado_cuenta_por_lineas(pdf, texto)
 
     if tipo == "movimiento_diario":
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_bytes)
-            tmp_path = tmp.name
-        try:
-            df = _parse_movimiento_diario_con_camelot(tmp_path)
-            if df.empty:
-                df = _parse_movimiento_diario_por_texto(pdf_bytes)
-            return df
-        finally:
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
+        return _camelot_con_fallback(pdf, texto)
 
     # fallback: intentar ambos
-    df1 = _parse_estado_cuenta_por_lineas(pdf_bytes)
+    with medir("parseo_estado_cuenta"):
+        df1 = _parse_estado_cuenta_por_lineas(pdf, texto)
     if not df1.empty:
         return df1
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(pdf_bytes)
-        tmp_path = tmp.name
-    try:
-        df2 = _parse_movimiento_diario_con_camelot(tmp_path)
-        if df2.empty:
-            df2 = _parse_movimiento_diario_por_texto(pdf_bytes)
-        return df2
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+    return _camelot_con_fallback(pdf, texto)
+
+
+def movimientos_por_pagina(pdf_path: str) -> Iterator[Tuple[int, int, TipoPDF, pd.DataFrame]]:
+    """
+    Procesa el PDF página por página, conservando en memoria solo la página actual.
+
+    El tipo y el año se detectan con la primera página que los permita. En
+    movimiento diario, Camelot se usa por página si encuentra la tabla en la
+    primera; si no, todo el documento se lee con el parser por texto (mismo
+    criterio que `_camelot_con_fallback`, decidido con la primera página).
+
+    Yields:
+        Tupla (pagina, paginas_total, tipo, DataFrame FECHA/DESCRIPCION/VALOR)
+    """
+    tipo: TipoPDF = "sin_texto"
+    anio = None
+    usar_camelot = None
+    progreso.etapa("pdf")
+    with pdfplumber.open(pdf_path) as doc:
+        total = len(doc.pages)
+        for numero, page in enumerate(doc.pages, start=1):
+            with medir("pdf_texto"):
+                texto = page.extract_text() or ""
+            # Liberar los objetos de la página ya procesada
+            page.close()
+            contar("pdf_paginas_total")
+            progreso.avance("paginas", numero, total)
+
+            if tipo in ("sin_texto", "desconocido"):
+                tipo = _detectar_tipo(texto)
+            if anio is None and texto.strip():
+                anio = _extraer_anio_desde_texto(texto, default_year="2025")
+
+            if tipo == "estado_cuenta":
+                df = _parse_estado_cuenta_por_lineas(pdf_path, texto, anio)
+            elif tipo == "movimiento_diario":
+                if usar_camelot is None or usar_camelot:
+                    with medir("camelot"):
+                        df = _parse_movimiento_diario_con_camelot(pdf_path, pages=str(numero))
+                    if usar_camelot is None:
+                        usar_camelot = not df.empty
+                if not usar_camelot:
+                    df = _parse_movimiento_diario_por_texto(pdf_path, texto)
+            elif tipo == "desconocido":
+                df = _parse_estado_cuenta_por_lineas(pdf_path, texto, anio)
+                if df.empty:
+                    df = _parse_movimiento_diario_por_texto(pdf_path, texto)
+            else:
+                df = pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
+
+            yield numero, total, tipo, df
+
+
+def procesar_pdf_por_pagina(pdf_path: str) -> pd.DataFrame:
+    """
+    Igual que `procesar_pdf_universal`, pero con `movimientos_por_pagina`: para
+    PDFs largos, solo se conserva el texto de la página en curso.
+    """
+    partes = [df for _, _, _, df in movimientos_por_pagina(pdf_path) if not df.empty]
+    if not partes:
+        return pd.DataFrame(columns=["FECHA", "DESCRIPCION", "VALOR"])
+    return pd.concat(partes, ignore_index=True)
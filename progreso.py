@@ -0,0 +1,146 @@
+"""
+Progreso de una conciliación en curso, para mostrarlo por SSE en `/progreso/{id}`.
+
+El worker del pool escribe el estado en un JSON pequeño (reemplazo atómico) y
+el proceso web lo vigila. Así funciona entre procesos y aunque el cliente se
+conecte a otro proceso web que el que recibió la solicitud.
+
+En los bucles de PDF, contabilidad y render se llama `avance(...)`, que solo
+escribe si pasaron `INTERVALO_SEGUNDOS` desde la última escritura (o si el
+contador llegó al total): en el bucle cuesta una lectura de contextvar y un
+`monotonic()`. Sin reporte activo, `etapa` y `avance` retornan de inmediato.
+"""
+import contextvars
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from config import ConfigAPI
+
+
+INTERVALO_SEGUNDOS = 0.25
+
+# Etapas finales: el stream SSE termina al verlas
+COMPLETADO = "completado"
+ERROR = "error"
+TERMINALES = {COMPLETADO, ERROR}
+
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+_actual: contextvars.ContextVar[Optional["ReporteProgreso"]] = contextvars.ContextVar(
+    "reporte_progreso", default=None
+)
+
+
+def id_valido(progreso_id: str) -> bool:
+    return bool(_ID_VALIDO.match(progreso_id or ""))
+
+
+def ruta_progreso(progreso_id: str) -> str:
+    """Archivo de progreso de una solicitud síncrona (`?progreso_id=`)."""
+    if not id_valido(progreso_id):
+        raise ValueError("Id de progreso inválido")
+    return os.path.join(ConfigAPI.PROGRESO_DIR, f"{progreso_id}.json")
+
+
+def escribir(ruta: str, estado: dict) -> None:
+    """Reemplaza el archivo de progreso de forma atómica."""
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({**estado, "actualizado": time.time()}, f, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+
+def leer(ruta: str) -> Optional[dict]:
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def marcar(ruta: Optional[str], etapa_nombre: str, **datos) -> None:
+    """Escribe una etapa desde el proceso web (en cola, completado, error)."""
+    if ruta is None:
+        return
+    anterior = leer(ruta) or {}
+    escribir(ruta, {"etapa": etapa_nombre, "contadores": anterior.get("contadores", {}), **datos})
+
+
+def purgar(directorio: Optional[str] = None, max_edad_segundos: int = 3600) -> None:
+    """Elimina archivos de progreso de solicitudes síncronas más antiguos que `max_edad_segundos`."""
+    directorio = directorio or ConfigAPI.PROGRESO_DIR
+    limite = time.time() - max_edad_segundos
+    try:
+        nombres = os.listdir(directorio)
+    except OSError:
+        return
+    for nombre in nombres:
+        ruta = os.path.join(directorio, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+class ReporteProgreso:
+    """Estado de progreso de una tarea dentro del worker."""
+
+    def __init__(self, ruta: str, intervalo: float = INTERVALO_SEGUNDOS):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.etapa = None
+        self.contadores = {}
+        self._ultima = 0.0
+
+    def _escribir(self) -> None:
+        self._ultima = time.monotonic()
+        try:
+            escribir(self.ruta, {"etapa": self.etapa, "contadores": self.contadores})
+        except OSError:
+            # El progreso es informativo: nunca debe hacer fallar la conciliación
+            pass
+
+    def cambiar_etapa(self, nombre: str) -> None:
+        self.etapa = nombre
+        self._escribir()
+
+    def avanzar(self, contador: str, valor: int, total: Optional[int] = None) -> None:
+        self.contadores[contador] = {"valor": valor, "total": total}
+        if valor == total or time.monotonic() - self._ultima >= self.intervalo:
+            self._escribir()
+
+
+@contextmanager
+def reportar(ruta: Optional[str]):
+    """Activa el reporte de progreso en `ruta` durante el bloque (None = desactivado)."""
+    if ruta is None:
+        yield None
+        return
+    reporte = ReporteProgreso(ruta)
+    token = _actual.set(reporte)
+    try:
+        yield reporte
+    finally:
+        _actual.reset(token)
+
+
+def etapa(nombre: str) -> None:
+    """Marca el inicio de una etapa (siempre se escribe)."""
+    reporte = _actual.get()
+    if reporte is not None:
+        reporte.cambiar_etapa(nombre)
+
+
+def avance(contador: str, valor: int, total: Optional[int] = None) -> None:
+    """Actualiza un contador; la escritura se limita a una cada `INTERVALO_SEGUNDOS`."""
+    reporte = _actual.get()
+    if reporte is not None:
+        reporte.avanzar(contador, valor, total)
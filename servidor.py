@@ -0,0 +1,30 @@
+"""
+Punto de entrada de producción (ver Procfile).
+
+    python servidor.py
+
+Levanta uvicorn con `CONCILIACION_WEB_WORKERS` procesos web y un periodo de
+gracia (`CONCILIACION_APAGADO_GRACIA_SEGUNDOS`) para que las solicitudes en
+curso terminen antes de apagar o reiniciar. El trabajo pesado corre en el pool
+de `ejecutor.py`, que ya usa todos los núcleos (`CONCILIACION_PROCESOS`):
+cada proceso web tiene su propio pool, así que normalmente basta con uno.
+"""
+import os
+
+import uvicorn
+
+from config import ConfigAPI
+
+
+def main() -> None:
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        workers=ConfigAPI.WEB_WORKERS,
+        timeout_graceful_shutdown=ConfigAPI.APAGADO_GRACIA_SEGUNDOS,
+    )
+
+
+if __name__ == "__main__":
+    main()
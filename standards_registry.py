@@ -0,0 +1,209 @@
+"""
+Registro compilado de estándares de informe.
+
+Cada JSON de `standards/` se compila una sola vez en un `CompiledStandard`:
+columnas normalizadas (lista ordenada y conjunto), reglas del `schema` y la
+plantilla de la ruta de destino ya resuelta. El registro se comparte entre
+todas las sesiones de Streamlit del proceso (ver `get_validator` en app.py).
+
+Recarga en caliente: cada `reload_interval` segundos como máximo se lista el
+directorio (una llamada a `os.scandir`) con la fecha de modificación y el
+tamaño de cada JSON; solo se vuelven a compilar los archivos nuevos o
+modificados y se descartan los eliminados. Entre revisiones las consultas no
+tocan el disco.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+
+# Nombres de mes en español para el formato "year_month_name"
+MESES_ES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre",
+}
+
+
+def _fecha_por_defecto(fecha: date) -> str:
+    """{año}/{mes}/{día}"""
+    return fecha.strftime("%Y/%m/%d")
+
+
+def _fecha_anio_mes_nombre(fecha: date) -> str:
+    """{AÑO}/{MM}. {NombreMes} (POS 3)"""
+    return f"{fecha:%Y}/{fecha:%m}. {MESES_ES[fecha.month]}"
+
+
+# Opción "parquet" del estándar: copia Parquet junto al .xlsx o en su lugar
+PARQUET_JUNTO = "also"
+PARQUET_EN_LUGAR = "instead"
+
+FORMATOS_FECHA: Dict[str, Callable[[date], str]] = {
+    "default": _fecha_por_defecto,
+    "year_month_name": _fecha_anio_mes_nombre,
+}
+
+
+class CompiledStandard:
+    """Estándar de informe listo para validar y construir rutas."""
+
+    def __init__(self, report_type: str, data: Dict):
+        """
+        Compila un estándar.
+
+        Args:
+            report_type: Nombre del tipo de informe (nombre del archivo sin extensión).
+            data: Contenido del JSON del estándar.
+        """
+        self.report_type = report_type
+        self.data = data
+        self.columns: List[str] = [str(col).strip() for col in data.get("columns", [])]
+        self.column_set: FrozenSet[str] = frozenset(self.columns)
+        self.schema: Dict[str, Dict] = data.get("schema") or {}
+        parquet = data.get("parquet")
+        self.parquet_mode: Optional[str] = parquet if parquet in (PARQUET_JUNTO, PARQUET_EN_LUGAR) else None
+        # Columnas por las que se divide la copia Parquet (implica "parquet": "also" si no se indica)
+        self.partition_by: List[str] = [
+            str(col).strip() for col in data.get("partition_by", []) if str(col).strip() in self.column_set
+        ]
+        if self.partition_by and not self.parquet_mode:
+            self.parquet_mode = PARQUET_JUNTO
+
+        storage_path = data.get("storage_path", "")
+        if not storage_path:
+            storage_path = data.get("report_type", "").lower().replace(" ", "_")
+        self.storage_path = storage_path
+        # Ruta sin la fecha: "{base}/{empresa}/<storage_path>/"; la fecha se agrega al construir
+        self._path_template = "{base}/{empresa}/" + storage_path.replace("{", "{{").replace("}", "}}") + "/"
+        self._format_date = FORMATOS_FECHA.get(
+            data.get("storage_path_format", "default"), _fecha_por_defecto
+        )
+
+    def build_storage_path(self, base_path: str, empresa: str, fecha_carga: date) -> str:
+        """
+        Construye la ruta completa de almacenamiento.
+
+        Args:
+            base_path: Ruta base de los archivos de negocio.
+            empresa: Nombre de la empresa.
+            fecha_carga: Fecha de la carga.
+
+        Returns:
+            Ruta completa de almacenamiento.
+        """
+        return self._path_template.format(base=base_path, empresa=empresa) + self._format_date(fecha_carga)
+
+
+class StandardsRegistry:
+    """Registro de estándares compilados con recarga por fecha de modificación."""
+
+    def __init__(self, standards_dir: str, reload_interval: float = 2.0):
+        """
+        Inicializa el registro.
+
+        Args:
+            standards_dir: Directorio donde se encuentran los archivos JSON de estándares.
+            reload_interval: Segundos mínimos entre revisiones del directorio
+                (0 = revisar en cada consulta).
+        """
+        self.standards_dir = standards_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._standards: Dict[str, CompiledStandard] = {}
+        # report_type -> (mtime_ns, tamaño) del JSON compilado
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        self._report_types: List[str] = []
+        self._checked_at = float("-inf")
+        self.reloads = 0
+
+    def get(self, report_type: str) -> Optional[CompiledStandard]:
+        """
+        Obtiene el estándar compilado de un tipo de informe.
+
+        Args:
+            report_type: Nombre del tipo de informe.
+
+        Returns:
+            Estándar compilado o None si no existe o no se pudo cargar.
+        """
+        self.refresh()
+        return self._standards.get(report_type)
+
+    def report_types(self) -> List[str]:
+        """
+        Tipos de informe disponibles (ordenados).
+
+        Returns:
+            Lista de nombres de tipos de informe.
+        """
+        self.refresh()
+        return list(self._report_types)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Recompila los estándares nuevos o modificados si ya pasó el intervalo.
+
+        Args:
+            force: Revisar el directorio aunque no haya pasado el intervalo.
+
+        Returns:
+            True si algún estándar cambió.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self.reload_interval:
+                return False
+            changed = self._scan()
+            self._checked_at = time.monotonic()
+            return changed
+
+    def _scan(self) -> bool:
+        try:
+            entries = [
+                entry for entry in os.scandir(self.standards_dir)
+                if entry.name.endswith(".json") and entry.is_file()
+            ]
+        except FileNotFoundError:
+            changed = bool(self._report_types)
+            self._standards, self._signatures, self._report_types = {}, {}, []
+            return changed
+
+        standards = dict(self._standards)
+        signatures = dict(self._signatures)
+        found = set()
+        changed = False
+        for entry in entries:
+            report_type = entry.name[:-5]  # Remover .json
+            found.add(report_type)
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signatures.get(report_type) == signature:
+                continue
+            changed = True
+            signatures[report_type] = signature
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    standards[report_type] = CompiledStandard(report_type, json.load(f))
+            except Exception as e:
+                # Un JSON a medio guardar no tumba el registro: se reintenta cuando vuelva a cambiar
+                print(f"Error al cargar estándar {report_type}: {e}")
+                standards.pop(report_type, None)
+
+        for report_type in set(signatures) - found:
+            standards.pop(report_type, None)
+            signatures.pop(report_type)
+            changed = True
+
+        self._standards = standards
+        self._signatures = signatures
+        changed = changed or sorted(found) != self._report_types
+        self._report_types = sorted(found)
+        if changed:
+            self.reloads += 1
+        return changed
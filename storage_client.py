@@ -1,14 +1,176 @@
 """
 Cliente para interactuar con Azure Data Lake Storage Gen2.
 Maneja la carga de archivos Excel a contenedores específicos.
+
+Una sola instancia se comparte entre sesiones e hilos (ver `get_storage_client`
+en app.py): los clientes del SDK son seguros entre hilos y la sesión HTTP
+mantiene un pool de hasta Config.STORAGE_POOL_CONNECTIONS conexiones. Los
+sistemas de archivos ya verificados se recuerdan durante
+Config.STORAGE_PATH_CACHE_SECONDS para no repetir la verificación en cada carga.
+
+Las cargas grandes son reanudables: cada bloque confirmado por `append_data`
+se anota en un checkpoint local (`UploadCheckpoint`) y, si la carga falla,
+la siguiente del mismo contenido a la misma ruta envía solo los bloques que
+faltan y confirma con `flush_data`, porque ADLS conserva los bloques sin
+confirmar de la ruta. Cada llamada reintenta las fallas transitorias con
+espera exponencial (`_with_retries`); el cliente del SDK se crea sin
+reintentos propios para que no se multipliquen con estos.
 """
-from azure.storage.filedatalake import DataLakeServiceClient
-from azure.core.exceptions import AzureError
-from typing import Optional, Tuple
+from azure.storage.filedatalake import ContentSettings, DataLakeServiceClient
+from azure.core.exceptions import (
+    AzureError,
+    HttpResponseError,
+    ResourceNotFoundError,
+    ServiceRequestError,
+    ServiceResponseError,
+)
+from azure.core.pipeline.transport import RequestsTransport
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
+from requests.adapters import HTTPAdapter
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib3.util.retry import Retry
+import hashlib
+import io
+import json
+import mimetypes
 import os
+import random
+import requests
+import threading
+import time
 from config import Config
 
 
+# Códigos HTTP que indican una falla transitoria del servicio
+_ESTADOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+# ADLS descarta los bloques sin confirmar después de 7 días
+_VIGENCIA_CHECKPOINT_S = 7 * 24 * 3600
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Si vale la pena reintentar la operación que falló con `error`."""
+    if isinstance(error, (ServiceRequestError, ServiceResponseError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        return getattr(error, "status_code", None) in _ESTADOS_TRANSITORIOS
+    return False
+
+
+def _with_retries(operation: Callable, max_retries: int, base_delay: float):
+    """
+    Ejecuta `operation` reintentando las fallas transitorias.
+
+    Entre intentos espera `base_delay * 2**intento` segundos con variación
+    aleatoria (entre la mitad y el total), para que los bloques que fallaron a
+    la vez no se reintenten juntos.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == max_retries or not _is_transient(e):
+                raise
+            time.sleep(base_delay * 2 ** attempt * random.uniform(0.5, 1.0))
+
+
+class UploadCheckpoint:
+    """Bloques de una carga ya confirmados por el servicio, guardados en disco."""
+    
+    def __init__(self, directory: str, key: str, total_bytes: int, md5: str, chunk_size: int):
+        """
+        Args:
+            directory: Directorio de los checkpoints (Config.UPLOAD_CHECKPOINT_DIR).
+            key: Identifica el destino (cuenta, contenedor y ruta del archivo).
+            total_bytes: Tamaño del contenido.
+            md5: MD5 (hex) del contenido; un contenido distinto no reanuda.
+            chunk_size: Bytes por bloque; los bloques se identifican por su posición.
+        """
+        self.path = os.path.join(directory, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".json")
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self._identity = {"ruta": key, "bytes": total_bytes, "md5": md5, "chunk_size": chunk_size}
+        self.acked: Set[int] = set()
+    
+    def load(self) -> int:
+        """
+        Lee los bloques confirmados de una carga anterior del mismo contenido.
+        
+        Returns:
+            Bytes ya confirmados (0 si no hay carga anterior que reanudar).
+        """
+        try:
+            if time.time() - os.path.getmtime(self.path) > _VIGENCIA_CHECKPOINT_S:
+                return 0
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if {key: data.get(key) for key in self._identity} != self._identity:
+            return 0
+        self.acked = set(data.get("confirmados", []))
+        return self.acked_bytes()
+    
+    def acked_bytes(self) -> int:
+        return sum(min(self.chunk_size, self.total_bytes - offset) for offset in self.acked)
+    
+    def save(self) -> None:
+        """Escribe el checkpoint (reemplazo atómico: nunca queda a medias)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({**self._identity, "confirmados": sorted(self.acked)}, f)
+        os.replace(temporary, self.path)
+    
+    def clear(self) -> None:
+        self.acked = set()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class KnownPaths:
+    """Rutas (sistemas de archivos o directorios) que ya se sabe que existen, con vencimiento."""
+    
+    def __init__(self, ttl_seconds: float):
+        """
+        Args:
+            ttl_seconds: Segundos durante los que se confía en una ruta verificada.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._expires: Dict[str, float] = {}
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    def __contains__(self, path: str) -> bool:
+        expires = self._expires.get(path)
+        return expires is not None and time.monotonic() < expires
+    
+    def add(self, path: str) -> None:
+        with self._lock:
+            self._expires[path] = time.monotonic() + self.ttl_seconds
+    
+    def discard(self, path: str) -> None:
+        with self._lock:
+            self._expires.pop(path, None)
+    
+    def ensure(self, path: str, create: Callable[[], None]) -> None:
+        """
+        Ejecuta `create` si la ruta no está verificada; con varios hilos a la
+        vez solo uno la verifica y los demás esperan su resultado.
+        """
+        if path in self:
+            return
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        with path_lock:
+            if path not in self:
+                create()
+                self.add(path)
+
+
 class AzureStorageClient:
     """Cliente para Azure Data Lake Storage Gen2."""
     
@@ -16,7 +178,8 @@ class AzureStorageClient:
         self, 
         account_name: str, 
         account_key: str, 
-        container_name: str = "raw"
+        container_name: str = "raw",
+        service_client=None
     ):
         """
         Inicializa el cliente de Azure Storage.
@@ -25,85 +188,456 @@ class AzureStorageClient:
             account_name: Nombre de la cuenta de Azure Storage.
             account_key: Clave de acceso de la cuenta.
             container_name: Nombre del contenedor (filesystem) en ADLS Gen2.
+            service_client: Cliente de servicio ya creado (p. ej. el almacenamiento
+                local de tests_local); por defecto se crea uno con pool de conexiones.
         """
         self.account_name = account_name
         self.account_key = account_key
         self.container_name = container_name
-        self.service_client = None
-        self._connect()
+        self.known_paths = KnownPaths(Config.STORAGE_PATH_CACHE_SECONDS)
+        self.service_client = service_client
+        if self.service_client is None:
+            self._connect()
     
     def _connect(self):
         """Establece la conexión con Azure Storage."""
         try:
             account_url = f"https://{self.account_name}.dfs.core.windows.net"
+            # Pool de conexiones del tamaño de las cargas concurrentes de todas las
+            # sesiones. Ni urllib3 ni la política del SDK reintentan: la única capa
+            # de reintentos es `_with_retries`, que además anota el checkpoint;
+            # con ambas, cada falla se reintentaría (retry_total + 1) veces por intento
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=Config.STORAGE_POOL_CONNECTIONS,
+                pool_maxsize=Config.STORAGE_POOL_CONNECTIONS,
+                max_retries=Retry(total=False, redirect=False, raise_on_status=False)
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
             self.service_client = DataLakeServiceClient(
                 account_url=account_url,
-                credential=self.account_key
+                credential=self.account_key,
+                transport=RequestsTransport(session=session, session_owner=False),
+                retry_total=0
             )
         except Exception as e:
             raise ConnectionError(f"Error al conectar con Azure Storage: {str(e)}")
     
+    def _file_system_client(self):
+        """
+        Cliente del contenedor, creándolo si no existe.
+        
+        La verificación (una llamada a `create_file_system`) se hace una vez por
+        contenedor cada Config.STORAGE_PATH_CACHE_SECONDS, no en cada carga.
+        """
+        file_system_client = self.service_client.get_file_system_client(
+            file_system=self.container_name
+        )
+        
+        def create():
+            try:
+                _with_retries(
+                    file_system_client.create_file_system, Config.UPLOAD_REINTENTOS, Config.UPLOAD_ESPERA_BASE_S
+                )
+            except AzureError as e:
+                # Una falla transitoria que agotó los reintentos no se da por verificada
+                if _is_transient(e):
+                    raise
+                # Ya existe (o la credencial no puede crear contenedores): continuar;
+                # si de verdad falta, `create_file` lo detecta y se reintenta
+        
+        self.known_paths.ensure(self.container_name, create)
+        return file_system_client
+    
     def upload_file(
         self, 
         file_path_or_content, 
         destination_path: str, 
-        file_name: str
-    ) -> Tuple[bool, str]:
+        file_name: str,
+        chunk_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, Optional[int], float], None]] = None,
+        skip_unchanged: bool = True,
+        max_retries: Optional[int] = None
+    ) -> Tuple[bool, str, Dict]:
         """
-        Sube un archivo a Azure Data Lake Storage Gen2.
+        Sube un archivo a Azure Data Lake Storage Gen2 por bloques.
+        
+        El archivo se lee en bloques de `chunk_size` bytes y cada bloque se envía
+        con `append_data` en su posición; hasta `max_concurrency` bloques viajan
+        a la vez y al final `flush_data` confirma el archivo completo. En memoria
+        nunca hay más de `max_concurrency` bloques, sin importar el tamaño del
+        archivo. Cada llamada al servicio se reintenta hasta `max_retries` veces
+        ante fallas transitorias.
+        
+        El MD5 del contenido se calcula mientras se lee y se guarda como
+        Content-MD5 del archivo en el mismo `flush_data` que lo confirma. Con
+        `skip_unchanged`, si en el destino ya hay un archivo del mismo tamaño y
+        MD5, no se envía nada y se informa como ya actualizado.
+        
+        Desde Config.UPLOAD_REANUDABLE_MB la carga es reanudable: los bloques
+        confirmados se anotan en un `UploadCheckpoint` y, si la carga falla,
+        volver a llamar con el mismo contenido y destino envía solo los bloques
+        que faltan. Si el destino ya no tiene esos bloques (se reemplazó el
+        archivo o vencieron), se sube de nuevo desde el inicio.
         
         Args:
-            file_path_or_content: Ruta del archivo local o contenido del archivo (bytes).
+            file_path_or_content: Ruta del archivo local, objeto file-like o contenido (bytes).
             destination_path: Ruta de destino en el contenedor (sin el nombre del archivo).
             file_name: Nombre del archivo a subir.
+            chunk_size: Bytes por bloque (por defecto Config.UPLOAD_CHUNK_MB).
+            max_concurrency: Bloques enviados en paralelo (por defecto Config.UPLOAD_CONCURRENCY).
+            progress_callback: Función (bytes_enviados, bytes_totales, bytes_por_segundo)
+                llamada desde el hilo que invoca `upload_file` cada vez que se
+                confirma un bloque; bytes_totales es None si no se conoce.
+            skip_unchanged: No volver a subir un archivo idéntico al del destino.
+            max_retries: Reintentos por llamada al servicio (por defecto Config.UPLOAD_REINTENTOS).
         
         Returns:
-            Tupla (éxito, mensaje)
+            Tupla (éxito, mensaje, detalles)
+            - detalles: ruta, md5 (hex), actualizado (True si ya estaba igual en
+              el destino), bytes_enviados, bytes_reanudados (ya confirmados por
+              una carga anterior), segundos y bytes_por_segundo
         """
+        chunk_size = chunk_size or Config.UPLOAD_CHUNK_MB * 1024 * 1024
+        max_concurrency = max(1, max_concurrency or Config.UPLOAD_CONCURRENCY)
+        max_retries = Config.UPLOAD_REINTENTOS if max_retries is None else max_retries
+        checkpoint = None
         try:
-            # Obtener el sistema de archivos (contenedor)
-            file_system_client = self.service_client.get_file_system_client(
-                file_system=self.container_name
-            )
-            
-            # Crear el sistema de archivos si no existe
-            try:
-                file_system_client.create_file_system()
-            except Exception:
-                # Ya existe, continuar
-                pass
-            
             # Construir la ruta completa
             full_path = f"{destination_path.rstrip('/')}/{file_name}" if destination_path else file_name
             
-            # Obtener el cliente del archivo
-            file_client = file_system_client.get_file_client(full_path)
+            # Obtener el cliente del archivo (ADLS crea los directorios intermedios)
+            file_client = self._file_system_client().get_file_client(full_path)
             
-            # Leer el contenido del archivo
-            if isinstance(file_path_or_content, str) and os.path.exists(file_path_or_content):
-                # Es una ruta de archivo
-                with open(file_path_or_content, 'rb') as f:
-                    file_content = f.read()
-            elif hasattr(file_path_or_content, 'read'):
-                # Es un objeto file-like (como UploadedFile de Streamlit)
-                file_path_or_content.seek(0)  # Asegurar que estamos al inicio
-                file_content = file_path_or_content.read()
-            else:
-                # Asumir que es bytes
-                file_content = file_path_or_content
+            with self._open_source(file_path_or_content) as (stream, total_bytes):
+                start = time.monotonic()
+                
+                # Una carga reanudable necesita el MD5 antes de enviar: identifica el contenido
+                source_md5 = None
+                if total_bytes is not None and total_bytes >= Config.UPLOAD_REANUDABLE_MB * 1024 * 1024:
+                    source_md5 = self._hash_stream(stream, chunk_size)
+                
+                if skip_unchanged:
+                    remote_md5 = self._remote_md5(file_client, total_bytes, partial(
+                        _with_retries, max_retries=max_retries, base_delay=Config.UPLOAD_ESPERA_BASE_S
+                    ))
+                    if remote_md5 is not None and remote_md5 == (source_md5 or self._hash_stream(stream, chunk_size)):
+                        return True, (
+                            f"Archivo '{file_name}' ya está actualizado en {full_path}: "
+                            "mismo contenido, no se transfirieron datos"
+                        ), {
+                            "ruta": full_path,
+                            "md5": remote_md5.hex(),
+                            "actualizado": True,
+                            "bytes_enviados": 0,
+                            "bytes_reanudados": 0,
+                            "segundos": time.monotonic() - start,
+                            "bytes_por_segundo": 0.0
+                        }
+                
+                resumed_bytes = 0
+                if source_md5 is not None:
+                    checkpoint = UploadCheckpoint(
+                        Config.UPLOAD_CHECKPOINT_DIR,
+                        f"{self.account_name}/{self.container_name}/{full_path}",
+                        total_bytes, source_md5.hex(), chunk_size
+                    )
+                    resumed_bytes = checkpoint.load()
+                
+                def report(sent: int) -> None:
+                    if progress_callback:
+                        progress_callback(sent, total_bytes, (sent - resumed_bytes) / max(time.monotonic() - start, 1e-6))
+                
+                md5 = hashlib.md5()
+                write = partial(
+                    self._write_file, full_path, file_client, stream, file_name, chunk_size,
+                    max_concurrency, report, checkpoint, source_md5, md5, max_retries
+                )
+                try:
+                    bytes_sent = write(resume=resumed_bytes > 0)
+                except (ResourceNotFoundError, HttpResponseError) as e:
+                    if not resumed_bytes or not (
+                        isinstance(e, ResourceNotFoundError)
+                        or getattr(e, "error_code", None) == "InvalidFlushPosition"
+                    ):
+                        raise
+                    # El destino ya no tiene los bloques sin confirmar: subir desde el inicio
+                    checkpoint.clear()
+                    stream.seek(0)
+                    resumed_bytes = 0
+                    bytes_sent = write(resume=False)
+                if checkpoint:
+                    checkpoint.clear()
+                elapsed = max(time.monotonic() - start, 1e-6)
             
-            # Subir el archivo
-            file_client.upload_data(
-                file_content,
-                overwrite=True
+            rate = (bytes_sent - resumed_bytes) / elapsed
+            resumed = (
+                f", reanudada: {resumed_bytes / 1024 / 1024:.1f} MB ya estaban en el destino"
+                if resumed_bytes else ""
             )
-            
-            return True, f"Archivo '{file_name}' subido exitosamente a {full_path}"
+            return True, (
+                f"Archivo '{file_name}' subido exitosamente a {full_path} "
+                f"({bytes_sent / 1024 / 1024:.1f} MB en {elapsed:.1f} s, {rate / 1024 / 1024:.1f} MB/s{resumed})"
+            ), {
+                "ruta": full_path,
+                "md5": (source_md5 or md5.digest()).hex(),
+                "actualizado": False,
+                "bytes_enviados": bytes_sent - resumed_bytes,
+                "bytes_reanudados": resumed_bytes,
+                "segundos": elapsed,
+                "bytes_por_segundo": rate
+            }
             
         except AzureError as e:
-            return False, f"Error de Azure Storage: {str(e)}"
+            return False, f"Error de Azure Storage: {str(e)}{self._resume_hint(checkpoint)}", {}
         except Exception as e:
-            return False, f"Error al subir archivo: {str(e)}"
+            return False, f"Error al subir archivo: {str(e)}{self._resume_hint(checkpoint)}", {}
+    
+    @staticmethod
+    def _resume_hint(checkpoint: Optional["UploadCheckpoint"]) -> str:
+        """Aviso de carga reanudable para el mensaje de error."""
+        if not checkpoint or not checkpoint.acked:
+            return ""
+        return (
+            f". Se puede reanudar: {checkpoint.acked_bytes() / 1024 / 1024:.1f} de "
+            f"{checkpoint.total_bytes / 1024 / 1024:.1f} MB ya están en el destino"
+        )
+    
+    def _write_file(
+        self,
+        full_path: str,
+        file_client,
+        stream: BinaryIO,
+        file_name: str,
+        chunk_size: int,
+        max_concurrency: int,
+        on_chunk: Callable[[int], None],
+        checkpoint: Optional[UploadCheckpoint],
+        source_md5: Optional[bytes],
+        md5,
+        max_retries: int,
+        resume: bool
+    ) -> int:
+        """
+        Crea el archivo (salvo al reanudar), envía los bloques y lo confirma.
+        
+        Returns:
+            Tamaño del archivo confirmado.
+        """
+        retry = partial(_with_retries, max_retries=max_retries, base_delay=Config.UPLOAD_ESPERA_BASE_S)
+        if not resume:
+            # Crear (o reemplazar) el archivo vacío
+            try:
+                retry(file_client.create_file)
+            except ResourceNotFoundError:
+                # El contenedor se eliminó después de verificarlo: volver a crearlo
+                self.known_paths.discard(self.container_name)
+                file_client = self._file_system_client().get_file_client(full_path)
+                retry(file_client.create_file)
+            if checkpoint:
+                checkpoint.clear()
+        bytes_sent = self._append_chunks(
+            file_client, stream, chunk_size, max_concurrency, on_chunk,
+            hasher=None if source_md5 else md5, checkpoint=checkpoint, retry=retry
+        )
+        # El MD5 queda en el archivo solo si el contenido se confirma completo
+        retry(partial(file_client.flush_data, bytes_sent, content_settings=ContentSettings(
+            content_type=mimetypes.guess_type(file_name)[0],
+            content_md5=bytearray(source_md5 or md5.digest())
+        )))
+        return bytes_sent
+    
+    @staticmethod
+    def _remote_md5(file_client, total_bytes: Optional[int], retry: Callable) -> Optional[bytes]:
+        """
+        Content-MD5 del archivo en el destino si existe y tiene el mismo tamaño
+        (una sola llamada, sin descargar nada); None si hay que subirlo.
+        `retry` envuelve la llamada (ver `_with_retries`).
+        """
+        if total_bytes is None:
+            return None
+        try:
+            properties = retry(file_client.get_file_properties)
+        except ResourceNotFoundError:
+            return None
+        content_md5 = properties.content_settings.content_md5
+        if properties.size != total_bytes or not content_md5:
+            return None
+        return bytes(content_md5)
+    
+    @staticmethod
+    def _hash_stream(stream: BinaryIO, chunk_size: int) -> bytes:
+        """MD5 del stream leyéndolo por bloques; lo deja de nuevo al inicio."""
+        md5 = hashlib.md5()
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            md5.update(chunk)
+        stream.seek(0)
+        return md5.digest()
+    
+    @staticmethod
+    @contextmanager
+    def _open_source(file_path_or_content) -> Iterator[Tuple[BinaryIO, Optional[int]]]:
+        """
+        Abre el origen de la carga como stream binario.
+        
+        Yields:
+            Tupla (stream, tamaño en bytes o None si no se puede conocer)
+        """
+        if isinstance(file_path_or_content, str) and os.path.exists(file_path_or_content):
+            # Es una ruta de archivo
+            with open(file_path_or_content, 'rb') as f:
+                yield f, os.path.getsize(file_path_or_content)
+        elif hasattr(file_path_or_content, 'read'):
+            # Es un objeto file-like (como UploadedFile de Streamlit)
+            total_bytes = None
+            if hasattr(file_path_or_content, 'seek'):
+                file_path_or_content.seek(0, os.SEEK_END)
+                total_bytes = file_path_or_content.tell()
+                file_path_or_content.seek(0)  # Asegurar que estamos al inicio
+            yield file_path_or_content, total_bytes
+        else:
+            # Asumir que es bytes
+            yield io.BytesIO(file_path_or_content), len(file_path_or_content)
+    
+    @staticmethod
+    def _append_chunks(
+        file_client,
+        stream: BinaryIO,
+        chunk_size: int,
+        max_concurrency: int,
+        on_chunk: Callable[[int], None],
+        hasher=None,
+        checkpoint: Optional[UploadCheckpoint] = None,
+        retry: Optional[Callable] = None
+    ) -> int:
+        """
+        Envía el stream con `append_data` en bloques concurrentes.
+        
+        La lectura es secuencial en el hilo que llama; solo el envío es
+        concurrente. Antes de leer un bloque nuevo se espera a que haya lugar,
+        así que la memoria queda acotada a `max_concurrency` bloques. Si se
+        pasa `hasher` (p. ej. hashlib.md5()), se actualiza con cada bloque leído.
+        Con `checkpoint`, los bloques ya confirmados se saltan y cada bloque
+        confirmado se anota; `retry` envuelve cada `append_data` (ver `_with_retries`).
+        
+        Returns:
+            Bytes enviados (posición para `flush_data`).
+        """
+        def send(data: bytes, position: int) -> Tuple[int, int]:
+            append = partial(file_client.append_data, data, offset=position, length=len(data))
+            if retry:
+                retry(append)
+            else:
+                append()
+            return position, len(data)
+        
+        def collect(done) -> None:
+            # Anota todos los bloques confirmados antes de propagar una falla
+            nonlocal confirmed
+            error = None
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                position, length = future.result()
+                confirmed += length
+                if checkpoint:
+                    checkpoint.acked.add(position)
+            if checkpoint:
+                checkpoint.save()
+            on_chunk(confirmed)
+            if error is not None:
+                raise error
+        
+        offset = 0
+        confirmed = checkpoint.acked_bytes() if checkpoint else 0
+        pending = set()
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                try:
+                    while True:
+                        if len(pending) >= max_concurrency:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            collect(done)
+                        if checkpoint and offset in checkpoint.acked:
+                            # Confirmado por una carga anterior: no volver a leerlo ni enviarlo
+                            offset = min(offset + chunk_size, checkpoint.total_bytes)
+                            stream.seek(offset)
+                            continue
+                        chunk = stream.read(chunk_size)
+                        if not chunk:
+                            break
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        pending.add(pool.submit(send, chunk, offset))
+                        offset += len(chunk)
+                    while pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                except BaseException:
+                    # Un bloque falló: no enviar los que aún esperan turno
+                    for future in pending:
+                        future.cancel()
+                    raise
+        except BaseException:
+            if checkpoint:
+                # Los bloques que estaban en vuelo terminaron al cerrar el pool:
+                # anotar los confirmados para reanudar desde ahí
+                for future in pending:
+                    if not future.cancelled() and future.exception() is None:
+                        checkpoint.acked.add(future.result()[0])
+                checkpoint.save()
+            raise
+        return offset
+    
+    def list_files(self, directory: str) -> List[str]:
+        """
+        Archivos bajo un directorio, en todos sus niveles.
+        
+        Args:
+            directory: Directorio dentro del contenedor.
+            
+        Returns:
+            Rutas completas de los archivos (vacía si el directorio no existe).
+        """
+        def listar() -> List[str]:
+            try:
+                return [
+                    path.name
+                    for path in self._file_system_client().get_paths(path=directory.strip("/"), recursive=True)
+                    if not path.is_directory
+                ]
+            except ResourceNotFoundError:
+                return []
+        
+        return _with_retries(listar, Config.UPLOAD_REINTENTOS, Config.UPLOAD_ESPERA_BASE_S)
+    
+    def delete_files(self, paths: List[str]) -> Tuple[bool, str]:
+        """
+        Elimina archivos del contenedor; los que ya no existen se ignoran.
+        
+        Args:
+            paths: Rutas completas de los archivos.
+            
+        Returns:
+            Tupla (éxito, mensaje)
+        """
+        file_system_client = self._file_system_client()
+        
+        def eliminar(path: str) -> None:
+            try:
+                file_system_client.get_file_client(path).delete_file()
+            except ResourceNotFoundError:
+                pass
+        
+        for path in paths:
+            try:
+                _with_retries(partial(eliminar, path), Config.UPLOAD_REINTENTOS, Config.UPLOAD_ESPERA_BASE_S)
+            except Exception as e:
+                return False, f"No se pudo eliminar {path}: {str(e)}"
+        return True, f"{len(paths)} archivos eliminados"
     
     def test_connection(self) -> Tuple[bool, str]:
         """
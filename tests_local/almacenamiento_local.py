@@ -0,0 +1,268 @@
+"""
+Sustituto local de Azure Data Lake Storage Gen2 para las pruebas de carga.
+
+Implementa el subconjunto de `DataLakeServiceClient` que usa
+`storage_client.AzureStorageClient` (sistemas de archivos con get_paths,
+directorios y archivos con create_file / append_data / flush_data /
+delete_file) sobre un directorio local. Igual que ADLS, los bloques de `append_data` quedan sin confirmar
+hasta `flush_data`, que exige que cubran el archivo sin huecos.
+
+Como en el servicio, los bloques sin confirmar pertenecen a la ruta y no al
+cliente: otro `get_file_client` de la misma ruta (p. ej. al reanudar una
+carga) puede completarlos y confirmarlos.
+
+Opcionalmente simula la red: `latencia_s` por llamada y `mb_por_segundo` por
+conexión, para que la concurrencia tenga efecto medible; y sus fallas:
+`tasa_fallas` es la probabilidad de que un `append_data` falle (a veces
+después de guardar el bloque, como una respuesta que se pierde) y
+`limite_bytes` hace fallar todo bloque que pase de esa posición, como una
+conexión que se cae a mitad de la carga; `fallas_pendientes[operacion] = n`
+hace que las próximas n llamadas a esa operación fallen de forma transitoria.
+
+Uso:
+    servicio = ServicioLocal(directorio, latencia_s=0.02, mb_por_segundo=50)
+    cliente = AzureStorageClient("local", "clave", "raw", service_client=servicio)
+"""
+import json
+import os
+import posixpath
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceNotFoundError,
+    ServiceResponseError,
+)
+
+
+class ServicioLocal:
+    """Equivalente local de DataLakeServiceClient."""
+
+    def __init__(
+        self,
+        directorio: str,
+        latencia_s: float = 0.0,
+        mb_por_segundo: float = 0.0,
+        tasa_fallas: float = 0.0,
+        semilla: Optional[int] = None
+    ):
+        self.directorio = directorio
+        self.latencia_s = latencia_s
+        self.mb_por_segundo = mb_por_segundo
+        self.tasa_fallas = tasa_fallas
+        self.limite_bytes: Optional[int] = None
+        self.fallas_pendientes = Counter()
+        # Llamadas por operación (ida y vuelta a la red en el servicio real)
+        self.llamadas = Counter()
+        # Rangos enviados y sin confirmar de cada ruta
+        self.sin_confirmar: Dict[str, List[Tuple[int, int]]] = {}
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def _llamada(self, operacion: str, bytes_enviados: int = 0) -> None:
+        with self._lock:
+            self.llamadas[operacion] += 1
+            fallar = self.fallas_pendientes[operacion] > 0
+            if fallar:
+                self.fallas_pendientes[operacion] -= 1
+        if fallar:
+            raise ServiceResponseError(f"Connection aborted: {operacion} sin respuesta")
+        espera = self.latencia_s
+        if self.mb_por_segundo:
+            espera += bytes_enviados / (self.mb_por_segundo * 1024 * 1024)
+        if espera:
+            time.sleep(espera)
+
+    def _falla(self, fin: int) -> Optional[str]:
+        """None si el bloque que termina en `fin` llega; si no, "antes" o "después" de guardarlo."""
+        if self.limite_bytes is not None and fin > self.limite_bytes:
+            return "antes"
+        with self._lock:
+            if self._azar.random() >= self.tasa_fallas:
+                return None
+            return self._azar.choice(["antes", "después"])
+
+    def get_file_system_client(self, file_system: str) -> "SistemaArchivosLocal":
+        return SistemaArchivosLocal(self, file_system)
+
+    def close(self) -> None:
+        pass
+
+
+class SistemaArchivosLocal:
+    """Equivalente local de FileSystemClient (un contenedor)."""
+
+    def __init__(self, servicio: ServicioLocal, nombre: str):
+        self.servicio = servicio
+        self.nombre = nombre
+        self.ruta = os.path.join(servicio.directorio, nombre)
+
+    def create_file_system(self, **kwargs) -> None:
+        self.servicio._llamada("create_file_system")
+        if os.path.isdir(self.ruta):
+            raise ResourceExistsError("The specified filesystem already exists.")
+        os.makedirs(self.ruta)
+
+    def get_file_system_properties(self, **kwargs) -> dict:
+        self.servicio._llamada("get_file_system_properties")
+        if not os.path.isdir(self.ruta):
+            raise ResourceNotFoundError("The specified filesystem does not exist.")
+        return {"name": self.nombre}
+
+    def get_paths(self, path: Optional[str] = None, recursive: bool = True, **kwargs):
+        self.servicio._llamada("get_paths")
+        base = os.path.join(self.ruta, path) if path else self.ruta
+        if not os.path.isdir(base):
+            raise ResourceNotFoundError("The specified path does not exist.")
+        rutas = []
+        for carpeta, subcarpetas, archivos in os.walk(base):
+            relativa = os.path.relpath(carpeta, self.ruta).replace(os.sep, "/")
+            for nombre, es_directorio in [(n, True) for n in subcarpetas] + [(n, False) for n in archivos]:
+                if nombre.endswith(".pendiente"):
+                    continue
+                ruta = nombre if relativa == "." else posixpath.join(relativa, nombre)
+                rutas.append(SimpleNamespace(name=ruta, is_directory=es_directorio))
+            if not recursive:
+                break
+        return sorted(rutas, key=lambda ruta: ruta.name)
+
+    def get_directory_client(self, directory: str) -> "DirectorioLocal":
+        return DirectorioLocal(self, directory)
+
+    def get_file_client(self, file_path: str) -> "ArchivoLocal":
+        return ArchivoLocal(self, file_path)
+
+
+class DirectorioLocal:
+    """Equivalente local de DataLakeDirectoryClient."""
+
+    def __init__(self, sistema: SistemaArchivosLocal, ruta: str):
+        self.servicio = sistema.servicio
+        self.ruta = os.path.join(sistema.ruta, ruta)
+
+    def exists(self, **kwargs) -> bool:
+        self.servicio._llamada("exists")
+        return os.path.isdir(self.ruta)
+
+    def create_directory(self, **kwargs) -> None:
+        self.servicio._llamada("create_directory")
+        os.makedirs(self.ruta, exist_ok=True)
+
+
+class ArchivoLocal:
+    """Equivalente local de DataLakeFileClient."""
+
+    def __init__(self, sistema: SistemaArchivosLocal, ruta: str):
+        self.servicio = sistema.servicio
+        self.sistema = sistema
+        self.ruta = os.path.join(sistema.ruta, ruta)
+        self._pendiente = self.ruta + ".pendiente"
+        # Propiedades (Content-MD5, tipo) fuera del árbol de datos, como en el servicio
+        self._propiedades = os.path.join(
+            self.servicio.directorio, ".propiedades", sistema.nombre, ruta + ".json"
+        )
+
+    def _verificar_sistema(self) -> None:
+        if not os.path.isdir(self.sistema.ruta):
+            raise ResourceNotFoundError("The specified filesystem does not exist.")
+
+    def create_file(self, content_settings=None, metadata=None, **kwargs) -> dict:
+        self.servicio._llamada("create_file")
+        self._verificar_sistema()
+        # ADLS crea los directorios intermedios y reemplaza el archivo existente
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        with open(self.ruta, "wb"):
+            pass
+        with open(self._pendiente, "wb"):
+            pass
+        with self.servicio._lock:
+            self.servicio.sin_confirmar[self.ruta] = []
+        self._guardar_propiedades(None)
+        return {}
+
+    def _guardar_propiedades(self, content_settings) -> None:
+        os.makedirs(os.path.dirname(self._propiedades), exist_ok=True)
+        with open(self._propiedades, "w") as f:
+            json.dump({
+                "content_md5": content_settings.content_md5.hex() if content_settings and content_settings.content_md5 else None,
+                "content_type": content_settings.content_type if content_settings else None,
+            }, f)
+
+    def append_data(self, data, offset: int, length=None, **kwargs) -> dict:
+        self.servicio._llamada("append_data", len(data))
+        if not os.path.exists(self._pendiente):
+            raise ResourceNotFoundError("The specified path does not exist.")
+        falla = self.servicio._falla(offset + len(data))
+        if falla == "antes":
+            raise ServiceResponseError("Connection aborted: conexión reiniciada")
+        descriptor = os.open(self._pendiente, os.O_WRONLY)
+        try:
+            os.pwrite(descriptor, data, offset)
+        finally:
+            os.close(descriptor)
+        with self.servicio._lock:
+            self.servicio.sin_confirmar.setdefault(self.ruta, []).append((offset, offset + len(data)))
+        if falla == "después":
+            raise ServiceResponseError("Connection aborted: respuesta perdida")
+        return {}
+
+    def flush_data(self, offset: int, content_settings=None, **kwargs) -> dict:
+        self.servicio._llamada("flush_data")
+        posicion = 0
+        with self.servicio._lock:
+            rangos = sorted(self.servicio.sin_confirmar.get(self.ruta, []))
+        for inicio, fin in rangos:
+            if inicio > posicion:
+                break
+            posicion = max(posicion, fin)
+        if posicion < offset or not os.path.exists(self._pendiente):
+            error = HttpResponseError(
+                f"InvalidFlushPosition: datos sin enviar entre {posicion} y {offset}"
+            )
+            error.status_code = 400
+            error.error_code = "InvalidFlushPosition"
+            raise error
+        with open(self._pendiente, "r+b") as f:
+            f.truncate(offset)
+        os.replace(self._pendiente, self.ruta)
+        with self.servicio._lock:
+            self.servicio.sin_confirmar.pop(self.ruta, None)
+        self._guardar_propiedades(content_settings)
+        return {}
+
+    def delete_file(self, **kwargs) -> None:
+        self.servicio._llamada("delete_file")
+        if not os.path.exists(self.ruta):
+            raise ResourceNotFoundError("The specified path does not exist.")
+        os.remove(self.ruta)
+        for ruta in (self._pendiente, self._propiedades):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def get_file_properties(self, **kwargs) -> SimpleNamespace:
+        self.servicio._llamada("get_file_properties")
+        if not os.path.exists(self.ruta):
+            raise ResourceNotFoundError("The specified path does not exist.")
+        propiedades = {}
+        if os.path.exists(self._propiedades):
+            with open(self._propiedades) as f:
+                propiedades = json.load(f)
+        md5 = propiedades.get("content_md5")
+        return SimpleNamespace(
+            size=os.path.getsize(self.ruta),
+            content_settings=SimpleNamespace(
+                content_md5=bytearray.fromhex(md5) if md5 else None,
+                content_type=propiedades.get("content_type"),
+            ),
+        )
+
+    def leer(self) -> bytes:
+        """Contenido confirmado (solo para las pruebas)."""
+        with open(self.ruta, "rb") as f:
+            return f.read()
@@ -0,0 +1,91 @@
+"""
+Medición del arranque en frío: tiempo de `import main` y tiempo hasta /healthz y /readyz.
+
+Cada medición de importación corre en un intérprete nuevo. Con `--directorio`
+se mide otra copia del proyecto (p. ej. una versión anterior extraída con
+`git archive`) para comparar antes y después.
+
+Uso:
+    python -m tests_local.test_arranque
+    python -m tests_local.test_arranque --directorio /tmp/version_anterior
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+RAIZ = Path(__file__).resolve().parent.parent
+PUERTO = int(os.getenv("PUERTO_ARRANQUE", "8766"))
+URL = f"http://127.0.0.1:{PUERTO}"
+
+REPETICIONES = 5
+MODULOS_PESADOS = ["pandas", "numpy", "pdfplumber", "camelot", "openpyxl"]
+
+
+def medir_importacion(directorio: Path) -> float:
+    codigo = (
+        "import sys, time; t = time.perf_counter(); import main; "
+        "print(time.perf_counter() - t); "
+        f"print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=directorio, capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    return float(salida[-2]), salida[-1]
+
+
+def esperar(ruta: str, inicio: float, limite: float = 120) -> float:
+    while time.perf_counter() - inicio < limite:
+        try:
+            r = requests.get(URL + ruta, timeout=1)
+            if r.status_code == 200:
+                return time.perf_counter() - inicio
+            if r.status_code == 404:
+                return float("nan")
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    return float("nan")
+
+
+def medir_servidor(directorio: Path):
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PUERTO), "--log-level", "warning"],
+        cwd=directorio,
+        env={**os.environ, "CONCILIACION_CACHE_ACTIVO": "0"},
+    )
+    try:
+        primera = esperar("/docs", inicio)
+        vida = esperar("/healthz", inicio)
+        preparado = esperar("/readyz", inicio)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+    return primera, vida, preparado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directorio", type=Path, default=RAIZ)
+    args = parser.parse_args()
+
+    tiempos = []
+    for _ in range(REPETICIONES):
+        t, pesados = medir_importacion(args.directorio)
+        tiempos.append(t)
+    print(f"import main (mediana de {REPETICIONES}): {statistics.median(tiempos):.3f} s")
+    print(f"  módulos pesados cargados: {pesados or 'ninguno'}")
+
+    primera, vida, preparado = medir_servidor(args.directorio)
+    print(f"primera respuesta (/docs): {primera:.2f} s")
+    print(f"/healthz: {vida:.2f} s   /readyz: {preparado:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
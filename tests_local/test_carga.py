@@ -0,0 +1,97 @@
+"""
+Prueba de carga: latencia de solicitudes pequeñas mientras corren conciliaciones grandes.
+
+Levanta la API en un subproceso (sin caché), mide la latencia de GET /static/cliente.html
+en reposo y luego mientras se envían conciliaciones en paralelo. Con el trabajo pesado
+en el pool de procesos, el p99 de las solicitudes pequeñas debe mantenerse plano; las
+conciliaciones que excedan la cola deben recibir 429 con Retry-After.
+
+Uso:
+    python -m tests_local.test_carga
+"""
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parent
+ARCHIVOS_DIR = BASE_DIR / "archivos"
+PUERTO = int(os.getenv("PUERTO_CARGA", "8765"))
+URL = f"http://127.0.0.1:{PUERTO}"
+
+PDF_PATH = ARCHIVOS_DIR / "Formato movimiento diario bancolombia.pdf"
+XLS_PATH = ARCHIVOS_DIR / "Movimiento Banco Contabilidad.xlsx"
+
+CONCILIACIONES_PARALELAS = 8
+SOLICITUDES_PEQUENAS = 200
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    k = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[k]
+
+
+def medir_pequenas(n: int):
+    latencias = []
+    for _ in range(n):
+        t = time.perf_counter()
+        requests.get(f"{URL}/static/cliente.html", timeout=30)
+        latencias.append((time.perf_counter() - t) * 1000)
+        time.sleep(0.01)
+    return latencias
+
+
+def conciliacion_grande():
+    with open(PDF_PATH, "rb") as p, open(XLS_PATH, "rb") as x:
+        r = requests.post(
+            f"{URL}/conciliacion-unificada/",
+            files={"pdf_file": (PDF_PATH.name, p), "contabilidad_file": (XLS_PATH.name, x)},
+            timeout=300,
+        )
+    return r.status_code, r.headers.get("Retry-After")
+
+
+def resumen(nombre, latencias):
+    print(
+        f"{nombre:<28} n={len(latencias):<4} "
+        f"p50={percentil(latencias, 50):7.1f} ms  p99={percentil(latencias, 99):7.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    env = dict(os.environ, CONCILIACION_CACHE_ACTIVO="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PUERTO), "--log-level", "warning"],
+        cwd=BASE_DIR.parent,
+        env=env,
+    )
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"{URL}/static/cliente.html", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+
+        # Calentar el pool de procesos (la primera conciliación importa pandas/camelot)
+        print("Calentamiento:", conciliacion_grande())
+
+        resumen("En reposo", medir_pequenas(SOLICITUDES_PEQUENAS))
+
+        with ThreadPoolExecutor(max_workers=CONCILIACIONES_PARALELAS) as pool:
+            futuros = [pool.submit(conciliacion_grande) for _ in range(CONCILIACIONES_PARALELAS)]
+            time.sleep(0.5)
+            resumen("Con conciliaciones en curso", medir_pequenas(SOLICITUDES_PEQUENAS))
+            resultados = [f.result() for f in futuros]
+
+        codigos = [c for c, _ in resultados]
+        print("Conciliaciones:", {c: codigos.count(c) for c in sorted(set(codigos))})
+        print("Retry-After en 429:", sorted({ra for c, ra in resultados if c == 429}))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,159 @@
+"""
+Carga por lote (batch_upload) contra el almacenamiento local.
+
+Arma un lote de un mes de `ventas_diarias`: 28 archivos con la fecha en el
+nombre dentro de un .zip, dos sueltos sin fecha en el nombre (se toma del
+contenido), uno con una columna de menos, uno que no es .xlsx, uno con la hoja
+dañada y sin fecha en el nombre, y un nombre repetido.
+Comprueba el estado, la fecha y la ruta de cada archivo, y compara el tiempo
+del lote en serie (1 hilo de validación y 1 de carga) y en paralelo con
+latencia de red simulada. Aparte, comprueba que los límites de archivos y de
+MB del lote se aplican antes de descomprimir cada entrada del .zip.
+
+Uso:
+    python -m tests_local.test_carga_lote
+"""
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import openpyxl
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_upload import DUPLICADO, INVALIDO, SUBIDO, process_batch, read_batch
+from config import Config
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+from tests_local.test_validacion_contenido import libro_danado
+from validators import ExcelValidator
+
+TIPO = "ventas_diarias"
+COLUMNAS = [
+    "Fecha", "ID_Producto", "Nombre_Producto", "Categoria", "Cantidad_Vendida",
+    "Precio_Venta", "Total_Venta", "Vendedor", "Region",
+]
+
+
+class Subido(io.BytesIO):
+    """Imita el UploadedFile de Streamlit."""
+
+    def __init__(self, name: str, content: bytes):
+        super().__init__(content)
+        self.name = name
+
+
+def libro(fecha: datetime.date, columnas=COLUMNAS, filas: int = 500) -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(columnas)
+    for i in range(filas):
+        fila = [fecha, f"P{i}", "Producto", "Cat", 2, 10.5, 21, "Ana", "Norte"]
+        ws.append(fila[:len(columnas)])
+    contenido = io.BytesIO()
+    wb.save(contenido)
+    return contenido.getvalue()
+
+
+def armar_lote():
+    comprimido = io.BytesIO()
+    with zipfile.ZipFile(comprimido, "w") as zf:
+        for dia in range(1, 29):
+            zf.writestr(f"mayo/ventas_2025-05-{dia:02d}.xlsx", libro(datetime.date(2025, 5, dia)))
+        zf.writestr("__MACOSX/mayo/._ventas_2025-05-01.xlsx", b"basura")
+        zf.writestr("mayo/leeme.txt", b"no es excel")
+    return [
+        Subido("mayo.zip", comprimido.getvalue()),
+        Subido("ventas_dia29.xlsx", libro(datetime.date(2025, 5, 29))),
+        Subido("ventas_dia30.xlsx", libro(datetime.date(2025, 5, 30))),
+        Subido("ventas_31.05.2025.xlsx", libro(datetime.date(2025, 5, 31), COLUMNAS[:-1])),
+        Subido("danado_20250501.xlsx", b"esto no es un xlsx"),
+        Subido("ventas_hoja_danada.xlsx", libro_danado(libro(datetime.date(2025, 5, 2)))),
+        Subido("ventas_2025-05-01.xlsx", libro(datetime.date(2025, 5, 1))),
+    ]
+
+
+def procesar(directorio: str, lote: list, hilos_validacion: int, hilos_carga: int):
+    validator = ExcelValidator(Config.STANDARDS_DIR)
+    servicio = ServicioLocal(directorio, latencia_s=0.03, mb_por_segundo=20)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+    estandar = validator.get_standard(TIPO)
+
+    inicio = time.perf_counter()
+    items, errores = read_batch(lote, Config.LOTE_MAX_ARCHIVOS)
+    terminados = []
+    process_batch(
+        validator, cliente, items, TIPO, datetime.date(2025, 6, 1),
+        lambda fecha: estandar.build_storage_path("busint", "yanko", fecha),
+        validation_workers=hilos_validacion, upload_workers=hilos_carga, on_done=terminados.append,
+    )
+    # Cada archivo, incluido el duplicado, se reporta una vez
+    assert sorted(map(id, terminados)) == sorted(map(id, items)), len(terminados)
+    return items, errores, time.perf_counter() - inicio
+
+
+def probar_limites() -> None:
+    comprimido = io.BytesIO()
+    with zipfile.ZipFile(comprimido, "w", zipfile.ZIP_DEFLATED) as zf:
+        for dia in range(1, 6):
+            zf.writestr(f"ventas_2025-05-{dia:02d}.xlsx", libro(datetime.date(2025, 5, dia), filas=10))
+        # 64 MB sin comprimir que ocupan unos 64 KB en el .zip
+        zf.writestr("enorme_2025-05-06.xlsx", bytes(64 * 1024 * 1024))
+        zf.writestr("ventas_2025-05-07.xlsx", libro(datetime.date(2025, 5, 7), filas=10))
+
+    leidas = []
+    leer = zipfile.ZipFile.read
+    zipfile.ZipFile.read = lambda zf, nombre, pwd=None: leidas.append(nombre) or leer(zf, nombre, pwd)
+    try:
+        items, errores = read_batch([Subido("mayo.zip", comprimido.getvalue())], 3)
+        assert [item.name for item in items] == [f"ventas_2025-05-0{dia}.xlsx" for dia in (1, 2, 3)]
+        assert len(leidas) == 3 and errores == ["El lote tiene 7 archivos; se procesan los primeros 3"], errores
+        print(f"OK máximo de archivos: {errores[0]}")
+
+        leidas.clear()
+        items, errores = read_batch([Subido("mayo.zip", comprimido.getvalue())], 100, 10 * 1024 * 1024)
+        assert len(items) == 6 and len(leidas) == 6, [item.name for item in items]
+        assert "enorme_2025-05-06.xlsx" not in {item.name for item in items}
+        assert errores == ["El lote supera 10 MB sin comprimir; se omiten 1 archivo(s): enorme_2025-05-06.xlsx"]
+        print(f"OK máximo de MB, sin descomprimir la entrada grande: {errores[0]}")
+    finally:
+        zipfile.ZipFile.read = leer
+
+
+def main() -> None:
+    probar_limites()
+    with tempfile.TemporaryDirectory() as directorio:
+        lote = armar_lote()
+        hilos = (Config.LOTE_HILOS_VALIDACION, Config.LOTE_HILOS_CARGA)
+        items, errores, paralelo = procesar(os.path.join(directorio, "paralelo"), lote, *hilos)
+        _, _, serie = procesar(os.path.join(directorio, "serie"), lote, 1, 1)
+
+        por_nombre = {}
+        for item in items:
+            por_nombre.setdefault(item.name, item)
+            print(f"{item.name:26s} {item.status:10s} {item.report_date} ({item.date_source}) {item.destination}")
+        assert not errores, errores
+        assert len(items) == 34, len(items)
+        assert sum(item.status == SUBIDO for item in items) == 30
+        assert por_nombre["ventas_dia29.xlsx"].date_source == "contenido"
+        assert por_nombre["ventas_dia29.xlsx"].destination == "busint/yanko/ventas/diarias/2025/05/29"
+        assert por_nombre["ventas_31.05.2025.xlsx"].status == INVALIDO
+        assert por_nombre["ventas_31.05.2025.xlsx"].report_date == datetime.date(2025, 5, 31)
+        assert por_nombre["danado_20250501.xlsx"].status == INVALIDO
+        assert por_nombre["ventas_hoja_danada.xlsx"].status == INVALIDO
+        assert por_nombre["ventas_hoja_danada.xlsx"].date_source == "formulario"
+        assert [item.status for item in items if item.name == "ventas_2025-05-01.xlsx"] == [SUBIDO, DUPLICADO]
+        destino = os.path.join(directorio, "paralelo", "raw", "busint", "yanko", "ventas", "diarias", "2025", "05")
+        assert len(os.listdir(destino)) == 30, os.listdir(destino)
+        print(f"lote de {len(items)} archivos: en serie {serie:.2f} s, "
+              f"{hilos[0]} hilos de validación y {hilos[1]} de carga {paralelo:.2f} s")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
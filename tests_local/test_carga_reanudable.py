@@ -0,0 +1,175 @@
+"""
+Cargas reanudables y reintentos de AzureStorageClient.upload_file.
+
+Contra el almacenamiento local con fallas inyectadas comprueba que:
+1. con un 20 % de `append_data` fallidos (algunos después de guardar el
+   bloque) la carga termina sola gracias a los reintentos con espera;
+2. si la conexión se cae al 90 %, la carga falla dejando un checkpoint y la
+   siguiente llamada (con un cliente nuevo, como tras reiniciar la app) envía
+   solo el 10 % que faltaba;
+3. un contenido distinto para la misma ruta no reanuda el checkpoint anterior;
+4. si el destino perdió los bloques sin confirmar (otro proceso reemplazó el
+   archivo), la carga vuelve a empezar desde cero y termina bien;
+5. una falla transitoria al crear el contenedor o al consultar el MD5 del
+   destino se reintenta y no hace fallar la carga.
+
+Además mide, para un archivo de --mb MB que falla al 90 % con latencia y
+ancho de banda simulados, repetir la carga completa frente a reanudarla.
+
+Uso:
+    python -m tests_local.test_carga_reanudable
+    python -m tests_local.test_carga_reanudable --mb 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+
+MB = 1024 * 1024
+
+
+def cliente_local(servicio: ServicioLocal) -> AzureStorageClient:
+    return AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+
+
+def leer(servicio: ServicioLocal, ruta: str) -> bytes:
+    return servicio.get_file_system_client("raw").get_file_client(ruta).leer()
+
+
+def checkpoints() -> list:
+    if not os.path.isdir(Config.UPLOAD_CHECKPOINT_DIR):
+        return []
+    return os.listdir(Config.UPLOAD_CHECKPOINT_DIR)
+
+
+def probar_reintentos(directorio: str) -> None:
+    servicio = ServicioLocal(directorio, tasa_fallas=0.2, semilla=7)
+    contenido = os.urandom(24 * MB)
+    exito, mensaje, detalles = cliente_local(servicio).upload_file(
+        contenido, "busint/yanko", "reintentos.xlsx", chunk_size=MB, max_concurrency=4
+    )
+    assert exito, mensaje
+    assert leer(servicio, "busint/yanko/reintentos.xlsx") == contenido
+    assert servicio.llamadas["append_data"] > 24
+    assert not checkpoints()
+    print(f"OK 20 % de fallas: {servicio.llamadas['append_data']} append_data para 24 bloques")
+
+
+def probar_llamadas_sueltas(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    servicio.fallas_pendientes.update({"create_file_system": 1, "get_file_properties": 2})
+    contenido = os.urandom(MB)
+    exito, mensaje, _ = cliente_local(servicio).upload_file(contenido, "busint/yanko", "sueltas.xlsx")
+    assert exito, mensaje
+    assert servicio.llamadas["create_file_system"] == 2, servicio.llamadas
+    servicio.fallas_pendientes["get_file_properties"] = 2
+    exito, mensaje, detalles = cliente_local(servicio).upload_file(contenido, "busint/yanko", "sueltas.xlsx")
+    assert exito and detalles["actualizado"], mensaje
+    # 2 fallas y la respuesta (no existe) en la primera carga; 2 fallas y el MD5 en la segunda
+    assert servicio.llamadas["get_file_properties"] == 6, servicio.llamadas
+    print(f"OK fallas al crear el contenedor y al consultar el MD5: {mensaje}")
+
+
+def probar_reanudacion(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    contenido = os.urandom(40 * MB)
+    servicio.limite_bytes = int(len(contenido) * 0.9)
+    exito, mensaje, _ = cliente_local(servicio).upload_file(
+        contenido, "busint/yanko", "grande.xlsx", chunk_size=MB, max_retries=2
+    )
+    assert not exito and "Se puede reanudar" in mensaje, mensaje
+    assert servicio.llamadas["flush_data"] == 0
+    assert len(checkpoints()) == 1
+    print(f"OK caída al 90 %: {mensaje}")
+
+    servicio.limite_bytes = None
+    enviados = servicio.llamadas["append_data"]
+    exito, mensaje, detalles = cliente_local(servicio).upload_file(
+        contenido, "busint/yanko", "grande.xlsx", chunk_size=MB
+    )
+    assert exito, mensaje
+    assert leer(servicio, "busint/yanko/grande.xlsx") == contenido
+    assert detalles["bytes_reanudados"] >= 35 * MB, detalles
+    assert detalles["bytes_enviados"] + detalles["bytes_reanudados"] == len(contenido)
+    assert servicio.llamadas["append_data"] - enviados == detalles["bytes_enviados"] // MB
+    assert not checkpoints()
+    print(f"OK reanudada: {mensaje}")
+
+    # Otro contenido para la misma ruta: no usa el checkpoint del anterior
+    servicio.limite_bytes = int(len(contenido) * 0.5)
+    cliente_local(servicio).upload_file(contenido, "busint/yanko", "cambia.xlsx", chunk_size=MB, max_retries=0)
+    servicio.limite_bytes = None
+    distinto = os.urandom(len(contenido))
+    exito, mensaje, detalles = cliente_local(servicio).upload_file(
+        distinto, "busint/yanko", "cambia.xlsx", chunk_size=MB
+    )
+    assert exito and detalles["bytes_reanudados"] == 0, detalles
+    assert leer(servicio, "busint/yanko/cambia.xlsx") == distinto
+    print("OK contenido distinto: carga completa")
+
+    # El destino perdió los bloques sin confirmar: se sube desde el inicio
+    servicio.limite_bytes = int(len(contenido) * 0.5)
+    cliente_local(servicio).upload_file(contenido, "busint/yanko", "perdido.xlsx", chunk_size=MB, max_retries=0)
+    servicio.limite_bytes = None
+    servicio.get_file_system_client("raw").get_file_client("busint/yanko/perdido.xlsx").create_file()
+    exito, mensaje, detalles = cliente_local(servicio).upload_file(
+        contenido, "busint/yanko", "perdido.xlsx", chunk_size=MB
+    )
+    assert exito and detalles["bytes_reanudados"] == 0, mensaje
+    assert leer(servicio, "busint/yanko/perdido.xlsx") == contenido
+    assert not checkpoints()
+    print("OK bloques perdidos en el destino: carga desde el inicio")
+
+
+def medir(directorio: str, megas: int) -> None:
+    # 20 ms por llamada y 20 MB/s por conexión
+    servicio = ServicioLocal(directorio, latencia_s=0.02, mb_por_segundo=20)
+    ruta_local = os.path.join(directorio, "grande.bin")
+    with open(ruta_local, "wb") as f:
+        for _ in range(megas):
+            f.write(os.urandom(MB))
+
+    tiempos = {}
+    for nombre, reanudable_mb in [("repetir completa", 10 ** 6), ("reanudar", Config.UPLOAD_REANUDABLE_MB)]:
+        Config.UPLOAD_REANUDABLE_MB = reanudable_mb
+        servicio.limite_bytes = int(megas * MB * 0.9)
+        cliente_local(servicio).upload_file(ruta_local, "busint/grande", f"{nombre}.bin", max_retries=0)
+        servicio.limite_bytes = None
+        inicio = time.perf_counter()
+        exito, mensaje, _ = cliente_local(servicio).upload_file(ruta_local, "busint/grande", f"{nombre}.bin")
+        tiempos[nombre] = time.perf_counter() - inicio
+        assert exito, mensaje
+    Config.UPLOAD_REANUDABLE_MB = reanudable_mb
+    print(
+        f"{megas} MB, caída al 90 %: repetir la carga completa {tiempos['repetir completa']:.2f} s, "
+        f"reanudar {tiempos['reanudar']:.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        Config.UPLOAD_CHECKPOINT_DIR = os.path.join(directorio, "checkpoints")
+        Config.UPLOAD_ESPERA_BASE_S = 0.01
+        for nombre in ("reintentos", "sueltas", "reanudacion", "medicion"):
+            os.makedirs(os.path.join(directorio, nombre))
+        probar_reintentos(os.path.join(directorio, "reintentos"))
+        probar_llamadas_sueltas(os.path.join(directorio, "sueltas"))
+        probar_reanudacion(os.path.join(directorio, "reanudacion"))
+        medir(os.path.join(directorio, "medicion"), args.mb)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
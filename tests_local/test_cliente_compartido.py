@@ -0,0 +1,76 @@
+"""
+Cliente de Azure Storage compartido: pool de conexiones y caché de contenedores.
+
+1. 8 hilos suben 40 archivos con un mismo cliente contra el almacenamiento
+   local: el contenedor se verifica una sola vez (antes, una vez por archivo).
+2. Vencida la vigencia de la caché, se vuelve a verificar una vez.
+3. Si el contenedor se elimina después de verificarlo, la carga lo vuelve a crear.
+4. El cliente real comparte una sola sesión HTTP con el pool configurado.
+
+Uso:
+    python -m tests_local.test_cliente_compartido
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+
+
+def probar_concurrencia(directorio: str) -> None:
+    servicio = ServicioLocal(directorio, latencia_s=0.005)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+
+    def subir(i: int):
+        return cliente.upload_file(os.urandom(1024), f"busint/yanko/{i % 4}", f"archivo_{i}.xlsx")
+
+    with ThreadPoolExecutor(8) as pool:
+        resultados = list(pool.map(subir, range(40)))
+    assert all(exito for exito, _, _ in resultados), resultados
+    llamadas = servicio.llamadas
+    print(f"40 cargas: create_file_system={llamadas['create_file_system']}, create_file={llamadas['create_file']}")
+    assert llamadas["create_file_system"] == 1
+
+    cliente.known_paths.ttl_seconds = 0.1
+    cliente.known_paths.add("raw")
+    time.sleep(0.2)
+    cliente.upload_file(b"x", "busint/yanko", "otro.xlsx")
+    cliente.upload_file(b"x", "busint/yanko", "otro.xlsx")
+    assert llamadas["create_file_system"] == 2, llamadas
+    print("caché vencida: una verificación más")
+
+    shutil.rmtree(os.path.join(directorio, "raw"))
+    cliente.known_paths.ttl_seconds = 300
+    exito, mensaje, _ = cliente.upload_file(b"x", "busint/yanko", "recreado.xlsx")
+    assert exito, mensaje
+    assert os.path.exists(os.path.join(directorio, "raw", "busint", "yanko", "recreado.xlsx"))
+    print("contenedor eliminado: recreado en la carga")
+
+
+def probar_pool() -> None:
+    cliente = AzureStorageClient("cuenta", "Y2xhdmU=", "raw")
+    transporte = cliente.service_client._pipeline._transport
+    adaptador = transporte.session.get_adapter("https://cuenta.dfs.core.windows.net")
+    assert adaptador._pool_maxsize == Config.STORAGE_POOL_CONNECTIONS
+    contenedor = cliente.service_client.get_file_system_client("raw")
+    assert contenedor._pipeline._transport._transport is transporte
+    print(f"sesión HTTP compartida, pool de {adaptador._pool_maxsize} conexiones")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directorio:
+        probar_concurrencia(directorio)
+    probar_pool()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
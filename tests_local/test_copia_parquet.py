@@ -0,0 +1,158 @@
+"""
+Copia Parquet tipada generada durante la validación (parquet_export).
+
+1. Un libro POS válido: el Parquet tiene las columnas del estándar en su
+   orden, con tipos (fecha, número, texto) y los mismos valores del Excel.
+2. Un libro con errores de contenido: la validación falla y no se usa la copia.
+3. Lote con `"parquet": "also"` (se suben .xlsx y .parquet; la copia pasa
+   por un archivo temporal) y con `"parquet": "instead"` (solo .parquet, la
+   copia queda en memoria) contra el almacenamiento local.
+4. Mide, sobre un libro de --filas filas, el costo de escribir el Parquet en
+   la validación, el tamaño de ambos archivos y la lectura posterior con
+   pandas (read_excel frente a read_parquet).
+
+Uso:
+    python -m tests_local.test_copia_parquet
+    python -m tests_local.test_copia_parquet --filas 200000
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_upload import SUBIDO, process_batch, read_batch
+from config import Config
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+from tests_local.test_carga_lote import Subido
+from tests_local.test_validacion_contenido import TIPO, libro_con_errores
+from validators import ExcelValidator
+
+COLUMNAS = [
+    "Fecha", "ID_Punto_Venta", "Nombre_Punto_Venta", "ID_Producto", "Nombre_Producto",
+    "Cantidad", "Precio_Unitario", "Total_Venta", "Metodo_Pago", "Vendedor",
+]
+
+
+def libro_pos(filas: int) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(COLUMNAS)
+    for i in range(filas):
+        fecha = datetime.datetime(2025, 5, 1 + i % 28, 9 + i % 10, i % 60)
+        ws.append([fecha, i % 40, f"Local {i % 40}", f"SKU-{i % 500}", "Producto", 1 + i % 5,
+                   9.99, round(9.99 * (1 + i % 5), 2), "Efectivo" if i % 2 else "Tarjeta", None])
+    contenido = io.BytesIO()
+    wb.save(contenido)
+    return contenido.getvalue()
+
+
+def probar_tipos(validator: ExcelValidator) -> None:
+    copia = io.BytesIO()
+    ok, mensaje, _ = validator.validate_excel_content(io.BytesIO(libro_pos(12)), TIPO, parquet_sink=copia)
+    assert ok, mensaje
+    tabla = pq.read_table(io.BytesIO(copia.getvalue()))
+    assert tabla.column_names == COLUMNAS, tabla.column_names
+    assert tabla.schema.field("Fecha").type == pa.timestamp("ms")
+    assert tabla.schema.field("Precio_Unitario").type == pa.float64()
+    assert tabla.schema.field("ID_Punto_Venta").type == pa.string()
+    df = tabla.to_pandas()
+    assert df["Fecha"][3] == pd.Timestamp(2025, 5, 4, 12, 3), df["Fecha"][3]
+    assert df["ID_Punto_Venta"][7] == "7"
+    assert df["Total_Venta"][2] == 29.97
+    assert df["Vendedor"].isna().all()
+    print(f"OK tipos: {tabla.num_rows} filas, {tabla.schema.types}")
+
+    copia = io.BytesIO()
+    ok, mensaje, _ = validator.validate_excel_content(io.BytesIO(libro_con_errores()), TIPO, parquet_sink=copia)
+    assert not ok
+    print(f"OK contenido inválido: {mensaje}")
+
+
+def probar_lote(directorio: str) -> None:
+    estandares = os.path.join(directorio, "estandares")
+    shutil.copytree(Config.STANDARDS_DIR, estandares)
+    servicio = ServicioLocal(os.path.join(directorio, "lake"))
+    os.makedirs(servicio.directorio)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+
+    casos = [("also", 0, {"pos_01.xlsx", "pos_01.parquet"}), ("instead", 8, {"pos_01.parquet"})]
+    for modo, memoria_mb, esperados in casos:
+        ruta_estandar = os.path.join(estandares, f"{TIPO}.json")
+        with open(ruta_estandar, encoding="utf-8") as f:
+            datos = json.load(f)
+        datos["parquet"] = modo
+        # Copia en un solo archivo; las particiones se prueban en test_particiones
+        datos.pop("partition_by", None)
+        with open(ruta_estandar, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        validator = ExcelValidator(estandares)
+        estandar = validator.get_standard(TIPO)
+
+        items, _ = read_batch([Subido("pos_01.xlsx", libro_pos(100))], Config.LOTE_MAX_ARCHIVOS)
+        process_batch(
+            validator, cliente, items, TIPO, datetime.date(2025, 5, 1),
+            lambda fecha: estandar.build_storage_path("busint", modo, fecha),
+            parquet_memory_mb=memoria_mb,
+        )
+        assert items[0].parquet is None
+        assert items[0].status == SUBIDO, items[0].message
+        carpeta = os.path.join(servicio.directorio, "raw", items[0].destination)
+        assert set(os.listdir(carpeta)) == esperados, os.listdir(carpeta)
+        filas = pq.read_metadata(os.path.join(carpeta, "pos_01.parquet")).num_rows
+        assert filas == 100, filas
+        print(f"OK lote con parquet={modo}: {sorted(esperados)}")
+
+
+def medir(validator: ExcelValidator, filas: int) -> None:
+    contenido = libro_pos(filas)
+
+    inicio = time.perf_counter()
+    ok, _, _ = validator.validate_excel_content(io.BytesIO(contenido), TIPO)
+    solo_validacion = time.perf_counter() - inicio
+    copia = io.BytesIO()
+    inicio = time.perf_counter()
+    ok_parquet, _, _ = validator.validate_excel_content(io.BytesIO(contenido), TIPO, parquet_sink=copia)
+    con_parquet = time.perf_counter() - inicio
+    assert ok and ok_parquet
+
+    inicio = time.perf_counter()
+    pd.read_excel(io.BytesIO(contenido))
+    lectura_excel = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    pd.read_parquet(io.BytesIO(copia.getvalue()))
+    lectura_parquet = time.perf_counter() - inicio
+
+    print(f"{filas} filas: validación {solo_validacion:.2f} s, con copia Parquet {con_parquet:.2f} s")
+    print(f"tamaño: xlsx {len(contenido) / 1024:.0f} KB, parquet {len(copia.getvalue()) / 1024:.0f} KB")
+    print(f"lectura con pandas: read_excel {lectura_excel:.2f} s, read_parquet {lectura_parquet:.3f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=50_000)
+    args = parser.parse_args()
+
+    validator = ExcelValidator(Config.STANDARDS_DIR)
+    probar_tipos(validator)
+    with tempfile.TemporaryDirectory() as directorio:
+        probar_lote(directorio)
+    medir(validator, args.filas)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Deduplicación por contenido (Content-MD5) en AzureStorageClient.upload_file.
+
+Contra el almacenamiento local comprueba que:
+1. volver a subir el mismo contenido no envía datos y se informa como ya actualizado;
+2. un contenido distinto del mismo tamaño sí se sube;
+3. un archivo sin Content-MD5 en el destino (subido por otra herramienta) se sube;
+4. una carga fallida no deja un MD5 que haga pasar por actualizado el archivo incompleto;
+5. repetir un lote completo deja todos los archivos como ya actualizados.
+
+Además mide la re-carga de un archivo de --mb MB con latencia simulada.
+
+Uso:
+    python -m tests_local.test_deduplicacion
+"""
+import argparse
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_upload import ACTUALIZADO, process_batch, read_batch
+from config import Config
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+from tests_local.test_carga_lote import TIPO, Subido, libro
+from validators import ExcelValidator
+
+MB = 1024 * 1024
+
+
+def probar_casos(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+    contenido = os.urandom(300 * 1024)
+
+    exito, mensaje, detalles = cliente.upload_file(contenido, "busint/yanko", "ventas.xlsx")
+    assert exito and not detalles["actualizado"] and detalles["bytes_enviados"] == len(contenido)
+
+    antes = dict(servicio.llamadas)
+    exito, mensaje, detalles = cliente.upload_file(io.BytesIO(contenido), "busint/yanko", "ventas.xlsx")
+    assert exito and detalles["actualizado"] and detalles["bytes_enviados"] == 0, mensaje
+    assert servicio.llamadas["append_data"] == antes["append_data"]
+    assert servicio.llamadas["create_file"] == antes["create_file"]
+    print(f"OK mismo contenido: {mensaje}")
+
+    distinto = bytes(reversed(contenido))
+    exito, mensaje, detalles = cliente.upload_file(distinto, "busint/yanko", "ventas.xlsx")
+    assert exito and not detalles["actualizado"], mensaje
+    print("OK contenido distinto del mismo tamaño: subido")
+
+    archivo = servicio.get_file_system_client("raw").get_file_client("busint/yanko/externo.xlsx")
+    archivo.create_file()
+    archivo.append_data(contenido, offset=0)
+    archivo.flush_data(len(contenido))
+    exito, mensaje, detalles = cliente.upload_file(contenido, "busint/yanko", "externo.xlsx")
+    assert exito and not detalles["actualizado"], mensaje
+    exito, mensaje, detalles = cliente.upload_file(contenido, "busint/yanko", "externo.xlsx")
+    assert detalles["actualizado"], mensaje
+    print("OK destino sin Content-MD5: subido una vez, luego actualizado")
+
+    # Falla a mitad de la carga de un archivo que ya estaba actualizado
+    original = archivo.__class__.append_data
+
+    def append_con_fallo(self, data, offset, length=None, **kwargs):
+        if offset > 0:
+            raise ConnectionResetError("conexión reiniciada")
+        return original(self, data, offset, length, **kwargs)
+
+    archivo.__class__.append_data = append_con_fallo
+    try:
+        nuevo = os.urandom(len(contenido))
+        exito, _, _ = cliente.upload_file(
+            nuevo, "busint/yanko", "externo.xlsx", chunk_size=64 * 1024, max_retries=0
+        )
+        assert not exito
+    finally:
+        archivo.__class__.append_data = original
+    exito, mensaje, detalles = cliente.upload_file(nuevo, "busint/yanko", "externo.xlsx")
+    assert exito and not detalles["actualizado"], mensaje
+    print("OK carga fallida: el reintento vuelve a subir")
+
+
+def probar_lote(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+    validator = ExcelValidator(Config.STANDARDS_DIR)
+    estandar = validator.get_standard(TIPO)
+    lote = [Subido(f"ventas_2025-05-{dia:02d}.xlsx", libro(datetime.date(2025, 5, dia), filas=50)) for dia in range(1, 8)]
+
+    def procesar():
+        items, _ = read_batch(lote, Config.LOTE_MAX_ARCHIVOS)
+        process_batch(
+            validator, cliente, items, TIPO, datetime.date(2025, 6, 1),
+            lambda fecha: estandar.build_storage_path("busint", "yanko", fecha),
+        )
+        return items
+
+    procesar()
+    enviados = servicio.llamadas["append_data"]
+    items = procesar()
+    assert all(item.status == ACTUALIZADO for item in items), [item.status for item in items]
+    assert servicio.llamadas["append_data"] == enviados
+    print(f"OK lote repetido: {len(items)} archivos ya actualizados, sin datos enviados")
+
+
+def medir(directorio: str, megas: int) -> None:
+    servicio = ServicioLocal(directorio, latencia_s=0.02, mb_por_segundo=20)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+    contenido = os.urandom(megas * MB)
+    for intento in ("primera carga", "re-carga"):
+        inicio = time.perf_counter()
+        _, mensaje, detalles = cliente.upload_file(contenido, "busint/yanko", "grande.xlsx")
+        print(f"{intento:14s} {time.perf_counter() - inicio:6.2f} s, {detalles['bytes_enviados'] / MB:.0f} MB enviados")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre in ("casos", "lote", "medicion"):
+            os.makedirs(os.path.join(directorio, nombre))
+        probar_casos(os.path.join(directorio, "casos"))
+        probar_lote(os.path.join(directorio, "lote"))
+        medir(os.path.join(directorio, "medicion"), args.mb)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Lector de encabezados por streaming (xlsx_reader.read_header) frente a pandas.
+
+Compara los encabezados con `pd.read_excel(..., nrows=0)` en libros con
+huecos, duplicados, encabezados numéricos, fila 1 vacía y la hoja en otra
+posición, y mide ambos sobre un libro grande.
+
+Uso:
+    python -m tests_local.test_encabezados_xlsx
+    python -m tests_local.test_encabezados_xlsx --archivo export_pos3.xlsx
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from xlsx_reader import read_header
+
+
+def encabezados_pandas(archivo):
+    return [str(c) for c in pd.read_excel(archivo, nrows=0).columns]
+
+
+def libros_de_prueba():
+    wb = openpyxl.Workbook()
+    wb.active.append(["Fecha", "ID", 2024, 1.5, True, "Fecha", "Fecha.1", "Fecha"])
+    yield "duplicados y numéricos", wb
+
+    wb = openpyxl.Workbook()
+    wb.active["B1"] = "X"
+    wb.active["D1"] = "Y"
+    yield "huecos", wb
+
+    wb = openpyxl.Workbook()
+    wb.active["A3"] = "Fecha"
+    yield "fila 1 vacía", wb
+
+    wb = openpyxl.Workbook()
+    wb.create_sheet("Primera", 0).append(["Primera"])
+    wb["Sheet"].append(["Segunda"])
+    yield "orden de hojas", wb
+
+    wb = openpyxl.Workbook()
+    wb.active.append(["Compañia ", " Año", "Ñ"])
+    yield "espacios y acentos", wb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archivo", help="Libro grande para comparar tiempos")
+    args = parser.parse_args()
+
+    for nombre, wb in libros_de_prueba():
+        contenido = io.BytesIO()
+        wb.save(contenido)
+        esperado = encabezados_pandas(io.BytesIO(contenido.getvalue()))
+        obtenido = read_header(io.BytesIO(contenido.getvalue()))
+        assert obtenido == esperado, (nombre, obtenido, esperado)
+        print(f"OK {nombre}: {obtenido}")
+
+    if args.archivo:
+        inicio = time.perf_counter()
+        nuevo = read_header(args.archivo)
+        t_nuevo = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        anterior = encabezados_pandas(args.archivo)
+        t_anterior = time.perf_counter() - inicio
+        assert nuevo == anterior
+        print(f"read_header: {t_nuevo * 1000:.1f} ms   pd.read_excel(nrows=0): {t_anterior:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
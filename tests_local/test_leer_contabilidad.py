@@ -0,0 +1,77 @@
+"""
+Formatos y codificación de la contabilidad (leer_contabilidad).
+
+1. Un CSV exportado por Excel en Windows (cp1252) con tildes y eñes en el
+   preámbulo y en los conceptos se lee igual que su versión UTF-8, desde ruta
+   y desde bytes.
+2. Un CSV cuya muestra inicial es ASCII pero trae bytes cp1252 más adelante
+   también se lee (se reintenta con la siguiente codificación).
+3. Un .xls (por extensión o, sin extensión, por la firma OLE2) falla con
+   `FormatoNoSoportado` en lugar de llegar al lector de CSV.
+
+Uso:
+    python -m tests_local.test_leer_contabilidad
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from leer_contabilidad import FormatoNoSoportado, leer_contabilidad
+
+CONCEPTOS = ["Depósito nómina", "Pago señor Muñoz", "Comisión año 2025"]
+
+
+def csv_contabilidad(filas_ascii: int = 0) -> str:
+    lineas = ["Compañía Ñandú S.A.S.;;", "Movimientos de cuenta;;", "FECHA;CONCEPTO;VALOR"]
+    lineas += [f"2025-05-01;Transferencia {i};100" for i in range(filas_ascii)]
+    lineas += [f"2025-05-0{i + 2};{concepto};{1000 * (i + 1)}" for i, concepto in enumerate(CONCEPTOS)]
+    return "\r\n".join(lineas) + "\r\n"
+
+
+def probar_cp1252(directorio: str) -> None:
+    texto = csv_contabilidad()
+    esperado = leer_contabilidad(texto.encode("utf-8-sig"), "contabilidad.csv")
+    assert list(esperado["Concepto Contabilidad"]) == CONCEPTOS, esperado
+
+    ruta = os.path.join(directorio, "contabilidad.csv")
+    with open(ruta, "wb") as f:
+        f.write(texto.encode("cp1252"))
+    for nombre, fuente in [("ruta", ruta), ("bytes", texto.encode("cp1252"))]:
+        df = leer_contabilidad(fuente, "contabilidad.csv")
+        assert df.equals(esperado), df
+        print(f"OK cp1252 desde {nombre}: {list(df['Concepto Contabilidad'])}")
+
+
+def probar_cp1252_tardio() -> None:
+    # ~200 KB de filas ASCII antes de la primera tilde: la muestra parece UTF-8
+    texto = csv_contabilidad(filas_ascii=8000)
+    df = leer_contabilidad(texto.encode("cp1252"), "contabilidad.csv")
+    assert list(df["Concepto Contabilidad"][-3:]) == CONCEPTOS, df.tail()
+    assert len(df) == 8000 + len(CONCEPTOS)
+    print(f"OK cp1252 después de la muestra: {len(df)} filas")
+
+
+def probar_xls() -> None:
+    ole2 = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + bytes(504)
+    for nombre in ("contabilidad.xls", ""):
+        try:
+            leer_contabilidad(ole2, nombre)
+        except FormatoNoSoportado as e:
+            print(f"OK .xls {'por extensión' if nombre else 'por firma'}: {e}")
+        else:
+            raise AssertionError("el .xls no se rechazó")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directorio:
+        probar_cp1252(directorio)
+    probar_cp1252_tardio()
+    probar_xls()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Estimación de memoria: rechazo, cruce con claves duplicadas, espera por presupuesto y pico real.
+
+1. Estima los archivos de ejemplo y ejecuta la conciliación en un pool de un
+   proceso: imprime la estimación junto al pico real medido en el worker.
+2. Un PDF y una contabilidad con la misma clave fecha_valor repetida deben
+   rechazarse con `CruceDemasiadoGrande` antes del merge.
+3. Con un presupuesto de 100 MB, dos tareas de 80 MB no corren a la vez: la
+   segunda espera a la primera y, si la espera máxima es menor, se rechaza.
+4. Un PDF con más páginas que el máximo se rechaza con `SolicitudDemasiadoGrande`.
+
+Uso:
+    python -m tests_local.test_memoria
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import memoria
+from calentamiento import pdf_minimo
+from config import ConfigAPI
+from ejecutor import Ejecutor, ServidorOcupado, conciliar_archivos
+from memoria import CruceDemasiadoGrande, EstimacionMemoria, SolicitudDemasiadoGrande
+from metricas import registro
+
+ARCHIVOS_DIR = Path(__file__).resolve().parent / "archivos"
+PDF_PATH = ARCHIVOS_DIR / "Extracto PDF.pdf"
+XLS_PATH = ARCHIVOS_DIR / "Movimiento Banco Contabilidad.xlsx"
+
+
+def dormir(segundos: float) -> float:
+    time.sleep(segundos)
+    return segundos
+
+
+async def probar_estimacion(directorio: str) -> None:
+    estimacion = memoria.estimar(str(PDF_PATH), str(XLS_PATH), XLS_PATH.name)
+    print(f"estimación: {estimacion.como_dict()}")
+    ejecutor = Ejecutor(1, 0)
+    try:
+        await ejecutor.ejecutar(
+            conciliar_archivos, str(PDF_PATH), str(XLS_PATH), XLS_PATH.name,
+            os.path.join(directorio, "resultado.xlsx"), estimacion.por_pagina,
+            memoria=estimacion,
+        )
+    finally:
+        ejecutor.cerrar(esperar=True)
+    lineas = [l for l in registro.exportar().splitlines() if l.startswith("memoria_")]
+    print("\n".join(lineas))
+
+
+def probar_cruce(directorio: str) -> None:
+    import pandas as pd
+
+    repeticiones = 120
+    lineas = ["ESTADO DE CUENTA", "DESDE: 2025/05/01 HASTA: 2025/05/31", "FECHA DESCRIPCION VALOR SALDO"]
+    lineas += [f"2/05 PAGO {i} 1,000.00 {i},000.00" for i in range(repeticiones)]
+    pdf = os.path.join(directorio, "duplicados.pdf")
+    with open(pdf, "wb") as f:
+        f.write(pdf_minimo(lineas))
+    contabilidad = os.path.join(directorio, "duplicados.csv")
+    pd.DataFrame({
+        "FECHA": ["02/05/2025"] * repeticiones,
+        "Concepto Contabilidad": ["PAGO"] * repeticiones,
+        "VALOR": [1000] * repeticiones,
+    }).to_csv(contabilidad, index=False)
+
+    ConfigAPI.MEMORIA_MAX_FILAS_CRUCE = repeticiones * repeticiones - 1
+    try:
+        conciliar_archivos(pdf, contabilidad, "duplicados.csv", os.path.join(directorio, "x.xlsx"))
+    except CruceDemasiadoGrande as e:
+        print(f"cruce rechazado: {e}")
+    else:
+        raise AssertionError("Se esperaba CruceDemasiadoGrande")
+
+
+async def probar_presupuesto() -> None:
+    estimacion = EstimacionMemoria(1, 0, 0, 0)
+    estimacion.mb = 80
+
+    ejecutor = Ejecutor(0, 4, presupuesto_mb=100, espera_memoria_s=5)
+    inicio = time.monotonic()
+    await asyncio.gather(
+        ejecutor.ejecutar(dormir, 0.5, memoria=estimacion),
+        ejecutor.ejecutar(dormir, 0.5, memoria=estimacion),
+    )
+    duracion = time.monotonic() - inicio
+    print(f"dos tareas de 80 MB con presupuesto de 100 MB: {duracion:.2f} s (en serie)")
+    assert duracion >= 1.0 and ejecutor.reservado_mb == 0
+
+    ejecutor = Ejecutor(0, 4, presupuesto_mb=100, espera_memoria_s=0.2)
+    resultados = await asyncio.gather(
+        ejecutor.ejecutar(dormir, 0.5, memoria=estimacion),
+        ejecutor.ejecutar(dormir, 0.5, memoria=estimacion),
+        return_exceptions=True,
+    )
+    assert isinstance(resultados[1], ServidorOcupado), resultados
+    print(f"sin presupuesto tras la espera máxima: {resultados[1]}")
+    ejecutor.cerrar(esperar=True)
+
+
+def probar_paginas() -> None:
+    ConfigAPI.MEMORIA_MAX_PAGINAS = 0
+    try:
+        memoria.verificar(memoria.estimar(str(PDF_PATH), str(XLS_PATH), XLS_PATH.name))
+    except SolicitudDemasiadoGrande as e:
+        print(f"rechazo por páginas: {e}")
+    else:
+        raise AssertionError("Se esperaba SolicitudDemasiadoGrande")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directorio:
+        await probar_estimacion(directorio)
+        probar_cruce(directorio)
+    await probar_presupuesto()
+    probar_paginas()
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
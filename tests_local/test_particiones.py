@@ -0,0 +1,193 @@
+"""
+Copia Parquet particionada (`partition_by` del estándar) contra el almacenamiento local.
+
+1. Un mes de POS 3 con `partition_by: ["Fecha"]`: una carpeta `Fecha_dia=...`
+   por día en `parquet/` bajo la ruta del mes, con el manifiesto; la consulta
+   de un día con pyarrow.dataset lee solo su partición y conserva la hora de
+   cada venta.
+2. Repetir la carga deja el archivo como ya actualizado; volver a cargarlo con
+   menos días elimina sus particiones anteriores que ya no están en el
+   manifiesto, sin tocar las de otro archivo de la misma carpeta.
+3. Con `["Fecha", "ID_Punto_Venta"]`: una partición por día y punto de venta.
+4. Si falla la carga de una partición no se sube el manifiesto.
+5. Mide, sobre --filas filas, la consulta de un día y de un punto de venta
+   leyendo la copia única del mes frente a las particiones.
+
+Uso:
+    python -m tests_local.test_particiones
+    python -m tests_local.test_particiones --filas 200000
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_upload import ACTUALIZADO, ERROR_CARGA, SUBIDO, process_batch, read_batch
+from config import Config
+from parquet_export import write_partitions
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+from tests_local.test_carga_lote import Subido
+from tests_local.test_copia_parquet import libro_pos
+from tests_local.test_validacion_contenido import TIPO
+from validators import ExcelValidator
+
+
+def validador(directorio: str, partition_by) -> ExcelValidator:
+    """Validador con una copia de los estándares y el `partition_by` indicado."""
+    estandares = os.path.join(directorio, "estandares")
+    shutil.rmtree(estandares, ignore_errors=True)
+    shutil.copytree(Config.STANDARDS_DIR, estandares)
+    ruta_estandar = os.path.join(estandares, f"{TIPO}.json")
+    with open(ruta_estandar, encoding="utf-8") as f:
+        datos = json.load(f)
+    datos["partition_by"] = partition_by
+    with open(ruta_estandar, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+    return ExcelValidator(estandares)
+
+
+def cargar(validator, cliente, contenido: bytes, empresa: str, nombre: str = "pos_mayo.xlsx"):
+    estandar = validator.get_standard(TIPO)
+    items, _ = read_batch([Subido(nombre, contenido)], Config.LOTE_MAX_ARCHIVOS)
+    process_batch(
+        validator, cliente, items, TIPO, datetime.date(2025, 5, 1),
+        lambda fecha: estandar.build_storage_path("busint", empresa, fecha),
+    )
+    return items[0]
+
+
+def probar_particiones(directorio: str) -> None:
+    servicio = ServicioLocal(os.path.join(directorio, "lake"))
+    os.makedirs(servicio.directorio)
+    cliente = AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+    contenido = libro_pos(2000)
+
+    validator = validador(directorio, ["Fecha"])
+    item = cargar(validator, cliente, contenido, "yanko")
+    assert item.status == SUBIDO, item.message
+    assert item.destination.endswith("2025/05. Mayo"), item.destination
+    assert os.path.exists(os.path.join(servicio.directorio, "raw", item.destination, "pos_mayo.xlsx"))
+    mes = os.path.join(servicio.directorio, "raw", item.destination, "parquet")
+    assert sorted(os.listdir(mes))[:2] == ["Fecha_dia=2025-05-01", "Fecha_dia=2025-05-02"]
+    with open(os.path.join(mes, "_manifest_pos_mayo.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    assert manifiesto["rows"] == 2000 and len(manifiesto["files"]) == 28, manifiesto["rows"]
+
+    dataset = ds.dataset(mes, format="parquet", partitioning="hive")
+    filtro = ds.field("Fecha_dia") == "2025-05-04"
+    assert len(list(dataset.get_fragments(filter=filtro))) == 1
+    dia = dataset.to_table(filter=filtro).to_pandas()
+    assert len(dia) == sum(1 for i in range(2000) if i % 28 == 3)
+    assert dia["Fecha"][0] == datetime.datetime(2025, 5, 4, 12, 3), dia["Fecha"][0]
+    print(f"OK partición por día: {len(manifiesto['files'])} archivos, un día lee 1 partición")
+
+    item = cargar(validator, cliente, contenido, "yanko")
+    assert item.status == ACTUALIZADO, item.message
+    print(f"OK carga repetida: {item.message}")
+
+    # Otro archivo en la misma carpeta y luego pos_mayo de nuevo con solo 10 días
+    assert cargar(validator, cliente, libro_pos(100), "yanko", "pos_mayo_b.xlsx").status == SUBIDO
+    item = cargar(validator, cliente, libro_pos(10), "yanko")
+    assert item.status == SUBIDO and "18 anteriores eliminadas" in item.message, item.message
+    dataset = ds.dataset(mes, format="parquet", partitioning="hive")
+    archivos = [os.path.relpath(ruta, mes) for ruta in dataset.files]
+    assert sum(os.path.basename(ruta) == "pos_mayo-0.parquet" for ruta in archivos) == 10, archivos
+    assert sum(os.path.basename(ruta) == "pos_mayo_b-0.parquet" for ruta in archivos) == 28, archivos
+    assert dataset.count_rows() == 10 + 100
+    print(f"OK recarga con menos días: {len(archivos)} archivos en el dataset, {dataset.count_rows()} filas")
+
+    validator = validador(directorio, ["Fecha", "ID_Punto_Venta"])
+    item = cargar(validator, cliente, contenido, "safetti")
+    assert item.status == SUBIDO, item.message
+    mes = os.path.join(servicio.directorio, "raw", item.destination, "parquet")
+    with open(os.path.join(mes, "_manifest_pos_mayo.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    pares = {(1 + i % 28, i % 40) for i in range(2000)}
+    assert len(manifiesto["files"]) == len(pares), len(manifiesto["files"])
+    assert manifiesto["files"][0]["partition"] == {"Fecha_dia": "2025-05-01", "ID_Punto_Venta": "0"}
+    print(f"OK partición por día y punto de venta: {len(pares)} archivos")
+
+    # Falla la carga de una partición: sin manifiesto
+    original = servicio.get_file_system_client
+
+    def sistema_con_fallo(file_system):
+        sistema = original(file_system)
+        crear_cliente = sistema.get_file_client
+
+        def archivo(ruta):
+            if "Fecha_dia=2025-05-07" in ruta:
+                raise ConnectionResetError("conexión reiniciada")
+            return crear_cliente(ruta)
+
+        sistema.get_file_client = archivo
+        return sistema
+
+    servicio.get_file_system_client = sistema_con_fallo
+    item = cargar(validator, cliente, contenido, "zultex")
+    servicio.get_file_system_client = original
+    assert item.status == ERROR_CARGA, item.message
+    mes = os.path.join(servicio.directorio, "raw", item.destination, "parquet")
+    assert not os.path.exists(os.path.join(mes, "_manifest_pos_mayo.json"))
+    print(f"OK partición fallida, sin manifiesto: {item.message}")
+
+
+def medir(directorio: str, filas: int) -> None:
+    validator = validador(directorio, ["Fecha", "ID_Punto_Venta"])
+    estandar = validator.get_standard(TIPO)
+    copia = os.path.join(directorio, "pos_mayo.parquet")
+    with open(copia, "wb") as f:
+        ok, mensaje, _ = validator.validate_excel_content(io.BytesIO(libro_pos(filas)), TIPO, parquet_sink=f)
+    assert ok, mensaje
+    particiones = os.path.join(directorio, "particiones")
+    inicio = time.perf_counter()
+    manifiesto = write_partitions(copia, estandar, "pos_mayo.xlsx", particiones)
+    print(f"{filas} filas en {len(manifiesto['files'])} particiones en {time.perf_counter() - inicio:.2f} s")
+
+    consultas = [
+        ("un día", ds.field("Fecha_dia") == "2025-05-04"),
+        ("un día y punto de venta", (ds.field("Fecha_dia") == "2025-05-04") & (ds.field("ID_Punto_Venta") == 7)),
+    ]
+    for nombre, filtro in consultas:
+        inicio = time.perf_counter()
+        completo = pq.read_table(copia).to_pandas()
+        completo = completo[completo["Fecha"].dt.date == datetime.date(2025, 5, 4)]
+        if "punto" in nombre:
+            completo = completo[completo["ID_Punto_Venta"] == "7"]
+        archivo_unico = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        dataset = ds.dataset(particiones, format="parquet", partitioning="hive")
+        leidas = len(list(dataset.get_fragments(filter=filtro)))
+        resultado = dataset.to_table(filter=filtro)
+        podado = time.perf_counter() - inicio
+        assert resultado.num_rows == len(completo), (resultado.num_rows, len(completo))
+        print(f"{nombre:24s} archivo del mes {archivo_unico:.3f} s, "
+              f"particiones {podado:.3f} s ({leidas} de {len(manifiesto['files'])} archivos leídos)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        probar_particiones(directorio)
+    with tempfile.TemporaryDirectory() as directorio:
+        medir(directorio, args.filas)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Registro de estándares compilados (standards_registry.StandardsRegistry).
+
+Sobre una copia de `standards/` comprueba que:
+1. editar un JSON, agregar uno nuevo o eliminarlo se refleja tras la recarga,
+   sin reiniciar y recompilando solo lo que cambió;
+2. un JSON inválido no tumba el registro;
+3. las rutas de destino coinciden con el formato de cada estándar.
+
+Además mide el costo por "rerun" de Streamlit (listar tipos y cargar un
+estándar) frente a la versión anterior (os.listdir + caché por sesión).
+
+Uso:
+    python -m tests_local.test_registro_estandares
+"""
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from config import Config
+from standards_registry import StandardsRegistry
+
+
+def escribir(ruta: str, contenido: dict) -> None:
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False)
+    # Forzar una fecha de modificación distinta aunque el sistema de archivos tenga poca resolución
+    os.utime(ruta, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+
+
+def probar_recarga(directorio: str) -> None:
+    registry = StandardsRegistry(directorio, reload_interval=0)
+    tipos = registry.report_types()
+    print(f"tipos: {tipos}")
+    pos = registry.get("pos_3_ventas_pos")
+    ventas = registry.get("ventas_diarias")
+    assert pos and ventas and "Fecha" in pos.column_set
+
+    ruta = os.path.join(directorio, "ventas_diarias.json")
+    datos = json.load(open(ruta, encoding="utf-8"))
+    datos["columns"].append(" Nueva ")
+    escribir(ruta, datos)
+    editado = registry.get("ventas_diarias")
+    assert editado is not ventas and editado.columns[-1] == "Nueva"
+    assert registry.get("pos_3_ventas_pos") is pos, "recompiló un estándar sin cambios"
+    print("edición recargada sin reiniciar")
+
+    escribir(os.path.join(directorio, "nuevo.json"), {"columns": ["A"], "storage_path": "x/y"})
+    assert "nuevo" in registry.report_types()
+    os.remove(os.path.join(directorio, "nuevo.json"))
+    assert "nuevo" not in registry.report_types() and registry.get("nuevo") is None
+    print("alta y baja recargadas")
+
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write('{"columns": [')
+    assert registry.get("ventas_diarias") is None and registry.get("pos_3_ventas_pos") is pos
+    escribir(ruta, datos)
+    assert registry.get("ventas_diarias").columns[-1] == "Nueva"
+    print("JSON inválido tolerado")
+
+    espaciado = StandardsRegistry(directorio, reload_interval=60)
+    espaciado.report_types()
+    escribir(os.path.join(directorio, "otro.json"), {"columns": ["A"]})
+    assert "otro" not in espaciado.report_types()
+    espaciado.refresh(force=True)
+    assert "otro" in espaciado.report_types()
+    print("intervalo de recarga respetado")
+
+
+def probar_rutas() -> None:
+    registry = StandardsRegistry(Config.STANDARDS_DIR)
+    fecha = datetime.date(2025, 3, 7)
+    pos = registry.get("pos_3_ventas_pos").build_storage_path("busint", "yanko", fecha)
+    ventas = registry.get("ventas_diarias").build_storage_path("busint", "yanko", fecha)
+    assert pos == "busint/yanko/input/Compañia 1/5. Ventas/06. POS 3/2025/03. Marzo", pos
+    assert ventas == "busint/yanko/ventas/diarias/2025/03/07", ventas
+    print(f"rutas: {pos} | {ventas}")
+
+
+def medir() -> None:
+    repeticiones = 2000
+
+    inicio = time.perf_counter()
+    cache = {}
+    for _ in range(repeticiones):
+        tipos = sorted(n[:-5] for n in os.listdir(Config.STANDARDS_DIR) if n.endswith(".json"))
+        if tipos[0] not in cache:
+            with open(os.path.join(Config.STANDARDS_DIR, tipos[0] + ".json"), encoding="utf-8") as f:
+                cache[tipos[0]] = json.load(f)
+    anterior = (time.perf_counter() - inicio) / repeticiones
+
+    registry = StandardsRegistry(Config.STANDARDS_DIR)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        tipos = registry.report_types()
+        registry.get(tipos[0])
+    nuevo = (time.perf_counter() - inicio) / repeticiones
+    print(f"por rerun: anterior {anterior * 1e6:.1f} µs, registro {nuevo * 1e6:.1f} µs")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directorio:
+        copia = os.path.join(directorio, "standards")
+        shutil.copytree(Config.STANDARDS_DIR, copia)
+        probar_recarga(copia)
+    probar_rutas()
+    medir()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
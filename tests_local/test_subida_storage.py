@@ -0,0 +1,160 @@
+"""
+Carga por bloques de AzureStorageClient contra el almacenamiento local.
+
+1. Sube bytes, una ruta local y un objeto file-like (como el UploadedFile de
+   Streamlit) con bloques pequeños y en paralelo, y compara el contenido.
+2. Un archivo vacío y un bloque que falla (el archivo no queda confirmado).
+3. Mide un archivo de --mb MB con latencia y ancho de banda simulados:
+   la carga anterior (leer todo + una sola llamada) frente a la carga por
+   bloques con 1 y con --concurrencia envíos en paralelo, con su pico de
+   memoria (tracemalloc).
+
+Uso:
+    python -m tests_local.test_subida_storage
+    python -m tests_local.test_subida_storage --mb 256 --concurrencia 8
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage_client import AzureStorageClient
+from tests_local.almacenamiento_local import ServicioLocal
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def cliente_local(servicio: ServicioLocal) -> AzureStorageClient:
+    return AzureStorageClient("local", "Y2xhdmU=", "raw", service_client=servicio)
+
+
+def leer(servicio: ServicioLocal, ruta: str) -> bytes:
+    return servicio.get_file_system_client("raw").get_file_client(ruta).leer()
+
+
+def probar_origenes(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    cliente = cliente_local(servicio)
+    contenido = os.urandom(1 * MB + 12345)
+    ruta_local = os.path.join(directorio, "origen.bin")
+    with open(ruta_local, "wb") as f:
+        f.write(contenido)
+
+    for nombre, origen in [
+        ("bytes", contenido),
+        ("ruta", ruta_local),
+        ("file-like", io.BytesIO(contenido)),
+    ]:
+        avances = []
+        exito, mensaje, _ = cliente.upload_file(
+            origen, "busint/prueba", f"{nombre}.bin",
+            chunk_size=64 * KB, max_concurrency=4,
+            progress_callback=lambda enviados, total, velocidad: avances.append((enviados, total)),
+        )
+        assert exito, mensaje
+        assert leer(servicio, f"busint/prueba/{nombre}.bin") == contenido, nombre
+        assert avances[-1] == (len(contenido), len(contenido)), avances[-1]
+        assert [a for a, _ in avances] == sorted(a for a, _ in avances)
+        print(f"OK {nombre}: {len(avances)} avances. {mensaje}")
+
+    exito, mensaje, _ = cliente.upload_file(b"", "busint/prueba", "vacio.bin")
+    assert exito and leer(servicio, "busint/prueba/vacio.bin") == b"", mensaje
+    print("OK archivo vacío")
+
+
+def probar_fallo(directorio: str) -> None:
+    servicio = ServicioLocal(directorio)
+    cliente = cliente_local(servicio)
+    original = servicio.get_file_system_client
+
+    def sistema_con_fallo(file_system):
+        sistema = original(file_system)
+        crear_cliente = sistema.get_file_client
+
+        def archivo(ruta):
+            archivo_local = crear_cliente(ruta)
+            enviar = archivo_local.append_data
+
+            def append_data(data, offset, length=None, **kwargs):
+                if offset >= 256 * KB:
+                    raise ConnectionResetError("conexión reiniciada")
+                return enviar(data, offset, length, **kwargs)
+
+            archivo_local.append_data = append_data
+            return archivo_local
+
+        sistema.get_file_client = archivo
+        return sistema
+
+    servicio.get_file_system_client = sistema_con_fallo
+    # La falla es permanente: sin reintentos (ver test_carga_reanudable)
+    exito, mensaje, _ = cliente.upload_file(
+        os.urandom(MB), "busint/prueba", "falla.bin", chunk_size=64 * KB, max_retries=0
+    )
+    assert not exito and "conexión reiniciada" in mensaje, mensaje
+    assert servicio.llamadas["flush_data"] == 0
+    print(f"OK fallo en un bloque: {mensaje}")
+
+
+def medir(directorio: str, megas: int, concurrencia: int) -> None:
+    ruta_local = os.path.join(directorio, "grande.bin")
+    with open(ruta_local, "wb") as f:
+        for _ in range(megas):
+            f.write(os.urandom(MB))
+
+    # 20 ms por llamada y 100 MB/s por conexión
+    servicio = ServicioLocal(directorio, latencia_s=0.02, mb_por_segundo=100)
+    cliente = cliente_local(servicio)
+
+    def anterior():
+        # Carga previa: todo el archivo en memoria y un único envío
+        with open(ruta_local, "rb") as f:
+            contenido = f.read()
+        archivo = servicio.get_file_system_client("raw").get_file_client("busint/grande/anterior.bin")
+        archivo.create_file()
+        archivo.append_data(contenido, offset=0, length=len(contenido))
+        archivo.flush_data(len(contenido))
+
+    casos = [
+        ("anterior (read + 1 envío)", anterior),
+        ("bloques de 4 MB x1", lambda: cliente.upload_file(
+            ruta_local, "busint/grande", "x1.bin", chunk_size=4 * MB, max_concurrency=1)),
+        (f"bloques de 4 MB x{concurrencia}", lambda: cliente.upload_file(
+            ruta_local, "busint/grande", f"x{concurrencia}.bin", chunk_size=4 * MB, max_concurrency=concurrencia)),
+    ]
+    servicio.get_file_system_client("raw").create_file_system()
+    for nombre, subir in casos:
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = subir()
+        duracion = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert resultado is None or resultado[0], resultado
+        print(f"{nombre:28s} {megas / duracion:7.1f} MB/s  pico {pico / MB:6.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=64, help="Tamaño del archivo a medir")
+    parser.add_argument("--concurrencia", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre in ("origenes", "fallo", "medicion"):
+            os.makedirs(os.path.join(directorio, nombre))
+        probar_origenes(os.path.join(directorio, "origenes"))
+        probar_fallo(os.path.join(directorio, "fallo"))
+        medir(os.path.join(directorio, "medicion"), args.mb, args.concurrencia)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
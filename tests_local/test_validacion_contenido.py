@@ -0,0 +1,122 @@
+"""
+Validación de contenido por bloques (ExcelValidator.validate_excel_content).
+
+Arma un libro POS con fechas seriales y en texto, números escritos como texto,
+celdas obligatorias vacías y precios negativos, y comprueba que cada error se
+informe con su fila y motivo, y que la validación se detenga al agotar el
+presupuesto de errores. Un libro con la hoja comprimida dañada devuelve un
+error en la validación de estructura y de contenido y no tiene fecha
+detectable, sin lanzar la excepción de zlib. Con --archivo mide tiempo y pico de memoria sobre un
+libro real.
+
+Uso:
+    python -m tests_local.test_validacion_contenido
+    python -m tests_local.test_validacion_contenido --archivo export_pos3.xlsx
+"""
+import argparse
+import datetime
+import io
+import struct
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import openpyxl
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from validators import ExcelValidator
+
+TIPO = "pos_3_ventas_pos"
+
+
+def libro_con_errores() -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([
+        "Fecha", "ID_Punto_Venta", "Nombre_Punto_Venta", "ID_Producto", "Nombre_Producto",
+        "Cantidad", "Precio_Unitario", "Total_Venta", "Metodo_Pago", "Vendedor",
+    ])
+    for _ in range(20):
+        ws.append([datetime.date(2025, 5, 1), 1, "P1", 10, "Café", 2, 100, 200, "Efectivo", "Ana"])
+    # Fila 22: fecha en texto, válida
+    ws.append(["01/05/2025", 1, "P1", 10, "Café", 2, 100, 200, "Efectivo", "Ana"])
+    # Fila 23: fecha, cantidad y total inválidos, precio negativo
+    ws.append(["no es fecha", 1, "P1", 10, "Café", "dos", -5, "1.000,50", "Efectivo", "Ana"])
+    # Fila 24: fecha y punto de venta vacíos
+    ws.append([None, None, "P1", 10, "Café", 2, 100, 200, "Efectivo", "Ana"])
+    ws.append([None] * 10)
+    ws.append([datetime.datetime(2025, 5, 2, 10, 30), "A-1", "P1", "SKU-9", "Té", 1.5, 0, 0, None, None])
+    contenido = io.BytesIO()
+    wb.save(contenido)
+    return contenido.getvalue()
+
+
+def libro_danado(contenido: bytes, miembro: str = "xl/worksheets/sheet1.xml") -> bytes:
+    """Mismo libro con los datos comprimidos de `miembro` alterados (el índice del zip queda intacto)."""
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+        info = zf.getinfo(miembro)
+    datos = bytearray(contenido)
+    nombre, extra = struct.unpack("<HH", datos[info.header_offset + 26:info.header_offset + 30])
+    inicio = info.header_offset + 30 + nombre + extra
+    for i in range(inicio + 8, inicio + info.compress_size - 8, 7):
+        datos[i] ^= 0x5A
+    return bytes(datos)
+
+
+def pico_mb() -> int:
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith("VmHWM:"):
+                return int(linea.split()[1]) // 1024
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archivo", help="Libro POS grande para medir tiempo y memoria")
+    args = parser.parse_args()
+
+    validator = ExcelValidator(Config.STANDARDS_DIR)
+    contenido = libro_con_errores()
+
+    ok, mensaje, detalles = validator.validate_excel_content(io.BytesIO(contenido), TIPO)
+    print(mensaje)
+    errores = detalles["errores_por_columna"]
+    assert not ok and detalles["errores_total"] == 6 and not detalles["detenido"]
+    assert errores["Fecha"]["ejemplos"] == [
+        {"fila": 23, "valor": "no es fecha", "motivo": "no es una fecha"},
+        {"fila": 24, "valor": None, "motivo": "celda vacía"},
+    ]
+    assert errores["Cantidad"]["ejemplos"][0]["motivo"] == "no es un número"
+    assert errores["Precio_Unitario"]["ejemplos"][0]["motivo"] == "menor que el mínimo 0"
+    assert errores["Total_Venta"]["ejemplos"][0]["fila"] == 23
+    for columna, info in errores.items():
+        print(f"  {columna}: {info['ejemplos']}")
+
+    ok, mensaje, detalles = validator.validate_excel_content(
+        io.BytesIO(contenido), TIPO, chunk_rows=5, max_errors=2
+    )
+    print(mensaje)
+    assert not ok and detalles["detenido"] and detalles["filas_validadas"] < 26
+
+    danado = libro_danado(contenido)
+    ok, mensaje, _ = validator.validate_excel_structure(io.BytesIO(danado), TIPO)
+    assert not ok and "dañado" in mensaje, mensaje
+    ok, mensaje, _ = validator.validate_excel_content(io.BytesIO(danado), TIPO)
+    assert not ok and "dañado" in mensaje, mensaje
+    assert validator.detect_report_date(io.BytesIO(danado), TIPO) is None
+    print(f"OK libro dañado: {mensaje}")
+
+    if args.archivo:
+        base = pico_mb()
+        inicio = time.perf_counter()
+        ok, mensaje, detalles = validator.validate_excel_content(args.archivo, TIPO)
+        print(f"{mensaje}  {time.perf_counter() - inicio:.1f} s, +{pico_mb() - base} MB")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Trabajos asíncronos de conciliación con almacenamiento local persistente.
+
+Cada trabajo se registra en una base SQLite y sus archivos (PDF, contabilidad y
+resultado) se guardan en `TRABAJOS_DIR/{id}/`. Los workers toman trabajos
+pendientes dentro de una transacción de escritura, por lo que cada trabajo se
+procesa como máximo una vez, aun con varios procesos compartiendo la misma base. Un trabajo que se
+estaba procesando cuando el servidor se apaga de forma ordenada vuelve a la
+cola si su cálculo aún no empezó; al reiniciar, los pendientes se retoman.
+
+Si el cálculo ya se entregó al pool cuando llega el apagado, el worker espera
+a que termine y registra su resultado en vez de devolverlo a la cola: el
+proceso del pool no se puede detener y el trabajo no debe repetirse.
+
+Mientras procesa un trabajo, su worker renueva cada pocos segundos una
+concesión (`vence`) de `TRABAJOS_CONCESION_SEGUNDOS`. Si el proceso muere
+(caída, OOM, reinicio del contenedor) la concesión vence y cualquier worker,
+de este u otro servidor, marca el trabajo como fallido. No depende del host ni
+del pid, que se repiten tras reiniciar un contenedor.
+"""
+import asyncio
+import os
+import shutil
+import socket
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from config import ConfigAPI
+from cache_resultados import cache_resultados
+from ejecutor import ejecutor, conciliar_archivos, ServidorOcupado
+from ingesta import ArchivoRecibido, hash_archivo
+import memoria
+import progreso
+
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    etapa TEXT,
+    contabilidad_nombre TEXT,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    terminado REAL,
+    worker TEXT,
+    vence REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado);
+"""
+
+# Identifica esta ejecución del proceso: host y pid se repiten tras reiniciar un contenedor
+_INSTANCIA = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class AlmacenTrabajos:
+    """Registro de trabajos en SQLite y sus archivos en disco."""
+
+    def __init__(self, directorio: str):
+        """
+        Args:
+            directorio: Carpeta donde se guardan la base y los archivos de cada trabajo.
+        """
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.db_path = os.path.join(directorio, "trabajos.db")
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_ESQUEMA)
+            columnas = {fila["name"] for fila in con.execute("PRAGMA table_info(trabajos)")}
+            if "vence" not in columnas:
+                try:
+                    con.execute("ALTER TABLE trabajos ADD COLUMN vence REAL")
+                except sqlite3.OperationalError:
+                    # Otro proceso la agregó al mismo tiempo
+                    pass
+
+    def _conectar(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def carpeta(self, trabajo_id: str) -> str:
+        return os.path.join(self.directorio, trabajo_id)
+
+    def ruta_pdf(self, trabajo_id: str) -> str:
+        return os.path.join(self.carpeta(trabajo_id), "extracto.pdf")
+
+    def ruta_contabilidad(self, trabajo_id: str) -> str:
+        return os.path.join(self.carpeta(trabajo_id), "contabilidad")
+
+    def ruta_resultado(self, trabajo_id: str) -> str:
+        return os.path.join(self.carpeta(trabajo_id), "resultado.xlsx")
+
+    def ruta_progreso(self, trabajo_id: str) -> str:
+        return os.path.join(self.carpeta(trabajo_id), "progreso.json")
+
+    def crear(self, pdf: ArchivoRecibido, contabilidad: ArchivoRecibido) -> str:
+        """Mueve los archivos recibidos a la carpeta del trabajo y lo registra como pendiente."""
+        trabajo_id = uuid.uuid4().hex
+        os.makedirs(self.carpeta(trabajo_id))
+        shutil.move(pdf.ruta, self.ruta_pdf(trabajo_id))
+        shutil.move(contabilidad.ruta, self.ruta_contabilidad(trabajo_id))
+        contabilidad_nombre = contabilidad.nombre
+        progreso.marcar(self.ruta_progreso(trabajo_id), "en_cola")
+
+        with self._conectar() as con:
+            con.execute(
+                "INSERT INTO trabajos (id, estado, etapa, contabilidad_nombre, creado) VALUES (?, ?, ?, ?, ?)",
+                (trabajo_id, PENDIENTE, "en cola", contabilidad_nombre, time.time()),
+            )
+        return trabajo_id
+
+    def tomar_siguiente(self, worker: str, concesion_segundos: float) -> Optional[str]:
+        """
+        Marca como `procesando` el trabajo pendiente más antiguo, con una
+        concesión de `concesion_segundos`, y retorna su id.
+        BEGIN IMMEDIATE toma el candado de escritura antes del SELECT, así que
+        solo un worker puede elegir y marcar cada trabajo (sin `UPDATE ...
+        RETURNING`, que requiere SQLite 3.35).
+        """
+        with self._conectar() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                fila = con.execute(
+                    "SELECT id FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1", (PENDIENTE,)
+                ).fetchone()
+                if fila is not None:
+                    ahora = time.time()
+                    con.execute(
+                        "UPDATE trabajos SET estado = ?, etapa = ?, iniciado = ?, worker = ?, vence = ? WHERE id = ?",
+                        (PROCESANDO, "procesando", ahora, worker, ahora + concesion_segundos, fila["id"]),
+                    )
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        return fila["id"] if fila else None
+
+    def renovar(self, trabajo_id: str, worker: str, concesion_segundos: float) -> bool:
+        """Extiende la concesión del trabajo; False si ya no está en `procesando` a nombre de `worker`."""
+        with self._conectar() as con:
+            cursor = con.execute(
+                "UPDATE trabajos SET vence = ? WHERE id = ? AND estado = ? AND worker = ?",
+                (time.time() + concesion_segundos, trabajo_id, PROCESANDO, worker),
+            )
+        return cursor.rowcount == 1
+
+    def actualizar_etapa(self, trabajo_id: str, etapa: str) -> None:
+        with self._conectar() as con:
+            con.execute("UPDATE trabajos SET etapa = ? WHERE id = ?", (etapa, trabajo_id))
+
+    def completar(self, trabajo_id: str) -> None:
+        with self._conectar() as con:
+            con.execute(
+                "UPDATE trabajos SET estado = ?, etapa = ?, terminado = ? WHERE id = ?",
+                (COMPLETADO, "completado", time.time(), trabajo_id),
+            )
+
+    def fallar(self, trabajo_id: str, error: str) -> None:
+        with self._conectar() as con:
+            con.execute(
+                "UPDATE trabajos SET estado = ?, etapa = ?, terminado = ?, error = ? WHERE id = ?",
+                (FALLIDO, "fallido", time.time(), error, trabajo_id),
+            )
+
+    def reencolar(self, trabajo_id: str) -> None:
+        """Devuelve a la cola un trabajo en `procesando` (apagado ordenado del servidor)."""
+        with self._conectar() as con:
+            con.execute(
+                "UPDATE trabajos SET estado = ?, etapa = ?, iniciado = NULL, worker = NULL, vence = NULL "
+                "WHERE id = ? AND estado = ?",
+                (PENDIENTE, "en cola", trabajo_id, PROCESANDO),
+            )
+
+    def obtener(self, trabajo_id: str) -> Optional[Dict]:
+        """Estado del trabajo con tiempos y posición en la cola si está pendiente."""
+        with self._conectar() as con:
+            fila = con.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+            if fila is None:
+                return None
+            trabajo = dict(fila)
+            if trabajo["estado"] == PENDIENTE:
+                trabajo["posicion_cola"] = con.execute(
+                    "SELECT COUNT(*) FROM trabajos WHERE estado = ? AND creado < ?",
+                    (PENDIENTE, trabajo["creado"]),
+                ).fetchone()[0] + 1
+
+        ahora = time.time()
+        inicio = trabajo["iniciado"]
+        fin = trabajo["terminado"]
+        trabajo["espera_s"] = round((inicio or ahora) - trabajo["creado"], 3)
+        trabajo["duracion_s"] = round((fin or ahora) - inicio, 3) if inicio else None
+        trabajo.pop("worker", None)
+        trabajo.pop("vence", None)
+        return trabajo
+
+    def recuperar_interrumpidos(self) -> int:
+        """
+        Marca como fallidos los trabajos en `procesando` cuya concesión venció
+        porque su proceso murió. No se reintentan: como máximo una vez.
+        """
+        ahora = time.time()
+        with self._conectar() as con:
+            cursor = con.execute(
+                "UPDATE trabajos SET estado = ?, etapa = ?, terminado = ?, error = ? "
+                "WHERE estado = ? AND (vence IS NULL OR vence < ?)",
+                (FALLIDO, "fallido", ahora, "Trabajo interrumpido: su proceso dejó de responder",
+                 PROCESANDO, ahora),
+            )
+        return cursor.rowcount
+
+    def purgar(self, retencion_segundos: int) -> None:
+        """Elimina trabajos terminados más antiguos que la retención."""
+        limite = time.time() - retencion_segundos
+        with self._conectar() as con:
+            ids = [
+                f["id"] for f in con.execute(
+                    "SELECT id FROM trabajos WHERE estado IN (?, ?) AND terminado < ?",
+                    (COMPLETADO, FALLIDO, limite),
+                ).fetchall()
+            ]
+            for trabajo_id in ids:
+                con.execute("DELETE FROM trabajos WHERE id = ?", (trabajo_id,))
+        for trabajo_id in ids:
+            shutil.rmtree(self.carpeta(trabajo_id), ignore_errors=True)
+
+
+async def _procesar(almacen: AlmacenTrabajos, trabajo_id: str, enviado: asyncio.Event) -> None:
+    # Las llamadas a SQLite y al disco van en un hilo: pueden esperar el
+    # candado de la base (hasta 30 s) y no deben bloquear el event loop
+    trabajo = await asyncio.to_thread(almacen.obtener, trabajo_id)
+    pdf_path = almacen.ruta_pdf(trabajo_id)
+    contabilidad_path = almacen.ruta_contabilidad(trabajo_id)
+    contabilidad_nombre = trabajo["contabilidad_nombre"] or ""
+    ruta_progreso = almacen.ruta_progreso(trabajo_id)
+
+    async def calcular(destino: str) -> None:
+        estimacion = await asyncio.to_thread(memoria.estimar, pdf_path, contabilidad_path, contabilidad_nombre)
+        memoria.verificar(estimacion)
+        # Los trabajos no se rechazan por cupo: esperan hasta que haya espacio en el pool
+        while True:
+            try:
+                await ejecutor.ejecutar(
+                    conciliar_archivos, pdf_path, contabilidad_path, contabilidad_nombre, destino,
+                    estimacion.por_pagina, progreso=ruta_progreso, memoria=estimacion, al_enviar=enviado.set
+                )
+                return
+            except ServidorOcupado as e:
+                await asyncio.to_thread(almacen.actualizar_etapa, trabajo_id, "esperando cupo")
+                progreso.marcar(ruta_progreso, "esperando_cupo")
+                await asyncio.sleep(min(e.retry_after, 5))
+
+    ruta = almacen.ruta_resultado(trabajo_id)
+    if ConfigAPI.CACHE_ACTIVO:
+        h_pdf = await asyncio.to_thread(hash_archivo, pdf_path)
+        h_cont = await asyncio.to_thread(hash_archivo, contabilidad_path)
+        clave = cache_resultados.clave(h_pdf, h_cont)
+        ruta_cache, _ = await cache_resultados.obtener_o_calcular(clave, calcular)
+        # Copia propia: el resultado del trabajo debe sobrevivir al TTL de la caché
+        await asyncio.to_thread(almacen.actualizar_etapa, trabajo_id, "guardando resultado")
+        try:
+            await asyncio.to_thread(shutil.copyfile, ruta_cache, ruta + ".tmp")
+        finally:
+            os.remove(ruta_cache)
+        os.replace(ruta + ".tmp", ruta)
+    else:
+        await calcular(ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+
+
+async def _tomar(almacen: AlmacenTrabajos, worker: str) -> Optional[str]:
+    """Toma el siguiente trabajo; si el worker se cancela mientras tanto, lo devuelve a la cola."""
+    tarea = asyncio.ensure_future(
+        asyncio.to_thread(almacen.tomar_siguiente, worker, ConfigAPI.TRABAJOS_CONCESION_SEGUNDOS)
+    )
+    try:
+        return await asyncio.shield(tarea)
+    except asyncio.CancelledError:
+        # El hilo no se puede interrumpir: esperar a que termine de marcar el trabajo
+        trabajo_id = await tarea
+        if trabajo_id is not None:
+            await asyncio.to_thread(almacen.reencolar, trabajo_id)
+        raise
+
+
+async def _renovar_concesion(almacen: AlmacenTrabajos, trabajo_id: str, worker: str) -> None:
+    """Renueva la concesión del trabajo cada tercio de su duración mientras se procesa."""
+    concesion = ConfigAPI.TRABAJOS_CONCESION_SEGUNDOS
+    while True:
+        await asyncio.sleep(concesion / 3)
+        if not await asyncio.to_thread(almacen.renovar, trabajo_id, worker, concesion):
+            print(f"Trabajo {trabajo_id}: la concesión venció y otro worker lo marcó como interrumpido")
+            return
+
+
+async def _worker(almacen: AlmacenTrabajos) -> None:
+    worker = _INSTANCIA
+    ultima_purga = 0.0
+    ultima_recuperacion = time.monotonic()
+    while True:
+        if time.monotonic() - ultima_purga > 3600:
+            await asyncio.to_thread(almacen.purgar, ConfigAPI.TRABAJOS_RETENCION_HORAS * 3600)
+            ultima_purga = time.monotonic()
+        if time.monotonic() - ultima_recuperacion > ConfigAPI.TRABAJOS_CONCESION_SEGUNDOS:
+            # Trabajos de procesos que murieron después del arranque (en este u otro servidor)
+            interrumpidos = await asyncio.to_thread(almacen.recuperar_interrumpidos)
+            if interrumpidos:
+                print(f"{interrumpidos} trabajo(s) interrumpidos marcados como fallidos")
+            ultima_recuperacion = time.monotonic()
+
+        trabajo_id = await _tomar(almacen, worker)
+        if trabajo_id is None:
+            await asyncio.sleep(0.5)
+            continue
+
+        concesion = asyncio.create_task(_renovar_concesion(almacen, trabajo_id, worker))
+        enviado = asyncio.Event()
+        tarea = asyncio.ensure_future(_procesar(almacen, trabajo_id, enviado))
+        # El apagado cancela el worker, no el procesamiento: se decide abajo qué hacer con él
+        terminar = asyncio.ensure_future(_terminar(almacen, trabajo_id, tarea))
+        try:
+            await asyncio.shield(terminar)
+        except asyncio.CancelledError:
+            if enviado.is_set():
+                # El cálculo ya corre en el pool y escribirá su resultado aunque
+                # se cancele la espera: terminarlo aquí para no repetirlo
+                await terminar
+            else:
+                # Apagado ordenado antes de empezar el cálculo: queda pendiente
+                # para el próximo arranque (o para otro proceso que comparta la base)
+                tarea.cancel()
+                await asyncio.gather(terminar, return_exceptions=True)
+                await asyncio.to_thread(almacen.reencolar, trabajo_id)
+                progreso.marcar(almacen.ruta_progreso(trabajo_id), "en_cola")
+            raise
+        finally:
+            concesion.cancel()
+
+
+async def _terminar(almacen: AlmacenTrabajos, trabajo_id: str, tarea: asyncio.Future) -> None:
+    """Espera el procesamiento del trabajo y registra si se completó o falló."""
+    try:
+        await tarea
+        await asyncio.to_thread(almacen.completar, trabajo_id)
+        progreso.marcar(almacen.ruta_progreso(trabajo_id), progreso.COMPLETADO)
+    except Exception as e:
+        print(f"Error en trabajo {trabajo_id}: {type(e).__name__}: {e}")
+        await asyncio.to_thread(almacen.fallar, trabajo_id, f"{type(e).__name__}: {e}")
+        progreso.marcar(almacen.ruta_progreso(trabajo_id), progreso.ERROR, error=f"{type(e).__name__}: {e}")
+
+
+_tareas: List[asyncio.Task] = []
+almacen_trabajos: Optional[AlmacenTrabajos] = None
+
+
+def obtener_almacen() -> AlmacenTrabajos:
+    global almacen_trabajos
+    if almacen_trabajos is None:
+        almacen_trabajos = AlmacenTrabajos(ConfigAPI.TRABAJOS_DIR)
+    return almacen_trabajos
+
+
+def iniciar_workers() -> None:
+    """Recupera trabajos interrumpidos y lanza los workers en el event loop actual."""
+    almacen = obtener_almacen()
+    interrumpidos = almacen.recuperar_interrumpidos()
+    if interrumpidos:
+        print(f"{interrumpidos} trabajo(s) interrumpidos marcados como fallidos")
+    for _ in range(ConfigAPI.TRABAJOS_WORKERS):
+        _tareas.append(asyncio.create_task(_worker(almacen)))
+
+
+async def detener_workers() -> None:
+    for tarea in _tareas:
+        tarea.cancel()
+    await asyncio.gather(*_tareas, return_exceptions=True)
+    _tareas.clear()
@@ -6,6 +6,13 @@ from openpyxl.utils import get_column_letter
 from io import BytesIO
 from openpyxl.styles import numbers
 import re
+import time
+from contextlib import nullcontext
+from typing import Optional, Union
+
+from memoria import verificar_cruce
+from metricas import medir, contar, observar_etapa
+import progreso
 
 def _norm(s: str) -> str:
     s = (s or "").strip().upper()
@@ -21,46 +28,62 @@ def _safe_drop_columns(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
     cols_to_drop = [col for col in columns if col in df.columns]
     return df.drop(cols_to_drop, axis=1) if cols_to_drop else df
 
-def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFrame) -> bytes:
-
-    df1 = df_contabilidad.copy()
-    df2 = df_extracto.copy()
-
+def _resolver_columnas_contabilidad(columnas: list) -> dict:
+    """
+    Resuelve, a partir de los nombres de columna de contabilidad, el renombre
+    {columna_real: columna_estándar} hacia FECHA, VALOR y Concepto Contabilidad.
+    Lanza ValueError si no se detectan FECHA y VALOR.
+    """
     # mapa normalizado, para soportar "Asiento " o "ASIENTO"
-    colmap = { _norm(c): c for c in df1.columns }
+    colmap = { _norm(str(c)): c for c in columnas if c is not None }
 
     # detectar por nombre real
-    fecha_col = colmap.get("FECHA") or colmap.get("Fecha".upper())
-    mov_col   = colmap.get("MOVIMIENTO") or colmap.get("Movimiento".upper())
+    fecha_col = colmap.get("FECHA")
+    mov_col   = colmap.get("MOVIMIENTO")
     asiento_col = colmap.get("ASIENTO")
 
     # Si es el archivo Movimiento banco noviembre.xlsx
     if fecha_col and mov_col:
-        df1 = df1.rename(columns={
+        return {
             fecha_col: "FECHA",
             mov_col: "VALOR",
             **({asiento_col: "Concepto Contabilidad"} if asiento_col else {})
-        })
-    else:
-        # Si ya viene en el formato esperado, valida que existan 3 columnas
-        if df1.shape[1] < 3:
-            raise ValueError(f"Contabilidad tiene pocas columnas: {list(df1.columns)}")
-        # si ya trae FECHA, VALOR, Concepto Contabilidad, no toques
-        # si no, aquí es donde deberías mapear tu otro formato, no por posición
-        # por ahora, intenta detectar por nombres
-        colmap = { _norm(c): c for c in df1.columns }
-        fecha_col = colmap.get("FECHA")
-        valor_col = colmap.get("VALOR")
-        concepto_col = colmap.get("CONCEPTO CONTABILIDAD") or colmap.get("CONCEPTO") or colmap.get("DESCRIPCION")
-
-        if fecha_col and valor_col:
-            df1 = df1.rename(columns={
-                fecha_col: "FECHA",
-                valor_col: "VALOR",
-                **({concepto_col: "Concepto Contabilidad"} if concepto_col else {})
-            })
-        else:
-            raise ValueError(f"No detecté FECHA y VALOR en contabilidad. Columnas: {list(df1.columns)}")
+        }
+
+    # Si ya viene en el formato esperado, valida que existan 3 columnas
+    if len(columnas) < 3:
+        raise ValueError(f"Contabilidad tiene pocas columnas: {list(columnas)}")
+    # si ya trae FECHA, VALOR, Concepto Contabilidad, no toques
+    # si no, aquí es donde deberías mapear tu otro formato, no por posición
+    # por ahora, intenta detectar por nombres
+    valor_col = colmap.get("VALOR")
+    concepto_col = colmap.get("CONCEPTO CONTABILIDAD") or colmap.get("CONCEPTO") or colmap.get("DESCRIPCION")
+
+    if fecha_col and valor_col:
+        return {
+            fecha_col: "FECHA",
+            valor_col: "VALOR",
+            **({concepto_col: "Concepto Contabilidad"} if concepto_col else {})
+        }
+    raise ValueError(f"No detecté FECHA y VALOR en contabilidad. Columnas: {list(columnas)}")
+
+def conciliar_movimientos(
+    df_contabilidad: pd.DataFrame,
+    df_extracto: pd.DataFrame,
+    destino: Optional[str] = None
+) -> Union[bytes, str]:
+    """
+    Concilia contabilidad contra extracto y genera el Excel de resultado.
+    Si se indica `destino`, el libro se escribe directo en ese archivo y se
+    retorna la ruta; si no, se retornan los bytes del libro.
+    """
+    inicio_merge = time.perf_counter()
+    progreso.etapa("conciliacion")
+
+    df1 = df_contabilidad.copy()
+    df2 = df_extracto.copy()
+
+    df1 = df1.rename(columns=_resolver_columnas_contabilidad(list(df1.columns)))
 
     # asegurar columna concepto
     if "Concepto Contabilidad" not in df1.columns:
@@ -83,7 +106,8 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
     df2['VALOR'] = pd.to_numeric(df2['VALOR'], errors="coerce").fillna(0).astype(int)
     df2['clave_unica'] = df2['FECHA'] + '_' + df2['VALOR'].astype(str)
 
-
+    # Claves repetidas en ambos lados multiplican las filas: rechazar antes del merge
+    verificar_cruce(df1['clave_unica'], df2['clave_unica'])
 
     merged_df = pd.merge(df1, df2, on='clave_unica', how='outer', suffixes=('_Contabilidad', '_Extracto'))
     # FIX CRÍTICO: Resetear índice para evitar "Unalignable boolean Series"
@@ -103,6 +127,7 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
     mask_valor_ext_neg = (merged_df['VALOR_Extracto'].values < 0)
     mask_valor_cont_na = pd.isna(merged_df['VALOR_Contabilidad'].values)
     mask_valor_ext_na = pd.isna(merged_df['VALOR_Extracto'].values)
+    progreso.avance("filas_emparejadas", int((~mask_valor_cont_na & ~mask_valor_ext_na).sum()), len(merged_df))
     
     # Caso 1: Entradas en contabilidad y no en extracto
     mask_caso1 = mask_valor_cont_pos & mask_valor_ext_na
@@ -185,8 +210,13 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
             df_impuestos = pd.DataFrame(columns=['DESCRIPCION', 'VALOR'])
     else:
         df_impuestos = pd.DataFrame(columns=['DESCRIPCION', 'VALOR'])
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+    observar_etapa("merge", time.perf_counter() - inicio_merge)
+    contar("conciliacion_filas_total", len(merged_df))
+
+    progreso.etapa("render")
+    # Con destino se escribe directo al archivo (handle abierto: no depende de la extensión)
+    sink = open(destino, "wb") if destino is not None else nullcontext(BytesIO())
+    with medir("render"), sink as output, pd.ExcelWriter(output, engine='openpyxl') as writer:
 
             # 🔹 Hoja 1: Resultado del join con formato
             # Escribimos el título primero
@@ -207,6 +237,7 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
                         pass
                 adjusted_width = (max_length + 2)
                 worksheet.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
+            progreso.avance("hojas", 1, 3)
 
             
 
@@ -271,6 +302,8 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
                             cell.number_format = numbers.FORMAT_CURRENCY_USD_SIMPLE
                         data_row += 1
 
+            progreso.avance("hojas", 2, 3)
+
             # Hoja 3: Gastos Bancarios
             df_ingresos.to_excel(writer, sheet_name='Gastos Bancarios', index=False, startrow=2)
             df_gastos_bancarios.to_excel(writer, sheet_name='Gastos Bancarios', index=False, startrow=2+len(df_ingresos)+4)
@@ -309,7 +342,11 @@ def conciliar_movimientos(df_contabilidad: pd.DataFrame, df_extracto: pd.DataFra
                             # Formato pesos colombianos sin decimales
                             cell.number_format = '"$"#,##0'
                         data_row += 1
+            progreso.avance("hojas", 3, 3)
+
 
+    if destino is not None:
+        return destino
 
     # Guardar el archivo Excel en memoria
     output.seek(0)
@@ -1,25 +1,58 @@
 """
 Módulo de validación de archivos Excel.
-Valida que la estructura del Excel coincida con los estándares definidos.
+Valida que la estructura del Excel coincida con los estándares definidos y,
+si el estándar define un `schema`, que el contenido respete los tipos,
+valores vacíos y rangos de cada columna.
 """
-import pandas as pd
+from datetime import date
 from typing import Dict, List, Tuple, Optional
-import json
-import os
+import itertools
+from xml.etree.ElementTree import ParseError
+
+import pandas as pd
+
+from standards_registry import CompiledStandard, StandardsRegistry
+from xlsx_reader import XlsxFormatError, iter_rows, read_header
+
+
+# Tipos de columna soportados en el `schema` de los estándares
+TIPOS_COLUMNA = ("string", "integer", "number", "date", "boolean")
+
+# Rango de fechas seriales de Excel (1900-01-01 a 9999-12-31)
+_SERIAL_MIN = 1
+_SERIAL_MAX = 2958465
+_ORIGEN_EXCEL = pd.Timestamp("1899-12-30")
+
+_VERDADEROS = {"true", "verdadero", "si", "sí", "1"}
+_FALSOS = {"false", "falso", "no", "0"}
 
 
 class ExcelValidator:
-    """Validador de estructura de archivos Excel."""
+    """Validador de estructura y contenido de archivos Excel."""
     
-    def __init__(self, standards_dir: str):
+    def __init__(self, standards_dir: str, registry: Optional[StandardsRegistry] = None):
         """
         Inicializa el validador.
         
         Args:
             standards_dir: Directorio donde se encuentran los archivos JSON de estándares.
+            registry: Registro de estándares compilados a usar (por defecto uno
+                nuevo sobre `standards_dir`).
         """
         self.standards_dir = standards_dir
-        self._standards_cache: Dict[str, Dict] = {}
+        self.registry = registry or StandardsRegistry(standards_dir)
+    
+    def get_standard(self, report_type: str) -> Optional[CompiledStandard]:
+        """
+        Obtiene el estándar compilado de un tipo de informe.
+        
+        Args:
+            report_type: Nombre del tipo de informe (nombre del archivo sin extensión).
+        
+        Returns:
+            Estándar compilado o None si no existe.
+        """
+        return self.registry.get(report_type)
     
     def load_standard(self, report_type: str) -> Optional[Dict]:
         """
@@ -31,22 +64,8 @@ class ExcelValidator:
         Returns:
             Diccionario con el estándar o None si no existe.
         """
-        if report_type in self._standards_cache:
-            return self._standards_cache[report_type]
-        
-        json_path = os.path.join(self.standards_dir, f"{report_type}.json")
-        
-        if not os.path.exists(json_path):
-            return None
-        
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                standard = json.load(f)
-                self._standards_cache[report_type] = standard
-                return standard
-        except Exception as e:
-            print(f"Error al cargar estándar {report_type}: {e}")
-            return None
+        compiled = self.registry.get(report_type)
+        return compiled.data if compiled else None
     
     def get_available_report_types(self) -> List[str]:
         """
@@ -55,16 +74,7 @@ class ExcelValidator:
         Returns:
             Lista de nombres de tipos de informe.
         """
-        if not os.path.exists(self.standards_dir):
-            return []
-        
-        report_types = []
-        for filename in os.listdir(self.standards_dir):
-            if filename.endswith('.json'):
-                report_type = filename[:-5]  # Remover .json
-                report_types.append(report_type)
-        
-        return sorted(report_types)
+        return self.registry.report_types()
     
     def validate_excel_structure(
         self, 
@@ -84,32 +94,31 @@ class ExcelValidator:
             - mensaje: Mensaje descriptivo del resultado
             - detalles: Diccionario con información detallada (columnas_faltantes, columnas_sobrantes, etc.)
         """
-        # Cargar estándar
-        standard = self.load_standard(report_type)
+        # Cargar estándar (columnas ya normalizadas al compilarlo)
+        standard = self.get_standard(report_type)
         if not standard:
             return False, f"No se encontró el estándar para el tipo de informe '{report_type}'", {}
         
-        expected_columns = standard.get("columns", [])
-        if not expected_columns:
+        expected_columns_normalized = list(standard.columns)
+        if not expected_columns_normalized:
             return False, f"El estándar '{report_type}' no define columnas", {}
         
-        # Leer Excel
+        # Leer solo la primera fila de la hoja (streaming, sin cargar el libro)
         try:
-            df = pd.read_excel(excel_file, nrows=0)  # Solo leer encabezados
-        except Exception as e:
+            header = read_header(excel_file)
+        except (XlsxFormatError, ParseError) as e:
             return False, f"Error al leer el archivo Excel: {str(e)}", {}
         
         # Validar que tenga encabezados
-        if df.empty or len(df.columns) == 0:
+        if not header:
             return False, "El archivo Excel no tiene encabezados de columna", {}
         
-        # Obtener columnas del Excel (normalizadas: sin espacios extras, en mayúsculas)
-        excel_columns = [str(col).strip() for col in df.columns]
-        expected_columns_normalized = [str(col).strip() for col in expected_columns]
+        # Obtener columnas del Excel (normalizadas: sin espacios extras)
+        excel_columns = [str(col).strip() for col in header]
         
         # Encontrar diferencias
         excel_set = set(excel_columns)
-        expected_set = set(expected_columns_normalized)
+        expected_set = standard.column_set
         
         missing_columns = sorted(list(expected_set - excel_set))
         extra_columns = sorted(list(excel_set - expected_set))
@@ -130,6 +139,254 @@ class ExcelValidator:
         
         return True, f"✓ Validación exitosa: El archivo cumple con el estándar '{report_type}'", detalles
     
+    def validate_excel_content(
+        self,
+        excel_file,
+        report_type: str,
+        chunk_rows: int = 5000,
+        max_errors_per_column: int = 5,
+        max_errors: int = 100,
+        parquet_sink=None
+    ) -> Tuple[bool, str, Dict]:
+        """
+        Valida el contenido completo del Excel contra el `schema` del estándar.
+
+        El archivo se recorre por streaming en bloques de `chunk_rows` filas y
+        cada bloque se valida con operaciones vectorizadas de pandas, de modo
+        que la memoria no crece con el tamaño del archivo. Se conservan los
+        primeros `max_errors_per_column` errores de cada columna con su número
+        de fila, y la lectura se detiene al superar `max_errors` errores.
+
+        El `schema` es opcional; cada columna admite:
+            - type: string, integer, number, date o boolean
+            - nullable: si admite celdas vacías (por defecto True)
+            - min / max: rango para números y fechas ("AAAA-MM-DD")
+            - format: formato de fechas escritas como texto (p. ej. "%d/%m/%Y")
+            - values: lista de valores permitidos (texto)
+            - max_length: longitud máxima (texto)
+
+        Args:
+            excel_file: Archivo Excel cargado (objeto de Streamlit UploadedFile o path).
+            report_type: Tipo de informe a validar.
+            chunk_rows: Filas por bloque.
+            max_errors_per_column: Errores de ejemplo a conservar por columna.
+            max_errors: Presupuesto de errores; al superarlo se detiene la validación.
+            parquet_sink: Path o file-like binario donde escribir, en la misma
+                pasada, la copia Parquet tipada con las columnas del estándar
+                (ver `parquet_export`). Solo está completa si el contenido es válido.
+
+        Returns:
+            Tupla (es_válido, mensaje, detalles)
+            - detalles: filas_validadas, errores_total, detenido y
+              errores_por_columna ({columna: {"total": n, "ejemplos": [...]}})
+        """
+        standard = self.get_standard(report_type)
+        if not standard:
+            return False, f"No se encontró el estándar para el tipo de informe '{report_type}'", {}
+
+        schema = standard.schema
+        if not schema and parquet_sink is None:
+            return True, f"El estándar '{report_type}' no define tipos de columna", {}
+
+        parquet = None
+        if parquet_sink is not None:
+            from parquet_export import ParquetBlockWriter
+            parquet = ParquetBlockWriter(parquet_sink, standard.columns, schema)
+
+        try:
+            filas = iter_rows(excel_file)
+            _, encabezado = next(filas, (0, {}))
+            columnas = {
+                str(valor).strip(): indice
+                for indice, (_, valor) in encabezado.items()
+            }
+            reglas = {
+                nombre: (columnas[nombre], regla)
+                for nombre, regla in schema.items()
+                if nombre in columnas
+            }
+
+            errores: Dict[str, Dict] = {}
+            errores_total = 0
+            filas_validadas = 0
+            detenido = False
+            while True:
+                bloque = [fila for fila in itertools.islice(filas, chunk_rows) if fila[1]]
+                if not bloque:
+                    break
+                numeros = pd.Series([numero for numero, _ in bloque])
+                tipados: Dict[str, pd.Series] = {}
+                if parquet:
+                    # Columnas sin regla: texto tal cual
+                    for nombre in standard.columns:
+                        if nombre in columnas and nombre not in reglas:
+                            tipados[nombre] = self._columna_bloque(bloque, columnas[nombre])[1]
+                for nombre, (indice, regla) in reglas.items():
+                    tipos, valores = self._columna_bloque(bloque, indice)
+                    motivos, tipados[nombre] = self._validar_columna(tipos, valores, regla)
+                    fallidas = motivos.notna()
+                    cantidad = int(fallidas.sum())
+                    if not cantidad:
+                        continue
+                    errores_total += cantidad
+                    columna = errores.setdefault(nombre, {"total": 0, "ejemplos": []})
+                    columna["total"] += cantidad
+                    faltan = max_errors_per_column - len(columna["ejemplos"])
+                    for i in fallidas[fallidas].index[:faltan]:
+                        columna["ejemplos"].append({
+                            "fila": int(numeros[i]),
+                            "valor": valores[i],
+                            "motivo": motivos[i],
+                        })
+                filas_validadas += len(bloque)
+                if parquet and not errores_total:
+                    parquet.write_block(tipados, len(bloque))
+                if errores_total > max_errors:
+                    detenido = True
+                    break
+            filas.close()
+        except (XlsxFormatError, ParseError) as e:
+            return False, f"Error al leer el archivo Excel: {str(e)}", {}
+        finally:
+            if parquet:
+                parquet.close()
+
+        detalles = {
+            "filas_validadas": filas_validadas,
+            "errores_total": errores_total,
+            "detenido": detenido,
+            "errores_por_columna": errores,
+        }
+        if errores_total:
+            mensaje = f"{errores_total} valores no cumplen el estándar en {len(errores)} columnas"
+            if detenido:
+                mensaje += f" (validación detenida en la fila {int(numeros.iloc[-1])})"
+            return False, mensaje, detalles
+
+        if not schema:
+            return True, f"El estándar '{report_type}' no define tipos de columna ({filas_validadas} filas)", detalles
+        return True, f"✓ Contenido válido: {filas_validadas} filas cumplen los tipos del estándar", detalles
+
+    def detect_report_date(self, excel_file, report_type: str, max_rows: int = 50) -> Optional[date]:
+        """
+        Fecha del informe según su contenido: el primer valor válido de la
+        primera columna de tipo fecha del `schema` (o de la columna "Fecha").
+        
+        Args:
+            excel_file: Archivo Excel cargado (objeto file-like o path).
+            report_type: Tipo de informe.
+            max_rows: Filas de datos a revisar como máximo.
+        
+        Returns:
+            Fecha encontrada o None.
+        """
+        standard = self.get_standard(report_type)
+        if not standard:
+            return None
+        columna = next(
+            (nombre for nombre, regla in standard.schema.items() if regla.get("type") == "date"),
+            "Fecha" if "Fecha" in standard.column_set else None
+        )
+        if columna is None:
+            return None
+        formato = standard.schema.get(columna, {}).get("format", "mixed")
+        
+        try:
+            filas = iter_rows(excel_file)
+            _, encabezado = next(filas, (0, {}))
+            indice = next(
+                (i for i, (_, valor) in encabezado.items() if str(valor).strip() == columna),
+                None
+            )
+            if indice is None:
+                return None
+            bloque = [fila for fila in itertools.islice(filas, max_rows) if fila[1]]
+            filas.close()
+        except (XlsxFormatError, ParseError):
+            return None
+        
+        tipos, valores = self._columna_bloque(bloque, indice)
+        fechas = self._a_fechas(tipos, valores, formato).dropna()
+        return fechas.iloc[0].date() if len(fechas) else None
+
+    @staticmethod
+    def _columna_bloque(bloque: List[tuple], indice: int) -> Tuple[pd.Series, pd.Series]:
+        """Tipos y valores (texto del XML) de una columna del bloque."""
+        celdas = [celdas.get(indice, (None, None)) for _, celdas in bloque]
+        return (
+            pd.Series([tipo for tipo, _ in celdas], dtype=object),
+            pd.Series([valor for _, valor in celdas], dtype=object),
+        )
+
+    @staticmethod
+    def _a_fechas(tipos: pd.Series, valores: pd.Series, formato: str = "mixed") -> pd.Series:
+        """Convierte celdas (seriales de Excel o texto) a fechas; NaT si no se puede."""
+        seriales = pd.to_numeric(valores.where(tipos == "n"), errors="coerce")
+        seriales = seriales.where(seriales.between(_SERIAL_MIN, _SERIAL_MAX))
+        fechas = _ORIGEN_EXCEL + pd.to_timedelta(seriales, unit="D")
+        textos = valores.where(tipos.isin(["s", "d"]))
+        if textos.notna().any():
+            convertidas = pd.to_datetime(textos, format=formato, dayfirst=True, errors="coerce")
+            fechas = fechas.fillna(convertidas)
+        return fechas
+
+    @staticmethod
+    def _validar_columna(tipos: pd.Series, valores: pd.Series, regla: Dict) -> Tuple[pd.Series, pd.Series]:
+        """
+        Valida una columna de un bloque.
+
+        Returns:
+            Tupla (motivos, tipados): el motivo del error por fila (NaN si la
+            celda es válida) y los valores convertidos al tipo de la regla
+            (vacío donde la celda está vacía o no se pudo convertir).
+        """
+        motivos = pd.Series(float("nan"), index=valores.index, dtype=object)
+        texto = valores.astype("string").str.strip()
+        vacias = texto.isna() | (texto == "")
+        tipo = regla.get("type", "string")
+        comparable = None
+        tipados = valores
+
+        if tipo in ("integer", "number"):
+            numeros = pd.to_numeric(valores.where(tipos != "b"), errors="coerce")
+            invalidas = ~vacias & numeros.isna()
+            motivos[invalidas] = "no es un número"
+            if tipo == "integer":
+                motivos[~vacias & numeros.notna() & (numeros % 1 != 0)] = "no es un entero"
+                numeros = numeros.where(numeros % 1 == 0)
+            comparable = tipados = numeros
+        elif tipo == "date":
+            fechas = ExcelValidator._a_fechas(tipos, valores, regla.get("format", "mixed"))
+            motivos[~vacias & fechas.isna()] = "no es una fecha"
+            comparable = fechas
+            # Los seriales de Excel traen error de coma flotante por debajo del milisegundo
+            tipados = fechas.dt.round("ms")
+        elif tipo == "boolean":
+            minusculas = texto.str.lower()
+            validas = (tipos == "b") | minusculas.isin(_VERDADEROS | _FALSOS)
+            motivos[~vacias & ~validas] = "no es verdadero/falso"
+            verdaderas = minusculas.isin(_VERDADEROS)
+            tipados = verdaderas.where(validas & ~vacias).astype("boolean")
+        else:
+            if "values" in regla:
+                permitidos = [str(v) for v in regla["values"]]
+                motivos[~vacias & ~texto.isin(permitidos)] = "valor no permitido"
+            if "max_length" in regla:
+                motivos[~vacias & (texto.str.len() > regla["max_length"])] = (
+                    f"supera {regla['max_length']} caracteres"
+                )
+
+        if comparable is not None:
+            convertir = pd.Timestamp if tipo == "date" else float
+            if regla.get("min") is not None:
+                motivos[comparable < convertir(regla["min"])] = f"menor que el mínimo {regla['min']}"
+            if regla.get("max") is not None:
+                motivos[comparable > convertir(regla["max"])] = f"mayor que el máximo {regla['max']}"
+
+        if not regla.get("nullable", True):
+            motivos[vacias] = "celda vacía"
+        return motivos, tipados
+
     def _generate_error_message(
         self, 
         missing_columns: List[str], 
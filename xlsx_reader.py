@@ -0,0 +1,309 @@
+"""
+Lectura por streaming de archivos .xlsx sin cargar el libro completo.
+
+Un .xlsx es un zip con una hoja XML por pestaña y una tabla de textos
+compartidos (sharedStrings.xml). openpyxl en modo normal, y por lo tanto
+`pd.read_excel(..., nrows=0)`, interpreta el libro entero (estilos, textos
+compartidos y todas las celdas) aunque solo se pidan los encabezados.
+
+`read_header` abre el zip, recorre el XML de la hoja con `iterparse` solo
+hasta la primera fila y resuelve solo los textos compartidos que esa fila
+referencia, deteniendo la lectura de sharedStrings.xml en el último índice
+necesario. El tiempo y la memoria no dependen del tamaño del archivo.
+
+`iter_rows` recorre la hoja completa fila por fila con memoria constante (solo
+la tabla de textos compartidos queda cargada); la usa la validación de
+contenido por bloques de `validators.py`.
+
+Un miembro dañado del zip (datos comprimidos corruptos o truncados) se
+detecta recién al descomprimirlo; esos errores también se informan como
+`XlsxFormatError`.
+"""
+import posixpath
+import zipfile
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from xml.etree.ElementTree import iterparse
+
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+DEFAULT_SHEET = "xl/worksheets/sheet1.xml"
+SHARED_STRINGS = "xl/sharedStrings.xml"
+
+
+class XlsxFormatError(Exception):
+    """El archivo no es un .xlsx legible (zip sin libro u hoja, o dañado)."""
+
+
+# Errores de zipfile/zlib al leer un miembro corrupto o truncado
+_MEMBER_READ_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, OSError)
+
+
+@contextmanager
+def _reading_member():
+    """Traduce los errores de descompresión de un miembro a `XlsxFormatError`."""
+    try:
+        yield
+    except _MEMBER_READ_ERRORS as e:
+        raise XlsxFormatError(f"El archivo .xlsx está dañado: {e}")
+
+
+def _open_zip(excel_file) -> zipfile.ZipFile:
+    """Acepta ruta u objeto file-like (p. ej. UploadedFile de Streamlit)."""
+    if hasattr(excel_file, "seek"):
+        excel_file.seek(0)
+    try:
+        return zipfile.ZipFile(excel_file)
+    except zipfile.BadZipFile as e:
+        raise XlsxFormatError(f"El archivo no es un .xlsx válido: {e}")
+
+
+def _sheet_path(zf: zipfile.ZipFile, sheet_index: int = 0) -> str:
+    """
+    Ruta dentro del zip de la hoja en la posición `sheet_index` (orden del libro,
+    el mismo que usa pandas), resuelta a través de workbook.xml.rels.
+    """
+    try:
+        with _reading_member(), zf.open("xl/workbook.xml") as f:
+            sheet_ids = [
+                elem.get(NS_REL + "id")
+                for _, elem in iterparse(f)
+                if elem.tag == NS_MAIN + "sheet"
+            ]
+        with _reading_member(), zf.open("xl/_rels/workbook.xml.rels") as f:
+            targets = {
+                elem.get("Id"): elem.get("Target")
+                for _, elem in iterparse(f)
+                if elem.tag == NS_PKG_REL + "Relationship"
+            }
+    except KeyError:
+        return DEFAULT_SHEET
+
+    if sheet_index >= len(sheet_ids):
+        raise XlsxFormatError(f"El libro no tiene la hoja {sheet_index + 1}")
+    target = targets.get(sheet_ids[sheet_index])
+    if not target:
+        return DEFAULT_SHEET
+    # Destino relativo a xl/ o absoluto desde la raíz del paquete
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def _column_index(reference: str) -> int:
+    """'C7' -> 2 (base 0)."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+def _inline_text(cell) -> str:
+    return "".join(t.text or "" for t in cell.iter(NS_MAIN + "t"))
+
+
+def _string_item_text(item) -> str:
+    """Texto de un <si>: <t> directo o runs <r><t>; se ignora la fonética (<rPh>)."""
+    parts = []
+    for child in item:
+        if child.tag == NS_MAIN + "t":
+            parts.append(child.text or "")
+        elif child.tag == NS_MAIN + "r":
+            parts.extend(t.text or "" for t in child.iter(NS_MAIN + "t"))
+    return "".join(parts)
+
+
+def read_shared_strings(zf: zipfile.ZipFile, indexes: Optional[Set[int]] = None) -> Dict[int, str]:
+    """
+    Lee los textos compartidos del libro.
+
+    Args:
+        zf: Libro abierto.
+        indexes: Índices a resolver. Con None se leen todos; con un conjunto,
+            la lectura termina en el mayor índice pedido.
+
+    Returns:
+        Diccionario índice -> texto.
+    """
+    if indexes is not None and not indexes:
+        return {}
+    last = max(indexes) if indexes is not None else None
+    strings: Dict[int, str] = {}
+    try:
+        with _reading_member():
+            f = zf.open(SHARED_STRINGS)
+    except KeyError:
+        return strings
+    with _reading_member(), f:
+        position = 0
+        table = None
+        for event, elem in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == NS_MAIN + "sst":
+                    table = elem
+                continue
+            if elem.tag != NS_MAIN + "si":
+                continue
+            if indexes is None or position in indexes:
+                strings[position] = _string_item_text(elem)
+            if table is not None:
+                table.clear()
+            if last is not None and position >= last:
+                break
+            position += 1
+    return strings
+
+
+def _number_text(value: str) -> str:
+    """Igual que pandas al convertir a str un encabezado numérico."""
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def iter_raw_rows(zf: zipfile.ZipFile, sheet: str) -> Iterator[Tuple[int, Dict[int, tuple]]]:
+    """
+    Recorre las filas de la hoja sin resolver textos compartidos.
+
+    Yields:
+        Tupla (número de fila base 1, celdas) por cada <row>, donde celdas es un
+        diccionario columna (base 0) -> (tipo, valor) y tipo es el atributo `t`
+        de la celda ("s" para textos compartidos). Las filas vacías no vienen
+        en el XML.
+    """
+    with _reading_member(), zf.open(sheet) as f:
+        sheet_data = None
+        row_number = 0
+        for event, elem in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == NS_MAIN + "sheetData":
+                    sheet_data = elem
+                continue
+            if elem.tag != NS_MAIN + "row":
+                continue
+            row_number = int(elem.get("r") or row_number + 1)
+            cells = {}
+            for position, cell in enumerate(elem.iter(NS_MAIN + "c")):
+                reference = cell.get("r")
+                column = _column_index(reference) if reference else position
+                kind = cell.get("t", "n")
+                if kind == "inlineStr":
+                    cells[column] = ("inlineStr", _inline_text(cell))
+                    continue
+                value = cell.find(NS_MAIN + "v")
+                if value is not None and value.text is not None:
+                    cells[column] = (kind, value.text)
+            # Soltar las filas ya leídas: memoria constante aunque la hoja sea enorme
+            if sheet_data is not None:
+                sheet_data.clear()
+            else:
+                elem.clear()
+            yield row_number, cells
+
+
+def _dedupe(columns: List[str]) -> List[str]:
+    """
+    Renombra duplicados como pandas: 'A', 'A.1', 'A.2', saltando los nombres
+    que ya existen en el encabezado.
+    """
+    original = set(columns)
+    used: Set[str] = set()
+    result = []
+    for column in columns:
+        name = column
+        suffix = 0
+        while name in used:
+            suffix += 1
+            name = f"{column}.{suffix}"
+            if name in original:
+                name = column
+        used.add(name)
+        result.append(name)
+    return result
+
+
+def read_header(excel_file, sheet_index: int = 0) -> List[str]:
+    """
+    Lee los encabezados (fila 1) de una hoja .xlsx.
+
+    Igual que `pd.read_excel(..., nrows=0)`: las celdas vacías entre
+    encabezados se nombran `Unnamed: {i}`, los duplicados `nombre.1` y, si la
+    fila 1 está vacía, no hay encabezados.
+
+    Args:
+        excel_file: Ruta u objeto file-like del archivo .xlsx.
+        sheet_index: Posición de la hoja en el libro (0 = primera).
+
+    Returns:
+        Lista de nombres de columna (vacía si la hoja no tiene valores).
+
+    Raises:
+        XlsxFormatError: si el archivo no es un .xlsx legible.
+    """
+    with _open_zip(excel_file) as zf:
+        sheet = _sheet_path(zf, sheet_index)
+        try:
+            rows = iter_raw_rows(zf, sheet)
+            row_number, cells = next(rows, (0, {}))
+            rows.close()
+        except KeyError:
+            raise XlsxFormatError(f"El libro no contiene la hoja {sheet}")
+
+        if row_number != 1 or not cells:
+            return []
+        shared = read_shared_strings(
+            zf, {int(value) for kind, value in cells.values() if kind == "s"}
+        )
+
+    header = []
+    for column in range(max(cells) + 1):
+        kind, value = cells.get(column, (None, None))
+        if value is None:
+            text = f"Unnamed: {column}"
+        elif kind == "s":
+            text = shared.get(int(value), "")
+        elif kind == "b":
+            text = "True" if value == "1" else "False"
+        elif kind == "n":
+            text = _number_text(value)
+        else:
+            text = value
+        header.append(text)
+    return _dedupe(header)
+
+
+def iter_rows(excel_file, sheet_index: int = 0) -> Iterator[Tuple[int, Dict[int, tuple]]]:
+    """
+    Recorre todas las filas de una hoja con los textos ya resueltos.
+
+    Solo la tabla de textos compartidos queda en memoria (crece con los textos
+    distintos, no con las filas); las filas se leen y descartan una a una.
+
+    Yields:
+        Tupla (número de fila base 1, celdas) con celdas columna (base 0) ->
+        (tipo, valor). Tipos: "n" número, "s" texto, "b" booleano ("1"/"0"),
+        "d" fecha ISO y "e" error de Excel; los valores son el texto del XML.
+
+    Raises:
+        XlsxFormatError: si el archivo no es un .xlsx legible.
+    """
+    with _open_zip(excel_file) as zf:
+        sheet = _sheet_path(zf, sheet_index)
+        if sheet not in zf.namelist():
+            raise XlsxFormatError(f"El libro no contiene la hoja {sheet}")
+        shared = read_shared_strings(zf)
+        for row_number, cells in iter_raw_rows(zf, sheet):
+            for column, (kind, value) in cells.items():
+                if kind == "s":
+                    cells[column] = ("s", shared.get(int(value), ""))
+                elif kind in ("inlineStr", "str"):
+                    cells[column] = ("s", value)
+            yield row_number, cells